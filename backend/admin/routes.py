@@ -0,0 +1,67 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import Response
+
+from users.auth import require_admin
+from core.profiling import profile_store, summary, top_functions, PROFILING_ENABLED
+from core.ratelimit import limiter_stats
+from core.concurrency import scheduler
+from core.filecache import file_cache
+from books.popularity import counter as access_counter
+from revisions.store import revision_cache
+from similar.store import index as similar_index
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def _get_profile(profile_id: str) -> dict:
+    entry = profile_store.get(profile_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return entry
+
+
+@router.get("/profiles")
+async def list_profiles(_: bool = Depends(require_admin)):
+    """Admin-only: list profiles captured by this worker (newest first)."""
+    return {"enabled": PROFILING_ENABLED, "profiles": profile_store.list()}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, _: bool = Depends(require_admin)):
+    """Admin-only: profile metadata, Mongo commands and a cumulative-time report."""
+    entry = _get_profile(profile_id)
+    return {**summary(entry), "report": top_functions(entry)}
+
+
+@router.get("/profiles/{profile_id}/pstats")
+async def download_profile(profile_id: str, _: bool = Depends(require_admin)):
+    """Admin-only: download the raw profile; load with `pstats.Stats(path)` or snakeviz."""
+    entry = _get_profile(profile_id)
+    return Response(
+        content=entry["pstats"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'},
+    )
+
+
+@router.get("/rate-limits")
+async def rate_limit_stats(_: bool = Depends(require_admin)):
+    """Admin-only: allowed/rejected attempt counters of this worker's rate limiters."""
+    return limiter_stats()
+
+
+@router.get("/caches")
+async def cache_stats(_: bool = Depends(require_admin)):
+    """Admin-only: hit rate, evictions and size of this worker's in-memory caches, indexes and buffers."""
+    return {
+        "files": file_cache.stats(),
+        "revisions": revision_cache.stats(),
+        "similar": similar_index.stats(),
+        "access_counts": access_counter.stats(),
+    }
+
+
+@router.get("/concurrency")
+async def concurrency_stats(_: bool = Depends(require_admin)):
+    """Admin-only: per-class in-flight requests, queue depth, wait times and shed count of this worker."""
+    return scheduler.stats()
@@ -0,0 +1,98 @@
+"""Point books and translations at files already in storage (core/storage.py).
+
+Shared by the multipart upload endpoints in books/routes.py and by resumable
+uploads (resumable/routes.py): each function records the catalog change, keeps
+the stats and revision history in step, and removes a replaced file.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from core.storage import file_storage
+from glossary import store as glossary
+from revisions import store as revisions
+from similar import store as similar
+from stats import store as stats
+
+from . import changes
+from .repository import BookRepository, TranslationRepository
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _delete_file(db, file_id) -> None:
+    try:
+        await file_storage(db).delete(file_id)
+    except Exception:
+        # Non-fatal: an orphaned file only costs space
+        pass
+
+
+async def attach_source(db, book_id: Any, file_id: ObjectId, filename: str, text_stats: Dict[str, Any]) -> None:
+    """Make `file_id` (analyzed as `text_stats`, see books/ingest.py) the book's source, deleting the previous source file."""
+    # The previous value comes back from the same round trip
+    previous = await BookRepository(db).update(
+        book_id,
+        {"source_file_id": file_id, "source_filename": filename, "source_stats": text_stats, "updated_at": _now_iso()},
+        projection={'source_file_id': 1},
+        before=True,
+    )
+    await changes.record(db, [(changes.BOOK, changes.UPSERT, previous['_id'])])
+    await similar.book_changed(db, previous['_id'])
+    await glossary.book_files_changed(db, previous['_id'])
+    old_id = previous.get('source_file_id')
+    if old_id:
+        await _delete_file(db, old_id)
+
+
+async def attach_new_translation(db, book_id: ObjectId, file_id: ObjectId, filename: str, language: str,
+                                 translated_by: Optional[str], size: int, lines: int,
+                                 created_by: Optional[str], text_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Create a translation record for an uploaded file; returns the new document."""
+    tdoc = {
+        'book_id': book_id,
+        'language': language,
+        'filename': filename,
+        'file_id': file_id,
+        'translated_by': translated_by,
+        'text_stats': text_stats,
+        'updated_at': _now_iso(),
+    }
+    await TranslationRepository(db).insert(tdoc)
+    await changes.record(db, [(changes.TRANSLATION, changes.UPSERT, tdoc['_id'])])
+    await stats.translation_added(db, tdoc)
+    await revisions.record_initial_many(db, [
+        revisions.initial_revision(tdoc['_id'], file_id, filename, size, lines, created_by)
+    ])
+    await glossary.book_files_changed(db, book_id)
+    return tdoc
+
+
+async def attach_translation_file(db, t: Dict[str, Any], content: bytes, file_id: ObjectId, filename: str,
+                                  created_by: Optional[str], text_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Make `file_id` (holding `content`) the translation's file, recording the change as a revision."""
+    old_id = t.get('file_id')
+    if old_id:
+        try:
+            old_content = await revisions.read_file(db, old_id)
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to read current file from storage")
+    else:
+        old_content = (t.get('text') or '').encode('utf-8')
+
+    _, keep_old = await revisions.record_revision(db, t, old_content, content, file_id, filename, created_by)
+    t = await TranslationRepository(db).update(
+        t['_id'], {"file_id": file_id, "filename": filename, "text_stats": text_stats, "updated_at": _now_iso()}
+    )
+    await changes.record(db, [(changes.TRANSLATION, changes.UPSERT, t['_id'])])
+    await glossary.book_files_changed(db, t['book_id'])
+
+    # The previous file is only needed if it is a revision snapshot; deltas rebuild the rest
+    if old_id and not keep_old:
+        await _delete_file(db, old_id)
+    return t
@@ -0,0 +1,181 @@
+"""Streaming zip bundles of a book's source and translations.
+
+The archive is built while it is being sent. Each file is read from storage one
+chunk at a time and deflated into its zip entry. Whatever zipfile has written
+is yielded right away, so server memory stays at about one chunk however large
+the bundle is.
+
+`manifest.json` is written last. It holds the book's metadata plus each file's
+path, size and SHA-256, computed from the bytes actually streamed.
+
+zipfile writes to a non-seekable sink here, so entries carry data descriptors
+and ZIP64 fields; all common unzip tools read these.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import re
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from fastapi import HTTPException
+
+from core.storage import file_storage
+from core.tracing import span
+
+BUNDLE_COMPRESSION_LEVEL = int(os.environ.get("BUNDLE_COMPRESSION_LEVEL", "6"))
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable file whose bytes are handed on by `take`."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def archive_name(book: Dict[str, Any]) -> str:
+    """ASCII file name for the Content-Disposition header."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "-", book.get("title") or "").strip("-.")
+    return f"{slug or str(book['_id'])}.zip"
+
+
+def _basename(name: Optional[str], default: str) -> str:
+    name = (name or "").replace("\\", "/").split("/")[-1].strip()
+    return name or default
+
+
+def _unique(path: str, used: set) -> str:
+    base, ext = os.path.splitext(path)
+    n = 2
+    while path in used:
+        path = f"{base} ({n}){ext}"
+        n += 1
+    used.add(path)
+    return path
+
+
+async def open_bundle(db, book: Dict[str, Any], tdocs: List[Dict[str, Any]],
+                      include_source: bool = True) -> AsyncIterator[bytes]:
+    """Plan the archive and open its stored files; returns the body iterator.
+
+    Opening happens before the response starts, so a missing file is a 500
+    rather than a truncated download.
+    """
+    used: set = set()
+    entries: List[Dict[str, Any]] = []
+    if include_source and (book.get("source_file_id") or book.get("source")):
+        entries.append({
+            "path": _unique(f"source/{_basename(book.get('source_filename'), 'original.txt')}", used),
+            "kind": "source",
+            "filename": book.get("source_filename"),
+            "file_id": book.get("source_file_id"),
+            "text": book.get("source"),
+        })
+    for t in tdocs:
+        if not t.get("file_id") and not isinstance(t.get("text"), str):
+            continue
+        language = _basename(t.get("language"), "unknown")
+        entries.append({
+            "path": _unique(f"translations/{language}/{_basename(t.get('filename'), 'translation.txt')}", used),
+            "kind": "translation",
+            "translation_id": str(t["_id"]),
+            "language": t.get("language"),
+            "translated_by": t.get("translated_by"),
+            "filename": t.get("filename"),
+            "updated_at": t.get("updated_at"),
+            "file_id": t.get("file_id"),
+            "text": t.get("text"),
+        })
+
+    storage = file_storage(db)
+    streams = await asyncio.gather(*(
+        storage.open(e["file_id"]) if e["file_id"] else asyncio.sleep(0)
+        for e in entries
+    ), return_exceptions=True)
+    if any(isinstance(stream, BaseException) for stream in streams):
+        # Close the files that did open (real file handles with the local backend)
+        for stream in streams:
+            if stream is not None and not isinstance(stream, BaseException):
+                stream.close()
+        raise HTTPException(status_code=500, detail="Failed to read file from storage")
+    return _stream(book, entries, streams)
+
+
+async def _chunks(entry: Dict[str, Any], stream) -> AsyncIterator[bytes]:
+    if stream is None:
+        yield (entry["text"] or "").encode("utf-8")
+        return
+    while True:
+        chunk = await stream.readchunk()
+        if not chunk:
+            break
+        yield chunk
+
+
+def _write(out, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def _stream(book: Dict[str, Any], entries: List[Dict[str, Any]], streams: list) -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=BUNDLE_COMPRESSION_LEVEL)
+    files = []
+    total = 0
+    with span("bundle.stream", activate=False, book_id=str(book["_id"]), files=len(entries)) as s:
+        try:
+            for entry, stream in zip(entries, streams):
+                digest, size = hashlib.sha256(), 0
+                with archive.open(entry["path"], "w", force_zip64=True) as out:
+                    async for chunk in _chunks(entry, stream):
+                        # Deflate and hash off the event loop (zlib and hashlib release the GIL)
+                        await loop.run_in_executor(None, _write, out, digest, chunk)
+                        size += len(chunk)
+                        data = sink.take()
+                        if data:
+                            total += len(data)
+                            yield data
+                info = {k: v for k, v in entry.items() if k not in ("file_id", "text")}
+                files.append({**info, "size": size, "sha256": digest.hexdigest()})
+
+            manifest = {
+                "book": {
+                    "id": str(book["_id"]),
+                    **{f: book.get(f) for f in ("title", "author", "year", "description", "original_language", "updated_at")},
+                },
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+                "files": files,
+            }
+            archive.writestr("manifest.json", orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+            archive.close()
+            data = sink.take()
+            total += len(data)
+            yield data
+        finally:
+            for stream in streams:
+                if stream is not None:
+                    stream.close()
+            if s is not None:
+                s.set("bytes", total)
@@ -0,0 +1,148 @@
+"""Catalog change log for delta sync (`GET /books/changes`).
+
+Every write to `books` / `translations` appends entries to `catalog_changes`
+carrying a sequence number handed out by a counter document. A client's sync
+token is the last sequence it has applied; `changes_since` is a range query on
+the unique `seq` index and returns which ids were upserted or deleted after it
+(the latest operation per id wins). Deletions survive as tombstones in the log.
+
+Entries expire after `CATALOG_CHANGES_RETENTION_DAYS` (TTL index). A token
+older than the retained log, or one this server never issued, gets a reset: the
+full catalog and a fresh token. The catalog is sent CATALOG_CHANGES_PAGE books
+at a time, in `_id` order: while pages remain, the token is a snapshot token
+`<seq>:<last book id>` and `more` is set; the last page hands out `<seq>`, read
+before the first page, so writes made while paging are sent again as changes.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from core.lifecycle import register_warmup
+
+COLLECTION = "catalog_changes"
+COUNTERS = "counters"
+
+CATALOG_CHANGES_RETENTION_DAYS = int(os.environ.get("CATALOG_CHANGES_RETENTION_DAYS", "30"))
+CATALOG_CHANGES_PAGE = int(os.environ.get("CATALOG_CHANGES_PAGE", "1000"))
+# A missing sequence number younger than this is a write still in flight: stop
+# before it so it is not skipped. Older gaps (a writer died) are passed over.
+CATALOG_CHANGES_SETTLE_S = float(os.environ.get("CATALOG_CHANGES_SETTLE_S", "5"))
+
+BOOK = "book"
+TRANSLATION = "translation"
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+async def record(db, changes: List[Tuple[str, str, Any]]) -> None:
+    """Append `(kind, op, doc_id)` entries to the change log.
+
+    Called after the write itself has succeeded; a failure here is logged rather
+    than failing the request, the client then catches up on its next reset.
+    """
+    if not changes:
+        return
+    try:
+        counter = await db[COUNTERS].find_one_and_update(
+            {"_id": COLLECTION},
+            {"$inc": {"seq": len(changes)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        first = counter["seq"] - len(changes) + 1
+        now = datetime.now(timezone.utc)
+        await db[COLLECTION].insert_many([
+            {"seq": first + i, "kind": kind, "op": op, "doc_id": doc_id, "at": now}
+            for i, (kind, op, doc_id) in enumerate(changes)
+        ])
+    except Exception as e:
+        print(f"⚠️  Failed to record catalog changes {changes}: {e}")
+
+
+async def current_seq(db) -> int:
+    counter = await db[COUNTERS].find_one({"_id": COLLECTION})
+    return counter["seq"] if counter else 0
+
+
+def _age_s(entry: Dict[str, Any], now: datetime) -> float:
+    at = entry["at"]
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return (now - at).total_seconds()
+
+
+async def needs_reset(db, since: int) -> bool:
+    """True when `since` is not a token the retained log can continue from."""
+    current = await current_seq(db)
+    if since <= 0 or since > current:
+        return True
+    oldest = await db[COLLECTION].find_one({}, {"seq": 1}, sort=[("seq", 1)])
+    if oldest is None:
+        # Every entry after `since` has expired
+        return since < current
+    return oldest["seq"] > since + 1
+
+
+async def changes_since(db, since: int, limit: int = CATALOG_CHANGES_PAGE) -> Tuple[Dict[Tuple[str, Any], str], int, bool]:
+    """Latest op per `(kind, doc_id)` after `since`, the next token, and whether more entries remain."""
+    now = datetime.now(timezone.utc)
+    latest: Dict[Tuple[str, Any], str] = {}
+    token = since
+    more = False
+    seen = 0
+    cursor = db[COLLECTION].find({"seq": {"$gt": since}}, {"_id": 0}).sort("seq", 1).limit(limit + 1)
+    async for entry in cursor:
+        if entry["seq"] != token + 1 and _age_s(entry, now) < CATALOG_CHANGES_SETTLE_S:
+            break
+        if seen == limit:
+            more = True
+            break
+        latest[(entry["kind"], entry["doc_id"])] = entry["op"]
+        token = entry["seq"]
+        seen += 1
+    return latest, token, more
+
+
+def split(latest: Dict[Tuple[str, Any], str], kind: str) -> Tuple[List[Any], List[Any]]:
+    """(upserted ids, deleted ids) of one kind."""
+    upserted: List[Any] = []
+    deleted: List[Any] = []
+    for (k, doc_id), op in latest.items():
+        if k == kind:
+            (deleted if op == DELETE else upserted).append(doc_id)
+    return upserted, deleted
+
+
+def snapshot_token(seq: int, last_id: ObjectId) -> str:
+    return f"{seq}:{last_id}"
+
+
+def parse_token(token: Optional[str]) -> Tuple[Optional[int], Optional[ObjectId]]:
+    """Sync token as (sequence number, last book id of an unfinished snapshot).
+
+    `(None, None)` when absent. Raises 400 when malformed.
+    """
+    if token is None or token == "":
+        return None, None
+    seq, _, last_id = token.partition(":")
+    if not seq.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if not last_id:
+        return int(seq), None
+    try:
+        return int(seq), ObjectId(last_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    col = app.state.db[COLLECTION]
+    await col.create_index("seq", unique=True)
+    await col.create_index("at", expireAfterSeconds=CATALOG_CHANGES_RETENTION_DAYS * 86400)
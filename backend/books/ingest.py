@@ -0,0 +1,416 @@
+"""Upload-time analysis of text files: encoding normalization, statistics and language detection.
+
+Uploaded `.txt` files come in whatever encoding the translator's tools wrote:
+UTF-8 with or without a BOM, UTF-16 with a BOM, GB18030/GBK, Big5, Shift_JIS,
+cp1251 and so on. `TextIngest` is fed an upload chunk by chunk and hands back
+the same text as UTF-8 with `\\n` line endings, which is what gets stored, so
+every reader of stored files (glossary, evaluation, similar books, revisions)
+can decode them as UTF-8 without guessing.
+
+On the way through it counts characters, words (each CJK character is one
+word), paragraphs (non-empty lines, as in the glossary and evaluation) and
+chapters (heading lines such as "Chapter 12", "CHAPTER XII", "第十二章",
+"Глава 5"). It also keeps the first LANGUAGE_SAMPLE_CHARS characters to detect
+the language. `stats()` is stored as `source_stats` on the book and as
+`text_stats` on the translation, so listings can show sizes and reading times
+without opening files.
+
+Both detectors are heuristics without external libraries:
+
+- Encoding: a BOM wins. Otherwise the first ENCODING_SAMPLE_BYTES are tried
+  as strict UTF-8, then as BOM-less UTF-16 (NUL bytes in every other
+  position), then as each of LEGACY_ENCODINGS. The legacy candidate whose
+  non-ASCII words look most like real words of a single script is chosen,
+  earlier candidates winning ties. Bytes later in the file that do not decode
+  become U+FFFD and are counted.
+- Language: the dominant script decides where it has one main language
+  (Han, kana, Hangul, Greek...). Latin and Cyrillic text is scored against
+  short lists of each language's most frequent words.
+"""
+
+import codecs
+import math
+import os
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.workers import CJK_RANGES, KANA_RANGE
+
+ENCODING_SAMPLE_BYTES = int(os.environ.get("ENCODING_SAMPLE_BYTES", str(64 * 1024)))
+LEGACY_ENCODINGS = [
+    e.strip() for e in os.environ.get(
+        "LEGACY_ENCODINGS", "shift_jis,euc-kr,big5,gb18030,cp1251,koi8-r,cp1252"
+    ).split(",") if e.strip()
+]
+LANGUAGE_SAMPLE_CHARS = int(os.environ.get("LANGUAGE_SAMPLE_CHARS", "100000"))
+READING_WPM = float(os.environ.get("READING_WPM", "230"))
+READING_CJK_CPM = float(os.environ.get("READING_CJK_CPM", "300"))
+
+# Longest stretch without a newline held back for the statistics; longer lines are counted in pieces
+MAX_LINE_CHARS = 64 * 1024
+# Below these the language is reported as unknown
+MIN_LETTERS = 50
+MIN_STOPWORD_HITS = 10
+# Mismatches are only flagged for detections at least this confident
+MISMATCH_MIN_CONFIDENCE = 0.3
+
+_BOMS = (
+    # UTF-32-LE before UTF-16-LE: its BOM starts with the UTF-16-LE one
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# (first, last, script) code point ranges, sorted; letters outside them have no script
+_SCRIPT_RANGES = (
+    (0x0041, 0x024F, "Latin"),
+    (0x0370, 0x03FF, "Greek"),
+    (0x0400, 0x052F, "Cyrillic"),
+    (0x0590, 0x05FF, "Hebrew"),
+    (0x0600, 0x06FF, "Arabic"),
+    (0x0900, 0x097F, "Devanagari"),
+    (0x0E00, 0x0E7F, "Thai"),
+    (0x1100, 0x11FF, "Hangul"),
+    (0x1E00, 0x1EFF, "Latin"),
+    (0x1F00, 0x1FFF, "Greek"),
+    # Kana is grouped with Han: Japanese words mix both
+    (0x3040, 0x30FF, "Han"),
+    (0x3130, 0x318F, "Hangul"),
+    (0x31F0, 0x31FF, "Han"),
+    (0x3400, 0x4DBF, "Han"),
+    (0x4E00, 0x9FFF, "Han"),
+    (0xAC00, 0xD7AF, "Hangul"),
+    (0xF900, 0xFAFF, "Han"),
+    (0xFF21, 0xFF5A, "Han"),
+    # Half-width katakana: what double-byte Chinese looks like when read as Shift_JIS
+    (0xFF66, 0xFF9F, "Halfwidth"),
+)
+_SCRIPT_STARTS = [first for first, _, _ in _SCRIPT_RANGES]
+
+_SCRIPT_LANGUAGES = {
+    "Hangul": "Korean",
+    "Greek": "Greek",
+    "Hebrew": "Hebrew",
+    "Arabic": "Arabic",
+    "Devanagari": "Hindi",
+    "Thai": "Thai",
+}
+
+# Frequent function words; words shared by several languages count for each of them
+_STOPWORDS = {
+    "Latin": {
+        "English": "the and of to is was that with he she it his her you for not but had have they this which were",
+        "French": "le la les et des est une du que qui dans pas il elle je nous vous avec pour sur au mais ce était",
+        "German": "der die das und ist nicht ein eine ich sie er es mit den dem zu sich auf auch war wie aber",
+        "Spanish": "el los las y es un una por con para se lo su pero como más está fue del al muy que",
+        "Italian": "il di che e la un una non per del della sono è ma gli anche con come nel si lo",
+        "Portuguese": "o os as e de que não um uma com para do da dos em se mas ele ela foi muito é",
+        "Dutch": "de het een en van ik je niet dat zijn op te met voor maar hij ze er wat aan",
+        "Swedish": "och att det som en är på inte jag hon han med för av till den var men om",
+        "Polish": "i w nie się na to że z jest do jak ale co tak po jego już była był",
+    },
+    "Cyrillic": {
+        "Russian": "и в не на я что он с как это она но его к было то все так же из у был мы вы ты",
+        "Ukrainian": "і в не на що він з як це вона але його до було та все так й вже ще є їх ми ви ти",
+        "Bulgarian": "и в не на да се е за че от си са като това той тя но беше ще ли",
+    },
+}
+_STOPWORDS = {
+    script: {language: frozenset(words.split()) for language, words in profiles.items()}
+    for script, profiles in _STOPWORDS.items()
+}
+
+# Declared language values (`language`, `original_language`) are free text: any of
+# these words in them names the language ("fr", "French", "Brazilian Portuguese", "zh-CN")
+_ALIASES = {
+    "English": ("en", "eng", "english"),
+    "French": ("fr", "fra", "fre", "french", "français", "francais"),
+    "German": ("de", "deu", "ger", "german", "deutsch"),
+    "Spanish": ("es", "spa", "spanish", "español", "espanol", "castellano"),
+    "Italian": ("it", "ita", "italian", "italiano"),
+    "Portuguese": ("pt", "por", "portuguese", "português", "portugues"),
+    "Dutch": ("nl", "nld", "dut", "dutch", "nederlands", "flemish"),
+    "Swedish": ("sv", "swe", "swedish", "svenska"),
+    "Polish": ("pl", "pol", "polish", "polski"),
+    "Russian": ("ru", "rus", "russian", "русский"),
+    "Ukrainian": ("uk", "ukr", "ukrainian", "українська"),
+    "Bulgarian": ("bg", "bul", "bulgarian", "български"),
+    "Greek": ("el", "ell", "gre", "greek"),
+    "Hebrew": ("he", "heb", "iw", "hebrew"),
+    "Arabic": ("ar", "ara", "arabic"),
+    "Hindi": ("hi", "hin", "hindi"),
+    "Thai": ("th", "tha", "thai"),
+    "Chinese": ("zh", "zho", "chi", "chinese", "mandarin", "cantonese", "中文", "汉语", "漢語"),
+    "Japanese": ("ja", "jpn", "japanese", "日本語"),
+    "Korean": ("ko", "kor", "korean", "한국어"),
+}
+_KNOWN_ALIASES = frozenset(alias for aliases in _ALIASES.values() for alias in aliases)
+
+# Kana and CJK ideographs are written without spaces: each character counts as a word
+_CJK = CJK_RANGES
+_CJK_CHAR = re.compile(rf"[{_CJK}]")
+_KANA = re.compile(rf"[{KANA_RANGE}]")
+_WORD = re.compile(rf"[^\W{_CJK}]+(?:['’][^\W{_CJK}]+)*")
+_LETTER_RUN = re.compile(r"[^\W\d_]+")
+_PARAGRAPH = re.compile(r"^[^\S\n]*\S", re.MULTILINE)
+_CHAPTER = re.compile(
+    r"^[^\S\n]*(?:"
+    r"(?:chapter|chapitre|kapitel|cap[ií]tulo|capitolo|hoofdstuk|kapittel|rozdział|глава|розділ)"
+    r"[^\S\n]+(?:\d+|[ivxlcdm]+\b|[^\W\d_]+)"
+    r"|第[^\S\n]*[0-9０-９〇零一二三四五六七八九十百千两兩]+[^\S\n]*[章回]"
+    r"|제[^\S\n]*\d+[^\S\n]*장"
+    r")[^\n]{0,60}$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Control, private-use and replacement characters: never part of a correct decoding of prose
+_JUNK = re.compile(r"[\x00-\x08\x0e-\x1f\x7f-\x9f\ue000-\uf8ff\ufffd]")
+
+
+def _script(ch: str) -> Optional[str]:
+    code = ord(ch)
+    i = bisect_right(_SCRIPT_STARTS, code) - 1
+    if i >= 0 and code <= _SCRIPT_RANGES[i][1]:
+        return _SCRIPT_RANGES[i][2]
+    return None
+
+
+def _plausible(word: str) -> bool:
+    """Whether a letter run containing non-ASCII letters looks like a real word."""
+    scripts = {_script(ch) for ch in word}
+    if len(scripts) != 1:
+        return False
+    script = scripts.pop()
+    if script is None or script == "Halfwidth":
+        return False
+    # Latin-script words rarely consist only of accented letters; Cyrillic read as cp1252 does
+    if script == "Latin" and len(word) >= 3 and not any(ch.isascii() for ch in word):
+        return False
+    # An uppercase letter right after a lowercase one: case-scrambled, as KOI8-R read as cp1251
+    return not any(a.islower() and b.isupper() for a, b in zip(word, word[1:]))
+
+
+def _plausibility(text: str) -> float:
+    """Share of the non-ASCII words of `text` that look like real words, with junk characters counting against it."""
+    total = good = 0
+    for word in _LETTER_RUN.findall(text):
+        if not word.isascii():
+            total += 1
+            good += _plausible(word)
+    total += len(_JUNK.findall(text))
+    return good / total if total else 0.0
+
+
+def _decode(sample: bytes, codec: str, final: bool) -> Optional[str]:
+    try:
+        # Incremental, so a multi-byte sequence cut at the end of the sample is not an error
+        return codecs.getincrementaldecoder(codec)().decode(sample, final)
+    except (UnicodeDecodeError, LookupError):
+        return None
+
+
+def _utf16_without_bom(sample: bytes) -> Optional[str]:
+    half = len(sample) // 2
+    if not half:
+        return None
+    even, odd = sample[0::2].count(0), sample[1::2].count(0)
+    if max(even, odd) > half * 0.3 and min(even, odd) < half * 0.05:
+        codec = "utf-16-le" if odd > even else "utf-16-be"
+        if _decode(sample[:half * 2], codec, False) is not None:
+            return codec
+    return None
+
+
+def detect_encoding(sample: bytes, final: bool = False) -> Tuple[str, int]:
+    """(codec, BOM length) of a file that starts with `sample`; `final` when the sample is the whole file."""
+    for bom, codec in _BOMS:
+        if sample.startswith(bom):
+            return codec, len(bom)
+    if _decode(sample, "utf-8", final) is not None:
+        return "utf-8", 0
+    codec = _utf16_without_bom(sample)
+    if codec:
+        return codec, 0
+    best, best_score = "latin-1", -1.0
+    for codec in LEGACY_ENCODINGS:
+        text = _decode(sample, codec, final)
+        if text is not None:
+            score = _plausibility(text)
+            if score > best_score:
+                best, best_score = codec, score
+    return best, 0
+
+
+def detect_language(sample: str) -> Tuple[Optional[str], Optional[float]]:
+    """(language, confidence 0-1) of `sample`, or (None, None) when there is too little to go on."""
+    scripts = Counter(_script(ch) for ch in sample if ch.isalpha())
+    letters = sum(scripts.values())
+    if letters < MIN_LETTERS:
+        return None, None
+    script, count = scripts.most_common(1)[0]
+    share = count / letters
+    if script == "Han":
+        language = "Japanese" if len(_KANA.findall(sample)) > count * 0.05 else "Chinese"
+        return language, round(share, 2)
+    if script in _SCRIPT_LANGUAGES:
+        return _SCRIPT_LANGUAGES[script], round(share, 2)
+    profiles = _STOPWORDS.get(script)
+    if not profiles:
+        return None, None
+    words = Counter(_LETTER_RUN.findall(sample.lower()))
+    scores = sorted(((sum(words[w] for w in stopwords), language) for language, stopwords in profiles.items()),
+                    reverse=True)
+    (best, language), (second, _) = scores[0], scores[1]
+    if best < MIN_STOPWORD_HITS:
+        return None, None
+    return language, round(share * (best - second) / best, 2)
+
+
+def language_mismatch(detected: Optional[str], confidence: Optional[float], declared: Optional[str]) -> Optional[bool]:
+    """True when a declared language names a different language than the detected one; None when either is unknown."""
+    if not detected or not declared or (confidence or 0) < MISMATCH_MIN_CONFIDENCE:
+        return None
+    words = set(_LETTER_RUN.findall(declared.lower())) & _KNOWN_ALIASES
+    if not words:
+        return None
+    return not (words & set(_ALIASES[detected]))
+
+
+def reading_minutes(words: int, cjk_characters: int) -> int:
+    """Estimated reading time; CJK characters are read at READING_CJK_CPM, other words at READING_WPM."""
+    return math.ceil((words - cjk_characters) / READING_WPM + cjk_characters / READING_CJK_CPM)
+
+
+class TextIngest:
+    """Feed an upload's bytes in order with `feed`, then call `finish`; both return the text as UTF-8.
+
+    Output is held back until ENCODING_SAMPLE_BYTES have arrived (or the file
+    ends), since the encoding is decided from them. `changed` tells whether the
+    output differs from the input bytes. Not thread-safe; calls may run in an
+    executor as long as they are made one at a time.
+    """
+
+    def __init__(self, declared_language: Optional[str] = None):
+        self.declared_language = declared_language
+        self.encoding: Optional[str] = None
+        self.changed = False
+        self.size = 0
+        self.lines = 0
+        self._pending = bytearray()
+        self._decoder = None
+        self._cr = False
+        # Unfinished last line, and whether a piece of it (with any text) was counted already
+        self._carry: List[str] = []
+        self._carry_chars = 0
+        self._continued = False
+        self._line_has_text = False
+        self._sample: List[str] = []
+        self._sample_chars = 0
+        self._counts = dict.fromkeys(("characters", "words", "cjk", "paragraphs", "chapters", "replaced"), 0)
+
+    def feed(self, data: bytes) -> bytes:
+        if self._decoder is None:
+            self._pending += data
+            if len(self._pending) < ENCODING_SAMPLE_BYTES:
+                return b""
+            data = self._start(final=False)
+        return self._emit(self._decoder.decode(data), final=False)
+
+    def finish(self) -> bytes:
+        data = self._start(final=True) if self._decoder is None else b""
+        return self._emit(self._decoder.decode(data, final=True), final=True)
+
+    def _start(self, final: bool) -> bytes:
+        sample = bytes(self._pending)
+        self._pending = bytearray()
+        self.encoding, bom = detect_encoding(sample, final)
+        self.changed = bom > 0 or self.encoding != "utf-8"
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        return sample[bom:]
+
+    def _emit(self, text: str, final: bool) -> bytes:
+        if self._cr:
+            text = "\r" + text
+            self._cr = False
+        # A CR at the end may be the first half of a CRLF split across chunks
+        if not final and text.endswith("\r"):
+            text = text[:-1]
+            self._cr = True
+        if "\r" in text:
+            self.changed = True
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        replaced = text.count("\ufffd")
+        if replaced:
+            self.changed = True
+            self._counts["replaced"] += replaced
+
+        # Statistics are taken over whole lines, so words and headings are never split.
+        # Only the new text is searched for a newline, and a line that never ends is
+        # counted in pieces once it passes MAX_LINE_CHARS, so the work stays linear.
+        cut = len(text) if final else text.rfind("\n") + 1
+        if cut or final:
+            self._carry.append(text[:cut])
+            body = "".join(self._carry)
+            self._count(body)
+            if final and (body or self._continued) and not body.endswith("\n"):
+                self.lines += 1
+            self._carry, self._carry_chars = [], 0
+            self._continued = self._line_has_text = False
+        if cut < len(text):
+            self._carry.append(text[cut:])
+            self._carry_chars += len(text) - cut
+            if self._carry_chars > MAX_LINE_CHARS:
+                piece = "".join(self._carry)
+                self._count(piece)
+                self._continued = True
+                self._line_has_text = self._line_has_text or not piece.isspace()
+                self._carry, self._carry_chars = [], 0
+
+        out = text.encode("utf-8")
+        self.size += len(out)
+        return out
+
+    def _count(self, body: str) -> None:
+        counts = self._counts
+        newlines = body.count("\n")
+        self.lines += newlines
+        cjk = len(_CJK_CHAR.findall(body))
+        counts["characters"] += len(body) - newlines
+        counts["cjk"] += cjk
+        # A word cut where a long line was split is counted twice, at most once per MAX_LINE_CHARS
+        counts["words"] += len(_WORD.findall(body)) + cjk
+        paragraphs = len(_PARAGRAPH.findall(body))
+        chapters = len(_CHAPTER.findall(body))
+        if self._continued:
+            # The start of body is the middle of a line already counted, never a heading
+            if self._line_has_text and _PARAGRAPH.match(body):
+                paragraphs -= 1
+            if _CHAPTER.match(body):
+                chapters -= 1
+        counts["paragraphs"] += paragraphs
+        counts["chapters"] += chapters
+        if self._sample_chars < LANGUAGE_SAMPLE_CHARS:
+            piece = body[:LANGUAGE_SAMPLE_CHARS - self._sample_chars]
+            self._sample.append(piece)
+            self._sample_chars += len(piece)
+
+    def stats(self) -> Dict[str, Any]:
+        """The document stored as `source_stats` / `text_stats`; call after `finish`."""
+        counts = self._counts
+        language, confidence = detect_language("".join(self._sample))
+        return {
+            "encoding": self.encoding,
+            "size": self.size,
+            "characters": counts["characters"],
+            "words": counts["words"],
+            "paragraphs": counts["paragraphs"],
+            "chapters": counts["chapters"],
+            "reading_minutes": reading_minutes(counts["words"], counts["cjk"]),
+            "language": language,
+            "language_confidence": confidence,
+            "language_mismatch": language_mismatch(language, confidence, self.declared_language),
+            "replaced_characters": counts["replaced"],
+        }
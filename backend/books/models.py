@@ -2,6 +2,25 @@ from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
+class TextStatsOut(BaseModel):
+    """Computed from the uploaded file when it is stored (see books/ingest.py)."""
+    encoding: Optional[str] = Field(
+        None, example="gb18030", description="Encoding the file was uploaded in; uploads are stored as UTF-8"
+    )
+    size: int = Field(0, description="Bytes of the stored UTF-8 file")
+    characters: int = Field(0, description="Characters, not counting line breaks")
+    words: int = Field(0, description="Words; each Chinese or Japanese character counts as one")
+    paragraphs: int = Field(0, description="Non-empty lines")
+    chapters: int = Field(0, description="Chapter heading lines, e.g. `Chapter 12`, `第十二章`")
+    reading_minutes: int = Field(0, description="Estimated reading time")
+    language: Optional[str] = Field(None, example="French", description="Detected language, if recognized")
+    language_confidence: Optional[float] = Field(None, description="Confidence of the detection (0-1)")
+    language_mismatch: Optional[bool] = Field(
+        None, description="The detected language differs from the declared one; null when either is unknown"
+    )
+    replaced_characters: int = Field(0, description="Undecodable bytes replaced with U+FFFD")
+
+
 class TranslatedBookIn(BaseModel):
     language: str = Field(..., example="French")
     filename: str = Field(..., example="le_grand_gatsby.txt")
@@ -15,6 +34,8 @@ class TranslatedBookOut(TranslatedBookIn):
     id: str
     book_id: str
     file_id: Optional[str] = None
+    text_stats: Optional[TextStatsOut] = Field(None, description="Size, counts and language of the uploaded file")
+    updated_at: Optional[str] = Field(None, description="ISO timestamp of the last change")
 
 
 class BookIn(BaseModel):
@@ -42,24 +63,65 @@ class BookIn(BaseModel):
 
 class BookOut(BookIn):
     id: str
-    # Present if the original source was uploaded to GridFS
+    # Present if the original source was uploaded as a file
     source_file_id: Optional[str] = Field(
         None,
         example="664b3cfe2f8b9c4b1a23d4ef",
-        description="GridFS file id for the original source text file"
+        description="Stored file id for the original source text file"
     )
     source_filename: Optional[str] = Field(
         None,
         example="original_source.txt",
         description="Original source filename"
     )
+    source_stats: Optional[TextStatsOut] = Field(None, description="Size, counts and language of the source file")
     translated_books: List[TranslatedBookOut] = Field(default_factory=list)
+    updated_at: Optional[str] = Field(None, description="ISO timestamp of the last change")
+
+
+class CatalogChangesOut(BaseModel):
+    """Response of GET /books/changes. Apply deletions, then upserts, then store `token`."""
+    token: str = Field(..., description="Pass as `since` on the next sync")
+    reset: bool = Field(
+        False,
+        description="The token could not be continued: replace the local copy with `books` and the pages that "
+                    "follow while `more` is set",
+    )
+    more: bool = Field(
+        False, description="More changes, or more pages of a reset, are pending; sync again right away with `token`"
+    )
+    books: List[BookOut] = Field(default_factory=list, description="Added or changed books, with all their translations")
+    translations: List[TranslatedBookOut] = Field(
+        default_factory=list, description="Added or changed translations of books not listed in `books`"
+    )
+    deleted_books: List[str] = Field(default_factory=list)
+    deleted_translations: List[str] = Field(default_factory=list)
+
+
+class TranslationAccessOut(BaseModel):
+    id: str
+    language: Optional[str] = None
+    translated_by: Optional[str] = None
+    views: int = 0
+    downloads: int = 0
+
+
+class PopularBookOut(BaseModel):
+    id: str
+    title: str
+    author: Optional[str] = None
+    year: Optional[int] = None
+    original_language: Optional[str] = None
+    views: int = Field(0, description="Source and translation views in the window")
+    downloads: int = Field(0, description="Translation file downloads in the window")
+    translations: List[TranslationAccessOut] = Field(default_factory=list, description="Most read translations first")
 
 
 class SourceUploadResponse(BaseModel):
     id: str = Field(..., description="Book id")
-    source_file_id: str = Field(..., description="GridFS file id for the uploaded source file")
+    source_file_id: str = Field(..., description="Stored file id for the uploaded source file")
     source_filename: str = Field(..., description="Stored filename for the uploaded source file")
+    source_stats: Optional[TextStatsOut] = None
 
 
 class BookUpdate(BaseModel):
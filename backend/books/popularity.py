@@ -0,0 +1,184 @@
+"""Buffered view/download counters and the popular-books ranking.
+
+The read endpoints call `record`, which only bumps an in-memory counter: there
+is no Mongo round trip on the request path. Counts are coalesced per day and
+book. Every ACCESS_FLUSH_INTERVAL_S (and once more at shutdown) they are
+written with a single unordered `bulk_write` of `$inc` upserts.
+
+`access_counts` has one document per UTC day and book:
+
+    {_id: "<day>:<book_id>", day, book_id, views, downloads,
+     t: {<translation_id>: {views, downloads}}}
+
+Source views count towards the book only. `popular` sums the days in the window
+with an aggregation that starts from the TTL index on `day`, which also drops
+buckets after ACCESS_RETENTION_DAYS.
+
+A flush that fails puts the counts it could not write back to be retried. Counts
+still buffered when a worker is killed (rather than shut down) are lost.
+"""
+
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from core.lifecycle import register_background, register_shutdown, register_warmup
+
+COLLECTION = "access_counts"
+VIEWS = "views"
+DOWNLOADS = "downloads"
+
+ACCESS_FLUSH_INTERVAL_S = float(os.environ.get("ACCESS_FLUSH_INTERVAL_S", "10"))
+ACCESS_RETENTION_DAYS = int(os.environ.get("ACCESS_RETENTION_DAYS", "90"))
+
+_WINDOW = re.compile(r"^(\d+)d$")
+
+
+def _today() -> datetime:
+    now = datetime.now(timezone.utc)
+    return datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+
+
+class AccessCounter:
+    """Per-worker buffer of counter increments, keyed by (day, book id)."""
+
+    def __init__(self):
+        self._counts: Dict[Tuple[datetime, ObjectId], Dict[str, int]] = {}
+        self.recorded = 0
+        self.flushed = 0
+        self.writes = 0
+
+    def record(self, book_id: Any, kind: str, translation_id: Any = None) -> None:
+        if book_id is None:
+            return
+        fields = self._counts.setdefault((_today(), ObjectId(book_id)), {})
+        fields[kind] = fields.get(kind, 0) + 1
+        if translation_id is not None:
+            key = f"t.{translation_id}.{kind}"
+            fields[key] = fields.get(key, 0) + 1
+        self.recorded += 1
+
+    def take(self) -> Dict[Tuple[datetime, ObjectId], Dict[str, int]]:
+        counts, self._counts = self._counts, {}
+        return counts
+
+    def restore(self, counts: Dict[Tuple[datetime, ObjectId], Dict[str, int]]) -> None:
+        for key, fields in counts.items():
+            current = self._counts.setdefault(key, {})
+            for field, n in fields.items():
+                current[field] = current.get(field, 0) + n
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": sum(f.get(VIEWS, 0) + f.get(DOWNLOADS, 0) for f in self._counts.values()),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "writes": self.writes,
+        }
+
+
+counter = AccessCounter()
+
+
+def record(book_id: Any, kind: str, translation_id: Any = None) -> None:
+    counter.record(book_id, kind, translation_id)
+
+
+async def flush(db) -> int:
+    """Write the buffered counts; returns how many bucket documents were updated."""
+    counts = counter.take()
+    if not counts:
+        return 0
+    ops = [
+        UpdateOne(
+            {"_id": f"{day.date().isoformat()}:{book_id}"},
+            {"$inc": fields, "$setOnInsert": {"day": day, "book_id": book_id}},
+            upsert=True,
+        )
+        for (day, book_id), fields in counts.items()
+    ]
+    try:
+        await db[COLLECTION].bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # Only the failed buckets are retried: $inc is not idempotent
+        keys = list(counts)
+        counter.restore({keys[err["index"]]: counts[keys[err["index"]]] for err in e.details.get("writeErrors", [])})
+        raise
+    except Exception:
+        counter.restore(counts)
+        raise
+    counter.writes += 1
+    counter.flushed += sum(f.get(VIEWS, 0) + f.get(DOWNLOADS, 0) for f in counts.values())
+    return len(ops)
+
+
+def parse_window(window: str) -> int:
+    """Days in a `<n>d` window."""
+    m = _WINDOW.match(window.strip())
+    days = int(m.group(1)) if m else 0
+    if not 1 <= days <= ACCESS_RETENTION_DAYS:
+        raise HTTPException(status_code=400, detail=f"window must be between 1d and {ACCESS_RETENTION_DAYS}d")
+    return days
+
+
+async def popular(db, days: int, limit: int) -> List[Dict[str, Any]]:
+    """Books with the most views + downloads over the last `days` days (today included), best first."""
+    since = _today() - timedelta(days=days - 1)
+    pipeline = [
+        {"$match": {"day": {"$gte": since}}},
+        {"$group": {
+            "_id": "$book_id",
+            "views": {"$sum": "$views"},
+            "downloads": {"$sum": "$downloads"},
+            "t": {"$push": "$t"},
+        }},
+        {"$addFields": {"hits": {"$add": ["$views", "$downloads"]}}},
+        {"$sort": {"hits": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+    rows = []
+    async for row in db[COLLECTION].aggregate(pipeline):
+        translations: Dict[str, Dict[str, int]] = {}
+        for day in row.get("t") or []:
+            for tid, fields in (day or {}).items():
+                total = translations.setdefault(tid, {VIEWS: 0, DOWNLOADS: 0})
+                for kind in (VIEWS, DOWNLOADS):
+                    total[kind] += fields.get(kind, 0)
+        rows.append({
+            "book_id": row["_id"],
+            "views": row.get("views", 0),
+            "downloads": row.get("downloads", 0),
+            "translations": translations,
+        })
+    return rows
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    await app.state.db[COLLECTION].create_index("day", expireAfterSeconds=ACCESS_RETENTION_DAYS * 86400)
+
+
+async def _flush_logged(db) -> None:
+    try:
+        await flush(db)
+    except Exception as e:
+        print(f"⚠️  Failed to flush access counts: {e}")
+
+
+@register_background
+async def flush_periodically(app) -> None:
+    while True:
+        await asyncio.sleep(ACCESS_FLUSH_INTERVAL_S)
+        await _flush_logged(app.state.db)
+
+
+@register_shutdown
+async def flush_on_shutdown(app) -> None:
+    await _flush_logged(app.state.db)
@@ -0,0 +1,23 @@
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from core.repository import Repository
+
+
+class BookRepository(Repository):
+    collection = "books"
+    not_found = "Book not found"
+
+
+class TranslationRepository(Repository):
+    collection = "translations"
+    not_found = "Translation not found"
+
+    def for_books(self, book_ids: List[ObjectId], projection: Optional[Dict[str, Any]] = None):
+        """Cursor over the translations of several books (one query)."""
+        return self.col.find({"book_id": {"$in": book_ids}}, projection)
+
+    async def delete_for_book(self, book_id: ObjectId) -> int:
+        result = await self.col.delete_many({"book_id": book_id})
+        return result.deleted_count
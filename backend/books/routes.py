@@ -1,131 +1,205 @@
+from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, Depends, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse, ORJSONResponse
 import io
 from bson import ObjectId
-import motor.motor_asyncio
-from users.auth import require_admin
-
-from .models import BookIn, BookOut, TranslatedBookIn, TranslatedBookOut, SourceUploadResponse, BookUpdate
+from users.auth import require_admin, get_current_user_claims
+from revisions import store as revisions
+from stats import store as stats
+from similar import store as similar
+from glossary import store as glossary
+from evaluation import store as evaluation
+from core import ndjson
+from core.filecache import file_cache
+from core.storage import file_storage
+from core.lifecycle import inflight_streams, register_warmup
+from core.tracing import span
+
+from . import attach, bundle, changes, ingest, popularity, uploads
+from .models import (
+    BookIn, BookOut, TranslatedBookIn, TranslatedBookOut, SourceUploadResponse, BookUpdate, CatalogChangesOut,
+    PopularBookOut,
+)
+from .repository import BookRepository, TranslationRepository
+from .serializers import (
+    book_to_dict, translation_to_dict, is_valid_book,
+    FieldSet, parse_fields, book_projection, translation_projection, select_book, select_translation,
+    BOOK_FIELDS_DESCRIPTION, TRANSLATION_FIELDS_DESCRIPTION,
+)
+
+ALL_FIELDS = parse_fields(None)
 
 router = APIRouter()
 
 
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
 @router.post("/books", response_model=BookOut)
 async def create_book(book: BookIn, request: Request, _: bool = Depends(require_admin)):
     db = request.app.state.db
     doc = book.dict()
     translations = doc.pop('translated_books', []) or []
+    doc['updated_at'] = _now_iso()
     
     print(f"📖 Creating book: {book.title} by {book.author}")
     print(f"📝 Document to insert: {doc}")
     
-    result = await db.books.insert_one(doc)
-    if not result.acknowledged:
-        print(f"❌ Failed to insert book")
-        raise HTTPException(status_code=500, detail="Failed to insert book")
-    
-    book_id = result.inserted_id
+    await BookRepository(db).insert(doc)
+    book_id = doc['_id']
     print(f"✅ Book created with ID: {book_id}")
 
-    created_translations = []
-    for t in translations:
-        # Always store DB reference types as ObjectId
-        tdoc = {
-            'book_id': ObjectId(str(book_id)),
+    # Always store DB reference types as ObjectId
+    tdocs = [
+        {
+            'book_id': book_id,
             'language': t.get('language'),
             'filename': t.get('filename'),
             'text': t.get('text'),
             'translated_by': t.get('translated_by'),
+            'updated_at': doc['updated_at'],
         }
-        tres = await db.translations.insert_one(tdoc)
-        if tres.acknowledged:
-            print(f"✅ Translation created: {t.get('language')} (ID: {tres.inserted_id})")
-            # Build a safe, serialized payload for the response model
-            t_out = {
-                'id': str(tres.inserted_id),
-                'book_id': str(book_id),
-                'language': tdoc.get('language') or '',
-                'filename': tdoc.get('filename') or '',
-                'text': tdoc.get('text'),
-                'file_id': None,
-                'translated_by': tdoc.get('translated_by') or None,
-            }
-            created_translations.append(TranslatedBookOut(**t_out))
-
-    return BookOut(id=str(book_id), translated_books=created_translations, **doc)
-
+        for t in translations
+    ]
+    await TranslationRepository(db).insert_many(tdocs)
+    if tdocs:
+        print(f"✅ Translations created: {', '.join(str(t.get('language')) for t in tdocs)}")
+
+    await changes.record(db, [(changes.BOOK, changes.UPSERT, book_id)] + [
+        (changes.TRANSLATION, changes.UPSERT, t['_id']) for t in tdocs
+    ])
+    await stats.book_added(db, doc, tdocs)
+    await similar.book_changed(db, book_id)
+
+    return ORJSONResponse(book_to_dict(doc, [translation_to_dict(t) for t in tdocs]))
+
+
+@router.post("/books/upload", response_model=BookOut)
+async def create_book_with_files(
+    request: Request,
+    title: str = Form(...),
+    author: Optional[str] = Form(None),
+    year: Optional[int] = Form(None),
+    description: Optional[str] = Form(None),
+    original_language: Optional[str] = Form(None),
+    source: Optional[UploadFile] = File(None, description="Original source text file"),
+    translation_files: List[UploadFile] = File([], description="Translation text files"),
+    translation_languages: List[str] = Form([], description="Language of each translation file, in the same order"),
+    translation_translated_by: List[str] = Form(
+        [], description="Optional model/translator of each translation file, in the same order"
+    ),
+    _: bool = Depends(require_admin),
+):
+    """Create a book with its source and translation files in one multipart request.
 
-@router.put("/books/{book_id}", response_model=BookOut)
-async def update_book(book_id: str, payload: BookUpdate, request: Request, _: bool = Depends(require_admin)):
+    Files are streamed into storage concurrently, normalized to UTF-8 and analyzed
+    (see books/ingest.py); if any part fails nothing is kept.
+    """
     db = request.app.state.db
+    if len(translation_languages) != len(translation_files):
+        raise HTTPException(status_code=400, detail="Each translation file needs a language")
+    if len(translation_translated_by) > len(translation_files):
+        raise HTTPException(status_code=400, detail="More translated_by values than translation files")
+
+    parts = [(f, f.filename or "translation.txt", language) for f, language in zip(translation_files, translation_languages)]
+    if source is not None:
+        parts.append((source, source.filename or "original.txt", original_language))
+    print(f"📖 Creating book: {title} by {author} with {len(parts)} file(s)")
     try:
-        existing = await db.books.find_one({"_id": ObjectId(book_id)})
-    except Exception:
-        existing = None
-    if not existing:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    updates = {k: v for k, v in payload.dict(exclude_unset=True).items()}
-    if not updates:
-        # No-op update; return current
-        # Also include translations in the response to match BookOut
-        translations = []
+        stored = await uploads.store_all(db, parts)
+    except Exception as e:
+        print(f"❌ Upload failed, nothing was kept: {e}")
+        raise HTTPException(status_code=500, detail="Failed to store uploaded files")
+    source_file = stored.pop() if source is not None else None
+
+    now = _now_iso()
+    doc = {
+        'title': title,
+        'author': author,
+        'year': year,
+        'description': description,
+        'original_language': original_language,
+        'source': None,
+        'source_filename': source_file.filename if source_file else None,
+        'source_file_id': source_file.file_id if source_file else None,
+        'source_stats': source_file.stats if source_file else None,
+        'updated_at': now,
+    }
+    book_id = ObjectId()
+    doc['_id'] = book_id
+    tdocs = [
+        {
+            'book_id': book_id,
+            'language': language,
+            'filename': f.filename,
+            'file_id': f.file_id,
+            'translated_by': (translation_translated_by[i] if i < len(translation_translated_by) else None) or None,
+            'text_stats': f.stats,
+            'updated_at': now,
+        }
+        for i, (language, f) in enumerate(zip(translation_languages, stored))
+    ]
+    try:
+        # Translations first: if they fail no book exists yet; if the book fails they are removed
+        await TranslationRepository(db).insert_many(tdocs)
+        await BookRepository(db).insert(doc)
+    except Exception as e:
+        print(f"❌ Failed to save book {title}, rolling back: {e}")
         try:
-            async for tdoc in db.translations.find({'book_id': ObjectId(book_id)}):
-                t_out = {
-                    'id': str(tdoc.get('_id')),
-                    'book_id': str(tdoc.get('book_id')) if tdoc.get('book_id') is not None else '',
-                    'language': tdoc.get('language') or '',
-                    'filename': tdoc.get('filename') or '',
-                    'text': tdoc.get('text'),
-                    'file_id': (str(tdoc.get('file_id')) if tdoc.get('file_id') is not None else None),
-                    'translated_by': tdoc.get('translated_by'),
-                }
-                translations.append(TranslatedBookOut(**t_out))
+            await TranslationRepository(db).delete_for_book(book_id)
         except Exception:
             pass
-        # Normalize ObjectId fields for Pydantic
-        existing['id'] = str(existing['_id'])
-        existing.pop('_id', None)
-        if existing.get('source_file_id') is not None:
-            try:
-                existing['source_file_id'] = str(existing['source_file_id'])
-            except Exception:
-                existing['source_file_id'] = None
-        return BookOut(**existing, translated_books=translations)
-
-    res = await db.books.update_one({"_id": ObjectId(book_id)}, {"$set": updates})
-    if not res.acknowledged:
-        raise HTTPException(status_code=500, detail="Failed to update book")
-
-    # Build response
-    updated = await db.books.find_one({"_id": ObjectId(book_id)})
-    translations = []
-    try:
-        async for tdoc in db.translations.find({'book_id': ObjectId(book_id)}):
-            t_out = {
-                'id': str(tdoc.get('_id')),
-                'book_id': str(tdoc.get('book_id')) if tdoc.get('book_id') is not None else '',
-                'language': tdoc.get('language') or '',
-                'filename': tdoc.get('filename') or '',
-                'text': tdoc.get('text'),
-                'file_id': (str(tdoc.get('file_id')) if tdoc.get('file_id') is not None else None),
-                'translated_by': tdoc.get('translated_by'),
-            }
-            translations.append(TranslatedBookOut(**t_out))
-    except Exception:
-        pass
+        await uploads.delete_files(db, [f.file_id for f in stored] + ([source_file.file_id] if source_file else []))
+        raise HTTPException(status_code=500, detail="Failed to create book")
+    print(f"✅ Book created with ID: {book_id}")
 
-    # Normalize ObjectId fields for Pydantic
-    updated['id'] = str(updated['_id'])
-    updated.pop('_id', None)
-    if updated.get('source_file_id') is not None:
-        try:
-            updated['source_file_id'] = str(updated['source_file_id'])
-        except Exception:
-            updated['source_file_id'] = None
-    return BookOut(**updated, translated_books=translations)
+    claims = get_current_user_claims(request)
+    await revisions.record_initial_many(db, [
+        revisions.initial_revision(t['_id'], f.file_id, f.filename, f.size, f.lines, claims.get("username"))
+        for t, f in zip(tdocs, stored)
+    ])
+    await changes.record(db, [(changes.BOOK, changes.UPSERT, book_id)] + [
+        (changes.TRANSLATION, changes.UPSERT, t['_id']) for t in tdocs
+    ])
+    await stats.book_added(db, doc, tdocs)
+    await similar.book_changed(db, book_id)
+    return ORJSONResponse(book_to_dict(doc, [translation_to_dict(t) for t in tdocs]))
+
+
+@router.put("/books/{book_id}", response_model=BookOut)
+async def update_book(book_id: str, payload: BookUpdate, request: Request, _: bool = Depends(require_admin)):
+    db = request.app.state.db
+    updates = {k: v for k, v in payload.dict(exclude_unset=True).items()}
+    if updates:
+        updates['updated_at'] = _now_iso()
+    # One round trip for the book (a plain read when there is nothing to update), one for translations
+    previous = await BookRepository(db).update(book_id, updates, before=True)
+    updated = {**previous, **updates}
+    if updates:
+        await changes.record(db, [(changes.BOOK, changes.UPSERT, updated['_id'])])
+        if 'title' in updates or 'original_language' in updates:
+            await stats.book_changed(db, previous, updated)
+        if 'original_language' in updates and updated.get('source_stats'):
+            await _recheck_source_language(db, updated)
+        if updates.keys() & {'title', 'description', 'author', 'original_language', 'source'}:
+            await similar.book_changed(db, updated['_id'])
+        if 'source' in updates:
+            await glossary.book_files_changed(db, updated['_id'])
+    by_book = await _translations_by_book(db, [updated['_id']], ALL_FIELDS)
+    return ORJSONResponse(book_to_dict(updated, by_book.get(updated['_id'], [])))
+
+
+async def _recheck_source_language(db, book: dict) -> None:
+    """Flag the stored source language against a changed `original_language`."""
+    source_stats = book['source_stats']
+    mismatch = ingest.language_mismatch(
+        source_stats.get('language'), source_stats.get('language_confidence'), book.get('original_language')
+    )
+    if mismatch != source_stats.get('language_mismatch'):
+        book['source_stats'] = {**source_stats, 'language_mismatch': mismatch}
+        await BookRepository(db).update(book['_id'], {'source_stats.language_mismatch': mismatch}, projection={'_id': 1})
 
 
 @router.post("/books/{book_id}/translations", response_model=TranslatedBookOut)
@@ -137,67 +211,72 @@ async def upload_translation(
     request: Request = None,
     _: bool = Depends(require_admin),
 ):
+    """Add a translation from an uploaded text file, stored as UTF-8 with its statistics (see books/ingest.py)."""
     db = request.app.state.db
-    try:
-        b = await db.books.find_one({"_id": ObjectId(book_id)})
-    except Exception:
-        b = None
-    if not b:
+    books = BookRepository(db)
+    if not await books.exists(book_id):
         raise HTTPException(status_code=404, detail="Book not found")
 
-    content = await file.read()
-    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
-    file_id = await bucket.upload_from_stream(file.filename, content)
+    stored = await uploads.store_upload(db, file, file.filename, language)
 
-    tdoc = {
-        'book_id': ObjectId(book_id),
-        'language': language,
-        'filename': file.filename,
-        'file_id': file_id,
-        'translated_by': translated_by,
-    }
-    tres = await db.translations.insert_one(tdoc)
-    if not tres.acknowledged:
-        raise HTTPException(status_code=500, detail="Failed to create translation record")
-
-    return TranslatedBookOut(
-        id=str(tres.inserted_id),
-        book_id=book_id,
-        language=language,
-        filename=file.filename,
-        file_id=str(file_id),
-        translated_by=translated_by,
+    claims = get_current_user_claims(request)
+    tdoc = await attach.attach_new_translation(
+        db, books.oid(book_id), stored.file_id, file.filename, language, translated_by,
+        stored.size, stored.lines, claims.get("username"), stored.stats,
     )
+    return ORJSONResponse(translation_to_dict(tdoc))
+
+
+async def _file_response(db, file_id, error_detail: str, headers: Optional[dict] = None):
+    """Serve a stored text file: from disk with the local backend, else through the hot-file cache.
+
+    The file is looked up front so a missing file fails with 500 before headers
+    are sent. Files too large to cache come back as a stream and are sent chunk by chunk.
+    """
+    storage = file_storage(db)
+    try:
+        on_disk = await storage.local_file(file_id)
+        if on_disk:
+            path, stat = on_disk
+            return FileResponse(path, stat_result=stat, media_type='text/plain', headers=headers)
+        body = await file_cache.fetch(db, file_id)
+    except Exception:
+        raise HTTPException(status_code=500, detail=error_detail)
+    if isinstance(body, bytes):
+        return Response(content=body, media_type='text/plain', headers=headers)
+    return StreamingResponse(inflight_streams.track(_iter_chunks(body)), media_type='text/plain', headers=headers)
+
+
+async def _iter_chunks(stream):
+    """Yield a stored file chunk by chunk instead of reading it into memory."""
+    with span("storage.stream", activate=False, file_id=str(stream._id), bytes=stream.length):
+        try:
+            while True:
+                chunk = await stream.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            stream.close()
 
 
 @router.get("/translations/{translation_id}/file")
 async def download_translation_file(translation_id: str, request: Request):
     db = request.app.state.db
-    try:
-        t = await db.translations.find_one({"_id": ObjectId(translation_id)})
-    except Exception:
-        t = None
-    if not t:
-        raise HTTPException(status_code=404, detail="Translation not found")
+    t = await TranslationRepository(db).get(translation_id)
+    popularity.record(t.get('book_id'), popularity.DOWNLOADS, t['_id'])
 
+    headers = {
+        'Content-Disposition': f'attachment; filename="{t.get("filename") or "translation.txt"}"'
+    }
     file_id = t.get('file_id')
     if not file_id:
+        # Legacy inline text (not yet moved to file storage by scripts/migrate_inline_texts.py)
+        if isinstance(t.get('text'), str):
+            return StreamingResponse(io.BytesIO(t['text'].encode('utf-8')), media_type='text/plain', headers=headers)
         raise HTTPException(status_code=404, detail="No file for this translation")
 
-    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
-    try:
-        stream = await bucket.open_download_stream(ObjectId(file_id))
-        data = await stream.read()
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to read file from storage")
-
-    return StreamingResponse(
-        io.BytesIO(data),
-        media_type='text/plain',
-        headers={
-            'Content-Disposition': f'attachment; filename="{t.get("filename","translation.txt")}"'
-        }
-    )
+    return await _file_response(db, file_id, "Failed to read file from storage", headers)
 
 
 
@@ -205,25 +284,17 @@ async def download_translation_file(translation_id: str, request: Request):
 async def view_translation_inline(translation_id: str, request: Request):
     """Return the translation text inline (text/plain) so frontends can display it."""
     db = request.app.state.db
-    try:
-        t = await db.translations.find_one({"_id": ObjectId(translation_id)})
-    except Exception:
-        t = None
-    if not t:
-        raise HTTPException(status_code=404, detail="Translation not found")
+    t = await TranslationRepository(db).get(translation_id)
+    popularity.record(t.get('book_id'), popularity.VIEWS, t['_id'])
 
     file_id = t.get('file_id')
     if not file_id:
+        # Legacy inline text (not yet moved to file storage by scripts/migrate_inline_texts.py)
+        if isinstance(t.get('text'), str):
+            return StreamingResponse(io.BytesIO(t['text'].encode('utf-8')), media_type='text/plain')
         raise HTTPException(status_code=404, detail="No file for this translation")
 
-    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
-    try:
-        stream = await bucket.open_download_stream(ObjectId(file_id))
-        data = await stream.read()
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to read file from storage")
-
-    return StreamingResponse(io.BytesIO(data), media_type='text/plain')
+    return await _file_response(db, file_id, "Failed to read file from storage")
 
 
 @router.post("/translations/{translation_id}/file", response_model=TranslatedBookOut)
@@ -233,71 +304,62 @@ async def replace_translation_file(
     request: Request = None,
     _: bool = Depends(require_admin),
 ):
-    """Replace the file content of an existing translation. Stores the file in GridFS and updates the translation doc."""
+    """Replace the file content of an existing translation. Stores the file as UTF-8 (see core/storage.py and
+    books/ingest.py) and updates the translation doc and its statistics.
+    The previous content is kept as a revision (see revisions/store.py)."""
     db = request.app.state.db
-    try:
-        t = await db.translations.find_one({"_id": ObjectId(translation_id)})
-    except Exception:
-        t = None
-    if not t:
-        raise HTTPException(status_code=404, detail="Translation not found")
-
-    content = await file.read()
-    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
-
-    # Remove prior file if it exists
-    old_id = t.get('file_id')
-    if old_id:
-        try:
-            await bucket.delete(ObjectId(old_id))
-        except Exception:
-            # Non-fatal if delete fails
-            pass
-
-    new_file_id = await bucket.upload_from_stream(file.filename, content)
+    t = await TranslationRepository(db).get(translation_id)
 
-    await db.translations.update_one(
-        {"_id": ObjectId(translation_id)},
-        {"$set": {"file_id": new_file_id, "filename": file.filename}}
-    )
+    stored = await uploads.store_upload(db, file, file.filename, t.get('language'), keep=True)
 
-    return TranslatedBookOut(
-        id=translation_id,
-        book_id=str(t.get('book_id')) if t.get('book_id') is not None else '',
-        language=t.get('language') or '',
-        filename=file.filename,
-        file_id=str(new_file_id),
-        translated_by=t.get('translated_by'),
-    )
+    claims = get_current_user_claims(request)
+    try:
+        t = await attach.attach_translation_file(
+            db, t, stored.content, stored.file_id, file.filename, claims.get("username"), stored.stats
+        )
+    except BaseException:
+        await uploads.delete_files(db, [stored.file_id])
+        raise
+    return ORJSONResponse(translation_to_dict(t))
 
 
 @router.get("/books/{book_id}/source")
 async def view_book_source(book_id: str, request: Request):
-    """Return the original book source as text/plain. If the book stores a GridFS file, stream that; otherwise return the `source` field."""
+    """Return the original book source as text/plain. If the book has a stored file, stream that; otherwise return the `source` field."""
     db = request.app.state.db
-    try:
-        b = await db.books.find_one({"_id": ObjectId(book_id)})
-    except Exception:
-        b = None
-    if not b:
-        raise HTTPException(status_code=404, detail="Book not found")
+    b = await BookRepository(db).get(book_id, {'source_file_id': 1, 'source': 1})
+    popularity.record(b['_id'], popularity.VIEWS)
 
-    # If a GridFS file id is stored on the book as 'source_file_id', stream it
+    # If a file id is stored on the book as 'source_file_id', serve it
     source_file_id = b.get('source_file_id')
     if source_file_id:
-        bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
-        try:
-            stream = await bucket.open_download_stream(ObjectId(source_file_id))
-            data = await stream.read()
-        except Exception:
-            raise HTTPException(status_code=500, detail="Failed to read source file from storage")
-        return StreamingResponse(io.BytesIO(data), media_type='text/plain')
+        return await _file_response(db, source_file_id, "Failed to read source file from storage")
 
     # Otherwise return the source text stored on the document (if any)
     src = b.get('source') or ''
     return StreamingResponse(io.BytesIO(src.encode('utf-8')), media_type='text/plain')
 
 
+@router.get("/books/{book_id}/bundle.zip")
+async def download_book_bundle(
+    book_id: str,
+    request: Request,
+    languages: Optional[str] = Query(None, description="Comma-separated translation languages to include; default: all"),
+    source: bool = Query(True, description="Include the original source"),
+):
+    """Zip of the source, the translations and a `manifest.json`, streamed as it is built."""
+    db = request.app.state.db
+    book = await BookRepository(db).get(book_id)
+    wanted = {lang.strip() for lang in languages.split(",") if lang.strip()} if languages else None
+    tdocs = [
+        t async for t in TranslationRepository(db).for_books([book['_id']])
+        if wanted is None or t.get('language') in wanted
+    ]
+    body = await bundle.open_bundle(db, book, tdocs, include_source=source)
+    headers = {'Content-Disposition': f'attachment; filename="{bundle.archive_name(book)}"'}
+    return StreamingResponse(inflight_streams.track(body), media_type='application/zip', headers=headers)
+
+
 @router.post("/books/{book_id}/source", response_model=SourceUploadResponse)
 async def upload_book_source(
     book_id: str,
@@ -305,90 +367,230 @@ async def upload_book_source(
     request: Request = None,
     _: bool = Depends(require_admin),
 ):
-    """Upload or replace the original source as a text file (.txt). Stores the file in GridFS and updates the book doc."""
+    """Upload or replace the original source as a text file (.txt). Stores the file as UTF-8 (see core/storage.py and
+    books/ingest.py) and updates the book doc and its source statistics."""
     db = request.app.state.db
-    try:
-        b = await db.books.find_one({"_id": ObjectId(book_id)})
-    except Exception:
-        b = None
-    if not b:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    # Read file and store in GridFS
-    content = await file.read()
-    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
-
-    # If an existing source file exists, try to delete it to avoid orphaned files
-    old_id = b.get('source_file_id')
-    if old_id:
-        try:
-            await bucket.delete(ObjectId(old_id))
-        except Exception:
-            # Non-fatal if deletion fails; continue to upload new
-            pass
+    book = await BookRepository(db).get(book_id, {'original_language': 1})
 
-    new_file_id = await bucket.upload_from_stream(file.filename, content)
+    stored = await uploads.store_upload(db, file, file.filename, book.get('original_language'))
+    await attach.attach_source(db, book_id, stored.file_id, file.filename, stored.stats)
 
-    # Update book document with new file id and filename
-    await db.books.update_one(
-        {"_id": ObjectId(book_id)},
-        {"$set": {"source_file_id": new_file_id, "source_filename": file.filename}}
+    return SourceUploadResponse(
+        id=book_id, source_file_id=str(stored.file_id), source_filename=file.filename, source_stats=stored.stats
     )
 
-    return SourceUploadResponse(id=book_id, source_file_id=str(new_file_id), source_filename=file.filename)
-
 
 @router.get("/books", response_model=List[BookOut])
-async def list_books(limit: int = 50, request: Request = None):
+async def list_books(
+    limit: Optional[int] = Query(None, description="Default 50; all books when streaming NDJSON"),
+    request: Request = None,
+    fields: Optional[str] = Query(None, description=BOOK_FIELDS_DESCRIPTION),
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$", description=ndjson.FORMAT_DESCRIPTION),
+    batch_size: Optional[int] = Query(None, ge=1, description=ndjson.BATCH_SIZE_DESCRIPTION),
+):
     db = request.app.state.db
-    items: List[BookOut] = []
+    fieldset = parse_fields(fields)
+    if ndjson.wants_ndjson(request, response_format):
+        cursor = db.books.find({}, book_projection(fieldset)).limit(limit or 0)
+        return ndjson.ndjson_response(_stream_books(db, cursor, fieldset, ndjson.batch_size(batch_size)), "books")
     try:
-        cursor = db.books.find().limit(limit)
-        async for doc in cursor:
-            # Serialize book document
-            doc['id'] = str(doc['_id'])
-            doc.pop('_id', None)
-            # Normalize ObjectId fields for Pydantic
-            if doc.get('source_file_id') is not None:
-                try:
-                    doc['source_file_id'] = str(doc['source_file_id'])
-                except Exception:
-                    doc['source_file_id'] = None
-            # fetch translations for this book
-            translations = []
-            try:
-                trans_cursor = db.translations.find({'book_id': ObjectId(doc['id'])})
-                async for tdoc in trans_cursor:
-                    try:
-                        # Build a fully serialized translation object for the response model
-                        t_out = {
-                            'id': str(tdoc.get('_id')),
-                            'book_id': str(tdoc.get('book_id')) if tdoc.get('book_id') is not None else '',
-                            'language': tdoc.get('language') or '',
-                            'filename': tdoc.get('filename') or '',
-                            'text': tdoc.get('text'),
-                            'file_id': (str(tdoc.get('file_id')) if tdoc.get('file_id') is not None else None),
-                            'translated_by': tdoc.get('translated_by'),
-                        }
-                        translations.append(TranslatedBookOut(**t_out))
-                    except Exception as e:
-                        # Log and skip malformed translation records instead of failing the entire request
-                        print(f"⚠️  Skipping malformed translation {_safe_id(tdoc)}: {e}")
-                        continue
-            except Exception as e:
-                print(f"⚠️  Failed to read translations for book {doc.get('id')}: {e}")
+        docs = [doc async for doc in db.books.find({}, book_projection(fieldset)).limit(50 if limit is None else limit)]
+        return ORJSONResponse(await _book_rows(db, docs, fieldset))
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Ensure CORS headers are still applied by returning a handled error
+        print(f"❌ Database error while listing books: {e}")
+        raise HTTPException(status_code=503, detail="Database unavailable")
+
+
+async def _book_rows(db, docs: list, fieldset: FieldSet) -> list:
+    """Serialized books of one page, with their translations; malformed books are skipped."""
+    by_book = await _translations_by_book(db, [doc['_id'] for doc in docs if '_id' in doc], fieldset)
+    items = []
+    check_title = fieldset.book is None or 'title' in fieldset.book
+    for doc in docs:
+        if check_title and not is_valid_book(doc):
+            print(f"⚠️  Skipping malformed book {_safe_id(doc)}")
+            continue
+        items.append(select_book(doc, by_book.get(doc.get('_id'), []), fieldset))
+    return items
+
+
+async def _stream_books(db, cursor, fieldset: FieldSet, size: int):
+    async for docs in ndjson.batches(cursor, size):
+        for item in await _book_rows(db, docs, fieldset):
+            yield item
+
+
+async def _catalog_snapshot(db, seq: int, after: Optional[ObjectId]) -> ORJSONResponse:
+    """One page of the full catalog for a reset; the first page (`after` None) is the one flagged `reset`."""
+    query = {'_id': {'$gt': after}} if after is not None else {}
+    docs = await db.books.find(query).sort('_id', 1).limit(changes.CATALOG_CHANGES_PAGE + 1).to_list(None)
+    more = len(docs) > changes.CATALOG_CHANGES_PAGE
+    docs = docs[:changes.CATALOG_CHANGES_PAGE]
+    by_book = await _translations_by_book(db, [doc['_id'] for doc in docs], ALL_FIELDS)
+    return ORJSONResponse({
+        "token": changes.snapshot_token(seq, docs[-1]['_id']) if more else str(seq),
+        "reset": after is None,
+        "more": more,
+        "books": [book_to_dict(doc, by_book.get(doc['_id'], [])) for doc in docs if is_valid_book(doc)],
+        "translations": [],
+        "deleted_books": [],
+        "deleted_translations": [],
+    })
+
+
+@router.get("/books/changes", response_model=CatalogChangesOut)
+async def catalog_changes(
+    request: Request,
+    since: Optional[str] = Query(None, description="Token from the previous sync; omit for the full catalog"),
+):
+    """Books and translations added, changed or deleted since a sync token.
 
+    Clients keep a local copy of the catalog and only fetch what changed; with
+    nothing new the response is just the (unchanged) token.
+    """
+    db = request.app.state.db
+    seq, snapshot_after = changes.parse_token(since)
+
+    if snapshot_after is not None:
+        return await _catalog_snapshot(db, seq, snapshot_after)
+    if seq is None or await changes.needs_reset(db, seq):
+        # Read the token first: writes racing with the snapshot are sent again next time
+        return await _catalog_snapshot(db, await changes.current_seq(db), None)
+
+    latest, token, more = await changes.changes_since(db, seq)
+    book_ids, deleted_books = changes.split(latest, changes.BOOK)
+    translation_ids, deleted_translations = changes.split(latest, changes.TRANSLATION)
+
+    docs = [doc async for doc in db.books.find({'_id': {'$in': book_ids}})] if book_ids else []
+    by_book = await _translations_by_book(db, [doc['_id'] for doc in docs], ALL_FIELDS)
+    # Translations of books sent above are already embedded there
+    sent = {doc['_id'] for doc in docs}
+    tdocs = []
+    if translation_ids:
+        tdocs = [
+            translation_to_dict(t)
+            async for t in db.translations.find({'_id': {'$in': translation_ids}})
+            if t.get('book_id') not in sent
+        ]
+    return ORJSONResponse({
+        "token": str(token),
+        "reset": False,
+        "more": more,
+        "books": [book_to_dict(doc, by_book.get(doc['_id'], [])) for doc in docs if is_valid_book(doc)],
+        "translations": tdocs,
+        "deleted_books": [str(i) for i in deleted_books],
+        "deleted_translations": [str(i) for i in deleted_translations],
+    })
+
+
+@router.get("/books/popular", response_model=List[PopularBookOut])
+async def popular_books(
+    request: Request,
+    window: str = Query("7d", description="Period to rank over, in days: `1d` to `90d`"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Most viewed and downloaded books over the window, from the buffered access counters."""
+    db = request.app.state.db
+    rows = await popularity.popular(db, popularity.parse_window(window), limit)
+    book_ids = [r['book_id'] for r in rows]
+    translation_ids = [ObjectId(tid) for r in rows for tid in r['translations'] if ObjectId.is_valid(tid)]
+    projection = {'title': 1, 'author': 1, 'year': 1, 'original_language': 1}
+    books = {b['_id']: b async for b in db.books.find({'_id': {'$in': book_ids}}, projection)} if book_ids else {}
+    tdocs = {
+        str(t['_id']): t
+        async for t in db.translations.find({'_id': {'$in': translation_ids}}, {'language': 1, 'translated_by': 1})
+    } if translation_ids else {}
+
+    out = []
+    for r in rows:
+        b = books.get(r['book_id'])
+        if not b:
+            continue
+        translations = sorted(
+            (
+                {
+                    'id': tid,
+                    'language': tdocs[tid].get('language'),
+                    'translated_by': tdocs[tid].get('translated_by'),
+                    **counts,
+                }
+                for tid, counts in r['translations'].items()
+                if tid in tdocs
+            ),
+            key=lambda t: t['views'] + t['downloads'],
+            reverse=True,
+        )
+        out.append({
+            'id': str(b['_id']),
+            'title': b.get('title'),
+            'author': b.get('author'),
+            'year': b.get('year'),
+            'original_language': b.get('original_language'),
+            'views': r['views'],
+            'downloads': r['downloads'],
+            'translations': translations,
+        })
+    return ORJSONResponse(out)
+
+
+async def _translations_by_book(db, book_ids: list, fieldset: FieldSet) -> dict:
+    """Serialized translations for a page of books, fetched with one query and grouped by book _id."""
+    by_book: dict = {}
+    if not fieldset.with_translations or not book_ids:
+        return by_book
+    try:
+        trans_cursor = TranslationRepository(db).for_books(book_ids, translation_projection(fieldset))
+        async for tdoc in trans_cursor:
             try:
-                items.append(BookOut(**doc, translated_books=translations))
+                by_book.setdefault(tdoc.get('book_id'), []).append(select_translation(tdoc, fieldset))
             except Exception as e:
-                print(f"⚠️  Skipping malformed book {doc.get('id')}: {e}")
+                # Log and skip malformed translation records instead of failing the entire request
+                print(f"⚠️  Skipping malformed translation {_safe_id(tdoc)}: {e}")
                 continue
-        return items
     except Exception as e:
-        # Ensure CORS headers are still applied by returning a handled error
-        print(f"❌ Database error while listing books: {e}")
-        from fastapi import HTTPException
-        raise HTTPException(status_code=503, detail="Database unavailable")
+        print(f"⚠️  Failed to read translations for book page: {e}")
+    return by_book
+
+
+@router.get("/books/{book_id}", response_model=BookOut)
+async def get_book(
+    book_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description=BOOK_FIELDS_DESCRIPTION),
+):
+    """Return one book with its translations."""
+    db = request.app.state.db
+    fieldset = parse_fields(fields)
+    books = BookRepository(db)
+    oid = books.oid(book_id)
+    doc = await books.get(oid, book_projection(fieldset))
+    by_book = await _translations_by_book(db, [oid], fieldset)
+    return ORJSONResponse(select_book(doc, by_book.get(oid, []), fieldset))
+
+
+@router.get("/books/{book_id}/translations", response_model=List[TranslatedBookOut])
+async def list_book_translations(
+    book_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description=TRANSLATION_FIELDS_DESCRIPTION),
+):
+    """Return the translations of one book."""
+    db = request.app.state.db
+    fieldset = parse_fields(fields, allow_book_fields=False)
+    oid = BookRepository(db).oid(book_id)
+    by_book = await _translations_by_book(db, [oid], fieldset)
+    return ORJSONResponse(by_book.get(oid, []))
+
+
+@register_warmup
+async def warm_catalog(app) -> None:
+    """Pull the first catalog page so Mongo's cache and our serializers are hot for the first visitor."""
+    db = app.state.db
+    docs = await db.books.find().limit(50).to_list(50)
+    await db.translations.find({'book_id': {'$in': [d['_id'] for d in docs]}}).to_list(None)
 
 
 def _safe_id(d: dict):
@@ -403,51 +605,66 @@ async def delete_book(book_id: str, request: Request, _: bool = Depends(require_
     """Delete a book and its related resources.
     - Removes the book document
     - Removes all translations for the book
-    - Deletes any associated GridFS files (book source_file_id and translation file_id)
+    - Deletes any associated stored files (book source_file_id and translation file_id)
     """
     db = request.app.state.db
+    books = BookRepository(db)
+    translations = TranslationRepository(db)
     # Find the book
-    try:
-        book = await db.books.find_one({"_id": ObjectId(book_id)})
-    except Exception:
-        book = None
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
+    book = await books.get(book_id, {'source_file_id': 1, 'original_language': 1})
+    oid = book['_id']
 
-    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
+    storage = file_storage(db)
 
     # Delete book's original source file if present
     src_id = book.get("source_file_id")
     if src_id:
         try:
-            await bucket.delete(ObjectId(src_id))
+            await storage.delete(src_id)
         except Exception:
             # Non-fatal: log and continue
             pass
 
     # Collect translations and delete their files
+    translation_ids, file_ids, tdocs = [], [], []
     try:
-        async for tdoc in db.translations.find({"book_id": ObjectId(book_id)}):
+        async for tdoc in translations.for_books([oid], {'file_id': 1, 'language': 1, 'translated_by': 1}):
+            tdocs.append(tdoc)
+            translation_ids.append(tdoc["_id"])
             fid = tdoc.get("file_id")
             if fid:
+                file_ids.append(fid)
                 try:
-                    await bucket.delete(ObjectId(fid))
+                    await storage.delete(fid)
                 except Exception:
                     pass
     except Exception:
         # Continue even if listing translations fails
         pass
 
+    # Remove revision history and its snapshot files
+    try:
+        await revisions.delete_history(db, translation_ids, keep_file_ids=file_ids)
+    except Exception:
+        pass
+
     # Remove translation documents
     try:
-        await db.translations.delete_many({"book_id": ObjectId(book_id)})
+        await translations.delete_for_book(oid)
     except Exception:
         # Non-fatal
         pass
 
     # Finally remove the book document
-    res = await db.books.delete_one({"_id": ObjectId(book_id)})
-    if not res.acknowledged:
-        raise HTTPException(status_code=500, detail="Failed to delete book")
+    await books.delete(oid)
+
+    # Tombstones so synced clients drop the book and its translations
+    await changes.record(db, [(changes.TRANSLATION, changes.DELETE, tid) for tid in translation_ids] + [
+        (changes.BOOK, changes.DELETE, oid)
+    ])
+    await stats.book_removed(db, book, tdocs)
+    await similar.book_removed(db, oid)
+    await glossary.book_removed(db, oid)
+    await evaluation.book_removed(db, oid)
 
     return {"status": "deleted", "id": book_id}
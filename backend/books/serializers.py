@@ -0,0 +1,174 @@
+"""Map Mongo documents straight to response dicts.
+
+Handlers return these dicts through ``ORJSONResponse`` so each document is
+converted exactly once (ObjectId -> str) and encoded by orjson, instead of being
+built into Pydantic models and then re-validated and re-serialized by FastAPI's
+``response_model`` machinery. The route decorators keep ``response_model`` so
+the OpenAPI schema is unchanged; the dicts below must stay in sync with
+``BookOut`` / ``TranslatedBookOut``.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+# BookIn fields that are copied as-is from the book document
+BOOK_FIELDS = (
+    "title",
+    "author",
+    "year",
+    "description",
+    "original_language",
+    "source",
+    "source_filename",
+)
+
+
+def str_id(value: Any) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def translation_to_dict(tdoc: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize a `translations` document in the shape of TranslatedBookOut."""
+    return {
+        "language": tdoc.get("language") or "",
+        "filename": tdoc.get("filename") or "",
+        "text": tdoc.get("text"),
+        "translated_by": tdoc.get("translated_by"),
+        "id": str(tdoc["_id"]),
+        "book_id": str_id(tdoc.get("book_id")) or "",
+        "file_id": str_id(tdoc.get("file_id")),
+        "text_stats": tdoc.get("text_stats"),
+        "updated_at": tdoc.get("updated_at"),
+    }
+
+
+def book_to_dict(doc: Dict[str, Any], translations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Serialize a `books` document (plus serialized translations) in the shape of BookOut."""
+    out = {field: doc.get(field) for field in BOOK_FIELDS}
+    out["translated_books"] = translations
+    out["id"] = str(doc["_id"])
+    out["source_file_id"] = str_id(doc.get("source_file_id"))
+    out["source_stats"] = doc.get("source_stats")
+    out["updated_at"] = doc.get("updated_at")
+    return out
+
+
+def is_valid_book(doc: Dict[str, Any]) -> bool:
+    """Cheap stand-in for the model validation that used to drop malformed books."""
+    return isinstance(doc.get("title"), str)
+
+
+# Sparse fieldsets (`?fields=`). Names are the response field names; nested
+# translation fields are addressed as `translated_books.<field>`.
+_BOOK_GETTERS = {
+    **{field: (lambda f: lambda doc: doc.get(f))(field) for field in BOOK_FIELDS},
+    "id": lambda doc: str(doc["_id"]),
+    "source_file_id": lambda doc: str_id(doc.get("source_file_id")),
+    "source_stats": lambda doc: doc.get("source_stats"),
+    "updated_at": lambda doc: doc.get("updated_at"),
+}
+BOOK_OUT_FIELDS = tuple(_BOOK_GETTERS) + ("translated_books",)
+
+_TRANSLATION_GETTERS = {
+    "language": lambda t: t.get("language") or "",
+    "filename": lambda t: t.get("filename") or "",
+    "text": lambda t: t.get("text"),
+    "translated_by": lambda t: t.get("translated_by"),
+    "id": lambda t: str(t["_id"]),
+    "book_id": lambda t: str_id(t.get("book_id")) or "",
+    "file_id": lambda t: str_id(t.get("file_id")),
+    "text_stats": lambda t: t.get("text_stats"),
+    "updated_at": lambda t: t.get("updated_at"),
+}
+TRANSLATION_OUT_FIELDS = tuple(_TRANSLATION_GETTERS)
+
+BOOK_FIELDS_DESCRIPTION = (
+    "Comma-separated response fields to return, e.g. "
+    "`id,title,author,original_language,translated_books.language`. "
+    f"Book fields: {', '.join(BOOK_OUT_FIELDS)}. "
+    f"Translation fields (prefix with `translated_books.`): {', '.join(TRANSLATION_OUT_FIELDS)}; "
+    "`translated_books` alone returns whole translation objects. "
+    "Unrequested fields are not read from the database. Default: all fields."
+)
+TRANSLATION_FIELDS_DESCRIPTION = (
+    f"Comma-separated response fields to return, from: {', '.join(TRANSLATION_OUT_FIELDS)}. "
+    "Unrequested fields are not read from the database. Default: all fields."
+)
+
+
+class FieldSet:
+    """Parsed `fields=` parameter; `None` members mean "everything"."""
+
+    def __init__(self, book: Optional[tuple], translation: Optional[tuple], with_translations: bool):
+        self.book = book
+        self.translation = translation
+        self.with_translations = with_translations
+
+
+def parse_fields(spec: Optional[str], allow_book_fields: bool = True) -> FieldSet:
+    """Validate a `fields=` value. Raises 400 on unknown names."""
+    if spec is None or not spec.strip():
+        return FieldSet(None, None, True)
+    book, translation = [], []
+    whole_translations = False
+    for name in (n.strip() for n in spec.split(",")):
+        if not name:
+            continue
+        prefix, _, sub = name.partition(".")
+        if allow_book_fields and prefix == "translated_books":
+            if not sub:
+                whole_translations = True
+            elif sub in _TRANSLATION_GETTERS:
+                translation.append(sub)
+            else:
+                raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        elif allow_book_fields and name in _BOOK_GETTERS:
+            book.append(name)
+        elif not allow_book_fields and name in _TRANSLATION_GETTERS:
+            translation.append(name)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+    if not allow_book_fields:
+        return FieldSet(None, tuple(dict.fromkeys(translation)), True)
+    with_translations = whole_translations or bool(translation)
+    return FieldSet(
+        tuple(dict.fromkeys(book)),
+        None if whole_translations else tuple(dict.fromkeys(translation)),
+        with_translations,
+    )
+
+
+def book_projection(fields: FieldSet) -> Optional[Dict[str, int]]:
+    if fields.book is None:
+        return None
+    projection = {f: 1 for f in fields.book if f != "id"}
+    if "id" not in fields.book:
+        projection["_id"] = 0 if not fields.with_translations else 1
+    return projection or {"_id": 1}
+
+
+def translation_projection(fields: FieldSet) -> Optional[Dict[str, int]]:
+    if fields.translation is None:
+        return None
+    # book_id is always read so translations can be grouped per book
+    projection = {f: 1 for f in fields.translation if f != "id"}
+    projection["book_id"] = 1
+    if "id" not in fields.translation:
+        projection["_id"] = 0
+    return projection
+
+
+def select_translation(tdoc: Dict[str, Any], fields: FieldSet) -> Dict[str, Any]:
+    if fields.translation is None:
+        return translation_to_dict(tdoc)
+    return {f: _TRANSLATION_GETTERS[f](tdoc) for f in fields.translation}
+
+
+def select_book(doc: Dict[str, Any], translations: List[Dict[str, Any]], fields: FieldSet) -> Dict[str, Any]:
+    if fields.book is None:
+        return book_to_dict(doc, translations)
+    out = {f: _BOOK_GETTERS[f](doc) for f in fields.book}
+    if fields.with_translations:
+        out["translated_books"] = translations
+    return out
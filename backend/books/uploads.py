@@ -0,0 +1,147 @@
+"""Uploads into file storage, through the text ingest stage (books/ingest.py).
+
+Every uploaded file is copied into storage (core/storage.py) in chunks straight
+from the spooled request body, normalized to UTF-8 and analyzed on the way; the
+decoding and counting run in the default executor. Multipart book creation
+(`POST /books/upload`) stores a few parts at a time. If any part fails, every
+file that did make it into storage is deleted again, so a failed request leaves
+nothing behind.
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import UploadFile
+
+from core.storage import FileStorage, file_storage
+from core.tracing import span
+
+from .ingest import TextIngest
+
+BOOK_UPLOAD_CONCURRENCY = int(os.environ.get("BOOK_UPLOAD_CONCURRENCY", "4"))
+# Matches the default GridFS chunk size so each write fills one chunk
+UPLOAD_CHUNK_BYTES = 255 * 1024
+
+
+class StoredFile:
+    def __init__(self, file_id: ObjectId, filename: str, size: int, lines: int, stats: Dict[str, Any],
+                 content: Optional[bytes] = None):
+        self.file_id = file_id
+        self.filename = filename
+        self.size = size
+        self.lines = lines
+        self.stats = stats
+        # The stored bytes, when asked for (revisions need them to record a change)
+        self.content = content
+
+
+async def _upload_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _stored_chunks(stream) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
+
+async def _ingest(storage: FileStorage, chunks: AsyncIterator[bytes], filename: str, language: Optional[str],
+                  keep: bool = False) -> StoredFile:
+    loop = asyncio.get_running_loop()
+    text = TextIngest(language)
+    kept: Optional[List[bytes]] = [] if keep else None
+    grid_in = storage.writer(filename)
+
+    async def write(data: bytes) -> None:
+        if data:
+            await grid_in.write(data)
+            if kept is not None:
+                kept.append(data)
+
+    with span("storage.upload", filename=filename) as s:
+        try:
+            async for chunk in chunks:
+                await write(await loop.run_in_executor(None, text.feed, chunk))
+            await write(await loop.run_in_executor(None, text.finish))
+            stats = await loop.run_in_executor(None, text.stats)
+            await grid_in.close()
+        except BaseException:
+            await grid_in.abort()
+            raise
+        if s:
+            s.set("bytes", text.size)
+            s.set("encoding", text.encoding)
+    return StoredFile(grid_in._id, filename, text.size, text.lines, stats, b"".join(kept) if keep else None)
+
+
+async def store_upload(db, upload: UploadFile, filename: str, language: Optional[str],
+                       keep: bool = False) -> StoredFile:
+    """Store one uploaded text file as UTF-8, with its statistics checked against the declared `language`.
+
+    `keep` also returns the stored bytes as `content`.
+    """
+    return await _ingest(file_storage(db), _upload_chunks(upload), filename, language, keep)
+
+
+async def ingest_stored(db, file_id: ObjectId, filename: str, language: Optional[str]) -> StoredFile:
+    """Analyze a file that is already in storage (a finalized resumable upload).
+
+    A file that is clean UTF-8 stays as it is. Anything else is stored again,
+    normalized, under a new id; the caller deletes the original once the new
+    file is attached.
+    """
+    storage = file_storage(db)
+    loop = asyncio.get_running_loop()
+    text = TextIngest(language)
+    async for chunk in _stored_chunks(await storage.open(file_id)):
+        await loop.run_in_executor(None, text.feed, chunk)
+    await loop.run_in_executor(None, text.finish)
+    if text.changed:
+        return await _ingest(storage, _stored_chunks(await storage.open(file_id)), filename, language)
+    stats = await loop.run_in_executor(None, text.stats)
+    return StoredFile(file_id, filename, text.size, text.lines, stats)
+
+
+async def _store(db, upload: UploadFile, filename: str, language: Optional[str],
+                 limit: asyncio.Semaphore) -> StoredFile:
+    async with limit:
+        return await store_upload(db, upload, filename, language)
+
+
+async def delete_files(db, file_ids: List[ObjectId]) -> None:
+    """Best-effort removal of files uploaded by a request that failed later on."""
+    storage = file_storage(db)
+    for file_id in file_ids:
+        try:
+            await storage.delete(file_id)
+        except Exception as e:
+            print(f"⚠️  Failed to roll back upload {file_id}: {e}")
+
+
+async def store_all(db, uploads: List[Tuple[UploadFile, str, Optional[str]]]) -> List[StoredFile]:
+    """Upload `(file, filename, declared language)` triples into storage, at most BOOK_UPLOAD_CONCURRENCY at a time.
+
+    Returns results in input order. On any failure the files already stored are
+    deleted and the first error is raised.
+    """
+    limit = asyncio.Semaphore(BOOK_UPLOAD_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_store(db, upload, filename, language, limit) for upload, filename, language in uploads),
+        return_exceptions=True,
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        await delete_files(db, [r.file_id for r in results if isinstance(r, StoredFile)])
+        raise errors[0]
+    return results
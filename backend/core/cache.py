@@ -0,0 +1,67 @@
+"""In-process caches shared by the route modules."""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ByteLRU:
+    """LRU of bytes values bounded by their total size rather than entry count.
+
+    Values larger than the whole budget are not cached. Used from the event loop
+    only, so no locking.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._items[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+
+    def pop_where(self, predicate) -> None:
+        """Drop every entry whose key satisfies `predicate(key)`."""
+        for key in [k for k in self._items if predicate(k)]:
+            self.pop(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
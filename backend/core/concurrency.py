@@ -0,0 +1,238 @@
+"""Per-route-class concurrency limits with priority admission.
+
+Requests are sorted into classes by method and path (see ROUTE_CLASSES):
+
+- ``interactive``: catalog reads and edits (the default)
+- ``auth``: login and registration
+- ``bulk``: file downloads, uploads and other large transfers
+- ``admin``: admin, stats and evaluation endpoints
+
+Each class may run at most ``CONCURRENCY_<CLASS>_LIMIT`` requests at once, and
+all classes together at most ``CONCURRENCY_TOTAL_LIMIT`` (keep it below the
+Mongo pool size). A request over its limit waits in its class's FIFO queue.
+When a slot frees up, the waiting request of the highest-priority class that is
+under its own limit goes next, so a queue of downloads never delays catalog
+pages. A full queue (``CONCURRENCY_<CLASS>_QUEUE``) or a wait longer than
+``CONCURRENCY_QUEUE_TIMEOUT_S`` sheds the request with 503 and ``Retry-After``.
+
+A slot is held until the response body has been sent, so a streaming download
+counts against ``bulk`` for as long as it runs.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+CONCURRENCY_LIMITS_ENABLED = os.environ.get("CONCURRENCY_LIMITS_ENABLED", "true").lower() in ("1", "true", "yes")
+CONCURRENCY_TOTAL_LIMIT = int(os.environ.get("CONCURRENCY_TOTAL_LIMIT", "80"))
+CONCURRENCY_QUEUE_TIMEOUT_S = float(os.environ.get("CONCURRENCY_QUEUE_TIMEOUT_S", "10"))
+CONCURRENCY_RETRY_AFTER_S = int(os.environ.get("CONCURRENCY_RETRY_AFTER_S", "1"))
+
+# name: (priority (lower runs first), default limit, default queue length)
+CLASS_DEFAULTS = {
+    "interactive": (0, 64, 256),
+    "auth": (0, 16, 64),
+    "admin": (1, 8, 32),
+    "bulk": (2, 16, 64),
+}
+
+# First match wins; None as method matches any method
+ROUTE_CLASSES: List[Tuple[Optional[str], "re.Pattern[str]", str]] = [
+    (None, re.compile(r"^/api/users/(login|register)$"), "auth"),
+    (None, re.compile(r"^/api/(admin|stats)(/|$)"), "admin"),
+    (None, re.compile(r"^/api/(books/[^/]+/)?evaluations(/|$)"), "admin"),
+    (None, re.compile(r"^/api/translations/[^/]+/(file|view)$"), "bulk"),
+    (None, re.compile(r"^/api/translations/[^/]+/revisions/[^/]+(/diff)?$"), "bulk"),
+    (None, re.compile(r"^/api/books/[^/]+/source$"), "bulk"),
+    (None, re.compile(r"^/api/books/[^/]+/bundle\.zip$"), "bulk"),
+    ("POST", re.compile(r"^/api/books/[^/]+/translations$"), "bulk"),
+    (None, re.compile(r"^/api/books/upload$"), "bulk"),
+    (None, re.compile(r"^/api/uploads(/|$)"), "bulk"),
+]
+# Never limited: health checks must answer even when the worker is saturated
+EXEMPT_PATHS = ("/health", "/ready")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Class name for a request, or None if it is exempt."""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    for rule_method, pattern, name in ROUTE_CLASSES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return name
+    return "interactive"
+
+
+class Overloaded(Exception):
+    pass
+
+
+class RouteClass:
+    def __init__(self, name: str, priority: int, limit: int, queue_limit: int):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.inflight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "RouteClass":
+        priority, limit, queue = CLASS_DEFAULTS[name]
+        return cls(
+            name,
+            priority,
+            int(os.environ.get(f"CONCURRENCY_{name.upper()}_LIMIT", str(limit))),
+            int(os.environ.get(f"CONCURRENCY_{name.upper()}_QUEUE", str(queue))),
+        )
+
+    def _record_wait(self, waited_ms: float) -> None:
+        self.admitted += 1
+        self.total_wait_ms += waited_ms
+        self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "queue_limit": self.queue_limit,
+            "inflight": self.inflight,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 3) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+class Scheduler:
+    """Admission control for one worker (all state lives on its event loop)."""
+
+    def __init__(self, classes: List[RouteClass], total_limit: int = CONCURRENCY_TOTAL_LIMIT,
+                 queue_timeout_s: float = CONCURRENCY_QUEUE_TIMEOUT_S):
+        self.classes = {c.name: c for c in classes}
+        self._by_priority = sorted(classes, key=lambda c: c.priority)
+        self.total_limit = total_limit
+        self.queue_timeout_s = queue_timeout_s
+        self.inflight = 0
+
+    def _can_run(self, c: RouteClass) -> bool:
+        return c.inflight < c.limit and self.inflight < self.total_limit
+
+    def _higher_priority_waiting(self, c: RouteClass) -> bool:
+        return any(
+            other.waiters and other.priority < c.priority and other.inflight < other.limit
+            for other in self._by_priority
+        )
+
+    def _start(self, c: RouteClass) -> None:
+        c.inflight += 1
+        self.inflight += 1
+
+    async def acquire(self, name: str) -> None:
+        """Wait for a slot in class `name`; raises Overloaded when the request is shed."""
+        c = self.classes[name]
+        if not c.waiters and self._can_run(c) and not self._higher_priority_waiting(c):
+            self._start(c)
+            c._record_wait(0.0)
+            return
+        if len(c.waiters) >= c.queue_limit:
+            c.shed += 1
+            raise Overloaded(name)
+
+        waiter = asyncio.get_running_loop().create_future()
+        c.waiters.append(waiter)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Admitted just as the timeout fired: keep the slot
+                c._record_wait((time.perf_counter() - t0) * 1000.0)
+                return
+            c.waiters.remove(waiter)
+            waiter.cancel()
+            c.timeouts += 1
+            c.shed += 1
+            raise Overloaded(name)
+        except asyncio.CancelledError:
+            # Client went away while queued: give back a slot that was already granted
+            if waiter.done() and not waiter.cancelled():
+                self.release(name)
+            elif waiter in c.waiters:
+                c.waiters.remove(waiter)
+            raise
+        c._record_wait((time.perf_counter() - t0) * 1000.0)
+
+    def release(self, name: str) -> None:
+        c = self.classes[name]
+        c.inflight -= 1
+        self.inflight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, highest priority first."""
+        while self.inflight < self.total_limit:
+            for c in self._by_priority:
+                if c.waiters and c.inflight < c.limit:
+                    waiter = c.waiters.popleft()
+                    self._start(c)
+                    waiter.set_result(None)
+                    break
+            else:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": CONCURRENCY_LIMITS_ENABLED,
+            "total_limit": self.total_limit,
+            "inflight": self.inflight,
+            "queue_timeout_s": self.queue_timeout_s,
+            "classes": {name: c.stats() for name, c in self.classes.items()},
+        }
+
+
+scheduler = Scheduler([RouteClass.from_env(name) for name in CLASS_DEFAULTS])
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware applying `scheduler` to every HTTP request."""
+
+    def __init__(self, app, scheduler: Scheduler = scheduler):
+        self.app = app
+        self.scheduler = scheduler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope.get("method", ""), scope.get("path", ""))
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.scheduler.acquire(name)
+        except Overloaded:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(CONCURRENCY_RETRY_AFTER_S).encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Server busy, retry shortly"}'})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.scheduler.release(name)
@@ -0,0 +1,140 @@
+"""Mongo client configuration, connection-pool monitoring and readiness checks."""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from pymongo import monitoring
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "0"))  # 0 = no timeout
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))  # 0 = wait forever
+READY_PING_TIMEOUT_S = float(os.environ.get("READY_PING_TIMEOUT_S", "2"))
+
+
+def client_options() -> Dict[str, Any]:
+    """Keyword arguments for AsyncIOMotorClient built from the MONGO_* env vars."""
+    options: Dict[str, Any] = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if MONGO_SOCKET_TIMEOUT_MS > 0:
+        options["socketTimeoutMS"] = MONGO_SOCKET_TIMEOUT_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS > 0:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    return options
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Aggregated connection-pool counters across all server pools.
+
+    pymongo calls these hooks from whichever thread checks out a connection, so
+    counters are guarded by a lock and checkout start times are thread-local.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.pools = 0
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools = max(0, self.pools - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+    def _checkout_done(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return (time.perf_counter() - started) * 1000.0 if started is not None else 0.0
+
+    def connection_check_out_failed(self, event):
+        self._checkout_done()
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = self._checkout_done()
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checked_out += 1
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            capacity = MONGO_MAX_POOL_SIZE * max(self.pools, 1)
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE,
+                "pools": self.pools,
+                "open_connections": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "utilization": round(self.checked_out / capacity, 4),
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+            }
+
+
+pool_stats = PoolStats()
+
+
+async def ping(db) -> float:
+    """Round-trip a `ping` command; returns latency in milliseconds."""
+    t0 = time.perf_counter()
+    await asyncio.wait_for(db.command("ping"), timeout=READY_PING_TIMEOUT_S)
+    return (time.perf_counter() - t0) * 1000.0
+
+
+async def open_min_pool(db) -> None:
+    """Force the pool up to minPoolSize now instead of on the first requests."""
+    await asyncio.gather(*(db.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
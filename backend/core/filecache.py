@@ -0,0 +1,100 @@
+"""Hot-file cache for stored texts with request coalescing.
+
+Popular texts are kept in a byte-budgeted LRU keyed by file id. That is
+safe without invalidation because a replaced source or translation always gets
+a new file id. Concurrent misses for the same id share one storage read
+("singleflight"), so a spike on a featured title costs one Mongo read per
+distinct file rather than per request. With the local storage backend, texts
+are served from disk instead and this cache is not used (see core/storage.py).
+
+Files over `FILE_CACHE_MAX_FILE_BYTES` are never cached; callers get an open
+download stream instead and send it chunk by chunk.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Union
+
+from .cache import ByteLRU
+from .storage import file_storage
+from .tracing import span
+
+FILE_CACHE_BYTES = int(os.environ.get("FILE_CACHE_BYTES", str(128 * 1024 * 1024)))
+FILE_CACHE_MAX_FILE_BYTES = int(os.environ.get("FILE_CACHE_MAX_FILE_BYTES", str(16 * 1024 * 1024)))
+
+# Remember this many too-large file ids so they skip the coalescing path
+_LARGE_IDS_MAX = 4096
+
+_TOO_LARGE = object()
+
+
+class FileCache:
+    def __init__(self, max_bytes: int = FILE_CACHE_BYTES, max_file_bytes: int = FILE_CACHE_MAX_FILE_BYTES):
+        self.lru = ByteLRU(max_bytes)
+        self.max_file_bytes = max_file_bytes
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._large: Dict[str, None] = {}
+        self.loads = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    async def _open(self, db, file_id):
+        return await file_storage(db).open(file_id)
+
+    async def _load(self, db, key: str):
+        self.loads += 1
+        with span("storage.download", file_id=key) as s:
+            stream = await self._open(db, key)
+            if stream.length > self.max_file_bytes:
+                stream.close()
+                return _TOO_LARGE
+            data = await stream.read()
+            if s:
+                s.set("bytes", len(data))
+        self.lru.put(key, data)
+        return data
+
+    def _remember_large(self, key: str) -> None:
+        self._large[key] = None
+        if len(self._large) > _LARGE_IDS_MAX:
+            self._large.pop(next(iter(self._large)))
+
+    async def fetch(self, db, file_id) -> Union[bytes, Any]:
+        """File contents as bytes, or an open download stream for files too large to cache.
+
+        Raises whatever the storage backend raises for a missing or unreadable file.
+        """
+        key = str(file_id)
+        data = self.lru.get(key)
+        if data is not None:
+            return data
+
+        if key not in self._large:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._load(db, key))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+            else:
+                self.coalesced += 1
+            # shield: a cancelled (disconnected) request must not cancel the read others wait on
+            result = await asyncio.shield(task)
+            if result is not _TOO_LARGE:
+                return result
+            self._remember_large(key)
+
+        self.bypassed += 1
+        return await self._open(db, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.lru.stats(),
+            "max_file_bytes": self.max_file_bytes,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "bypassed_large": self.bypassed,
+            "inflight": len(self._inflight),
+        }
+
+
+file_cache = FileCache()
@@ -0,0 +1,27 @@
+"""Time-based leases so periodic jobs run in one worker at a time."""
+
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+async def acquire_lease(collection, lease_id: str, seconds: float) -> bool:
+    """Take the lease document `lease_id` in `collection` for `seconds`, unless another worker holds it."""
+    now = datetime.now(timezone.utc)
+    try:
+        lease = await collection.find_one_and_update(
+            {"_id": lease_id, "until": {"$lt": now}},
+            {"$set": {"until": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The lease exists and is still held by another worker
+        return False
+    return lease is not None
+
+
+async def release_lease(collection, lease_id: str) -> None:
+    """Let other workers take `lease_id` right away (the holder is done before it expired)."""
+    await collection.update_one({"_id": lease_id}, {"$set": {"until": datetime.now(timezone.utc)}})
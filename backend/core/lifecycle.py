@@ -0,0 +1,140 @@
+"""Startup warm-up, background jobs, readiness reporting and graceful shutdown."""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from .db import ping, open_min_pool, pool_stats
+
+SHUTDOWN_DRAIN_TIMEOUT_S = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT_S", "30"))
+
+WarmupHook = Callable[[Any], Awaitable[None]]
+_warmup_hooks: List[WarmupHook] = []
+
+
+def register_warmup(hook: WarmupHook) -> WarmupHook:
+    """Register an async `hook(app)` that pre-loads a cache at startup. Usable as a decorator."""
+    _warmup_hooks.append(hook)
+    return hook
+
+
+_background_jobs: List[WarmupHook] = []
+_background_tasks: List[asyncio.Task] = []
+
+
+def register_background(job: WarmupHook) -> WarmupHook:
+    """Register a long-running async `job(app)`, started after warm-up and cancelled on shutdown."""
+    _background_jobs.append(job)
+    return job
+
+
+_shutdown_hooks: List[WarmupHook] = []
+
+
+def register_shutdown(hook: WarmupHook) -> WarmupHook:
+    """Register an async `hook(app)` run at shutdown after downloads drain, while Mongo is still open."""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+def _start_background(app) -> None:
+    for job in _background_jobs:
+        _background_tasks.append(asyncio.create_task(job(app), name=getattr(job, "__name__", None)))
+
+
+class InflightTracker:
+    """Counts streaming responses still being sent so shutdown can wait for them."""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = None
+
+    def _idle_event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._idle
+
+    async def track(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Wrap a StreamingResponse body; counted from first to last chunk."""
+        self.count += 1
+        self._idle_event().clear()
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            self.count -= 1
+            if self.count == 0:
+                self._idle_event().set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until no stream is in flight; False if the timeout expired first."""
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+inflight_streams = InflightTracker()
+_state = {"warm": False, "shutting_down": False}
+
+
+async def warm_up(app) -> None:
+    """Check connectivity, open the minimum pool and run the registered cache warm-ups.
+
+    Failures are logged, not raised: the app still starts and /ready reports the problem.
+    """
+    db = app.state.db
+    try:
+        latency = await ping(db)
+        await open_min_pool(db)
+        print(f"🔥 Mongo reachable ({latency:.1f} ms), pool warmed: {pool_stats.snapshot()['open_connections']} connections")
+    except Exception as e:
+        print(f"⚠️  Mongo warm-up failed: {e}")
+        _start_background(app)
+        return
+    for hook in _warmup_hooks:
+        try:
+            await hook(app)
+        except Exception as e:
+            print(f"⚠️  Warm-up hook {getattr(hook, '__name__', hook)} failed: {e}")
+    _state["warm"] = True
+    _start_background(app)
+
+
+async def shutdown(app) -> None:
+    """Stop reporting ready and background jobs, then wait for in-flight downloads before the client is closed."""
+    _state["shutting_down"] = True
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    if inflight_streams.count:
+        print(f"⏳ Draining {inflight_streams.count} in-flight download(s)")
+        if not await inflight_streams.drain(SHUTDOWN_DRAIN_TIMEOUT_S):
+            print(f"⚠️  {inflight_streams.count} download(s) still running after {SHUTDOWN_DRAIN_TIMEOUT_S}s")
+    for hook in _shutdown_hooks:
+        try:
+            await hook(app)
+        except Exception as e:
+            print(f"⚠️  Shutdown hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+
+async def readiness(app) -> Dict[str, Any]:
+    """Readiness report: ready only when not shutting down and Mongo answers a ping."""
+    report: Dict[str, Any] = {
+        "ready": False,
+        "warm": _state["warm"],
+        "shutting_down": _state["shutting_down"],
+        "inflight_streams": inflight_streams.count,
+        "pool": pool_stats.snapshot(),
+    }
+    if _state["shutting_down"]:
+        return report
+    try:
+        report["mongo_latency_ms"] = round(await ping(app.state.db), 3)
+        report["ready"] = True
+    except Exception as e:
+        report["error"] = f"Mongo unreachable: {e.__class__.__name__}"
+    return report
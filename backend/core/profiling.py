@@ -0,0 +1,186 @@
+"""On-demand, per-request profiling.
+
+A request is profiled when either
+- it carries the ``X-LitMT-Profile: 1`` header together with an admin JWT, or
+- it is picked by random sampling (``PROFILE_SAMPLE_RATE``, 0.0 - 1.0).
+
+The profile is a cProfile/pstats dump of the event-loop thread for the duration
+of the request, annotated with every Mongo command the request issued (captured
+through a pymongo ``CommandListener``). Results are kept in a small in-memory
+ring per worker and can be downloaded from ``/api/admin/profiles``.
+
+Nothing is installed unless ``PROFILING_ENABLED`` is set, so the cost when
+profiling is off is zero: no middleware and no command listener.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+from users.auth import is_admin_authorization
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_STORED = int(os.environ.get("PROFILE_MAX_STORED", "20"))
+PROFILE_HEADER = b"x-litmt-profile"
+
+# List of Mongo commands for the request currently being profiled (None otherwise).
+# Motor copies the context into its executor threads, so the listener sees it.
+_current_commands: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar(
+    "profile_mongo_commands", default=None
+)
+
+
+class MongoCommandRecorder(monitoring.CommandListener):
+    """Records Mongo commands issued while a profiled request is running."""
+
+    def started(self, event):
+        commands = _current_commands.get()
+        if commands is None:
+            return
+        collection = event.command.get(event.command_name)
+        commands.append({
+            "request_id": event.request_id,
+            "command": event.command_name,
+            "database": event.database_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "duration_ms": None,
+            "ok": None,
+        })
+
+    def _finish(self, event, ok: bool):
+        commands = _current_commands.get()
+        if commands is None:
+            return
+        for entry in reversed(commands):
+            if entry["request_id"] == event.request_id and entry["ok"] is None:
+                entry["duration_ms"] = event.duration_micros / 1000.0
+                entry["ok"] = ok
+                break
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+class ProfileStore:
+    """Bounded, insertion-ordered store of captured profiles (oldest evicted first)."""
+
+    def __init__(self, max_items: int = PROFILE_MAX_STORED):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._items[entry["id"]] = entry
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._items.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._items.values())
+        return [summary(e) for e in reversed(entries)]
+
+
+profile_store = ProfileStore()
+
+
+def summary(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Profile metadata without the (large) pstats payload."""
+    return {k: v for k, v in entry.items() if k != "pstats"}
+
+
+def top_functions(entry: Dict[str, Any], limit: int = 30) -> str:
+    """Render the captured stats as pstats' text report, sorted by cumulative time."""
+    out = io.StringIO()
+    stats = pstats.Stats(_StatsHolder(marshal.loads(entry["pstats"])), stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+class _StatsHolder:
+    """Adapter so pstats.Stats can load a raw stats dict (it expects a profiler-like object)."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles selected requests.
+
+    cProfile hooks the event-loop thread, so only one request is profiled at a
+    time; other profile requests arriving meanwhile are served unprofiled.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, store: ProfileStore = profile_store):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.store = store
+        self._busy = False
+
+    def _wants_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER, b"").strip() in (b"1", b"true"):
+            return is_admin_authorization(headers.get(b"authorization", b"").decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._busy or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        commands: List[Dict[str, Any]] = []
+        token = _current_commands.set(commands)
+        profiler = cProfile.Profile()
+        started_at = datetime.now(timezone.utc)
+        t0 = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            _current_commands.reset(token)
+            self._busy = False
+            profiler.create_stats()
+            self.store.add({
+                "id": uuid.uuid4().hex,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status": status["code"],
+                "started_at": started_at.isoformat(),
+                "duration_ms": round(elapsed_ms, 3),
+                "mongo_commands": [{k: v for k, v in c.items() if k != "request_id"} for c in commands],
+                "mongo_time_ms": round(sum(c["duration_ms"] or 0.0 for c in commands), 3),
+                "pstats": marshal.dumps(profiler.stats),
+            })
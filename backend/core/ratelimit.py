@@ -0,0 +1,193 @@
+"""Sliding-window rate limiting shared across uvicorn workers.
+
+Each (scope, key) pair has one document in the `rate_limits` collection holding
+the attempt count of the current and previous fixed windows; the effective
+count is the usual sliding-window estimate
+``prev_count * (1 - elapsed / window) + count``. Documents expire through a TTL
+index on `expires_at`, and the update is a single atomic pipeline
+`find_one_and_update` (upsert), so workers never race.
+
+A per-worker in-memory pre-filter keeps the common path off the database:
+- the first `RATE_LIMIT_LOCAL_BURST` attempts of a key in a window are admitted
+  locally and their increments are folded into the next shared update;
+- a key the shared counter has rejected stays blocked locally until its
+  Retry-After, so a burst against it costs no round trip either.
+Over-admission across workers is bounded by workers x local burst.
+
+If Mongo is unavailable the limiter fails open (and logs); the endpoints it
+protects keep working.
+"""
+
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from fastapi import HTTPException, Request, status
+from pymongo import ReturnDocument
+
+from .lifecycle import register_warmup
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_WINDOW_S = int(os.environ.get("RATE_LIMIT_WINDOW_S", "60"))
+RATE_LIMIT_LOCAL_BURST = int(os.environ.get("RATE_LIMIT_LOCAL_BURST", "2"))
+RATE_LIMIT_TRUST_PROXY = os.environ.get("RATE_LIMIT_TRUST_PROXY", "").lower() in ("1", "true", "yes")
+RATE_LIMIT_COLLECTION = "rate_limits"
+
+# Drop local entries from finished windows once this many keys are tracked
+_LOCAL_MAX_KEYS = 10000
+
+
+def client_ip(request: Request) -> str:
+    """Caller address; honours X-Forwarded-For only when RATE_LIMIT_TRUST_PROXY is set."""
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class _LocalEntry:
+    __slots__ = ("window_start", "count", "pending", "blocked_until")
+
+    def __init__(self, window_start: int):
+        self.window_start = window_start
+        self.count = 0
+        self.pending = 0
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """Limit attempts per key for one scope (e.g. "login:ip") to `limit` per window."""
+
+    def __init__(self, scope: str, limit: int, window_s: int = RATE_LIMIT_WINDOW_S,
+                 local_burst: int = RATE_LIMIT_LOCAL_BURST):
+        self.scope = scope
+        self.limit = limit
+        self.window_s = window_s
+        self.local_burst = min(local_burst, limit)
+        self._local: Dict[str, _LocalEntry] = {}
+        self._lock = threading.Lock()
+        self.allowed_local = 0
+        self.allowed_shared = 0
+        self.rejected_local = 0
+        self.rejected_shared = 0
+        self.errors = 0
+
+    def _entry(self, key: str, window_start: int) -> _LocalEntry:
+        entry = self._local.get(key)
+        if entry is None or entry.window_start != window_start:
+            blocked_until = entry.blocked_until if entry else 0.0
+            entry = _LocalEntry(window_start)
+            entry.blocked_until = blocked_until
+            if len(self._local) >= _LOCAL_MAX_KEYS:
+                now = time.time()
+                self._local = {
+                    k: e for k, e in self._local.items()
+                    if e.window_start >= window_start or e.blocked_until > now
+                }
+            self._local[key] = entry
+        return entry
+
+    def _reject(self, retry_after: float):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def hit(self, db, key: str) -> None:
+        """Count one attempt for `key`; raises 429 with Retry-After when over the limit."""
+        if not RATE_LIMIT_ENABLED:
+            return
+        now = time.time()
+        window_start = int(now // self.window_s) * self.window_s
+        with self._lock:
+            entry = self._entry(key, window_start)
+            if entry.blocked_until > now:
+                self.rejected_local += 1
+                retry_after = entry.blocked_until - now
+            else:
+                retry_after = None
+                entry.count += 1
+                entry.pending += 1
+                if entry.count <= self.local_burst:
+                    self.allowed_local += 1
+                    return
+                inc, entry.pending = entry.pending, 0
+        if retry_after is not None:
+            self._reject(retry_after)
+
+        try:
+            doc = await self._shared_inc(db, key, window_start, inc)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Rate limiter unavailable for {self.scope}, allowing: {e}")
+            return
+
+        elapsed = now - window_start
+        estimate = doc.get("prev_count", 0) * (1 - elapsed / self.window_s) + doc.get("count", 0)
+        if estimate <= self.limit:
+            self.allowed_shared += 1
+            return
+
+        # Blocked until the current window ends and the previous one has decayed
+        retry_after = window_start + self.window_s - now
+        with self._lock:
+            self._entry(key, window_start).blocked_until = now + retry_after
+            self.rejected_shared += 1
+        self._reject(retry_after)
+
+    async def _shared_inc(self, db, key: str, window_start: int, inc: int) -> Dict[str, Any]:
+        same_window = {"$eq": ["$window_start", window_start]}
+        previous_window = {"$eq": ["$window_start", window_start - self.window_s]}
+        expires_at = datetime.fromtimestamp(window_start + 2 * self.window_s, tz=timezone.utc)
+        return await db[RATE_LIMIT_COLLECTION].find_one_and_update(
+            {"_id": f"{self.scope}:{key}"},
+            [{"$set": {
+                # All expressions in one $set stage see the pre-update document
+                "prev_count": {"$cond": [same_window, {"$ifNull": ["$prev_count", 0]},
+                                         {"$cond": [previous_window, "$count", 0]}]},
+                "count": {"$cond": [same_window, {"$add": ["$count", inc]}, inc]},
+                "window_start": window_start,
+                "expires_at": expires_at,
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scope": self.scope,
+            "limit": self.limit,
+            "window_s": self.window_s,
+            "local_burst": self.local_burst,
+            "tracked_keys": len(self._local),
+            "allowed_local": self.allowed_local,
+            "allowed_shared": self.allowed_shared,
+            "rejected_local": self.rejected_local,
+            "rejected_shared": self.rejected_shared,
+            "rejected_total": self.rejected_local + self.rejected_shared,
+            "errors": self.errors,
+        }
+
+
+_limiters: List[RateLimiter] = []
+
+
+def limiter(scope: str, limit: int, window_s: int = RATE_LIMIT_WINDOW_S) -> RateLimiter:
+    """Create and register a limiter so its counters show up in `limiter_stats()`."""
+    instance = RateLimiter(scope, limit, window_s)
+    _limiters.append(instance)
+    return instance
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return {"enabled": RATE_LIMIT_ENABLED, "limiters": [lim.stats() for lim in _limiters]}
+
+
+@register_warmup
+async def ensure_rate_limit_indexes(app) -> None:
+    await app.state.db[RATE_LIMIT_COLLECTION].create_index("expires_at", expireAfterSeconds=0)
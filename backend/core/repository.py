@@ -0,0 +1,97 @@
+"""Shared data-access layer.
+
+Each collection gets a small repository (see books/, users/, suggestions/
+`repository.py`) built on `Repository`. It owns the str -> ObjectId conversion
+of path ids, validating them once (an invalid id is simply "not found"), and
+mutations return the updated document straight from `find_one_and_update`
+instead of a read / write / read-again sequence.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+
+def parse_object_id(value: Any, detail: str = "Not found", status_code: int = 404) -> ObjectId:
+    """ObjectId for a path/body id, or an HTTPException when it is not a valid id."""
+    if isinstance(value, ObjectId):
+        return value
+    if not isinstance(value, str) or not ObjectId.is_valid(value):
+        raise HTTPException(status_code=status_code, detail=detail)
+    return ObjectId(value)
+
+
+class Repository:
+    """CRUD helpers for one collection. Subclasses set `collection` and `not_found`."""
+
+    collection: str = ""
+    not_found: str = "Not found"
+    # Status for malformed ids; most resources treat them as missing
+    invalid_id_status: int = 404
+    invalid_id_detail: Optional[str] = None
+
+    def __init__(self, db):
+        self.db = db
+        self.col = db[self.collection]
+
+    def oid(self, value: Any) -> ObjectId:
+        return parse_object_id(value, self.invalid_id_detail or self.not_found, self.invalid_id_status)
+
+    async def find(self, id: Any, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return await self.col.find_one({"_id": self.oid(id)}, projection)
+
+    async def get(self, id: Any, projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Like `find`, but raises 404 when the document does not exist."""
+        doc = await self.find(id, projection)
+        if not doc:
+            raise HTTPException(status_code=404, detail=self.not_found)
+        return doc
+
+    async def exists(self, id: Any) -> bool:
+        return await self.col.find_one({"_id": self.oid(id)}, {"_id": 1}) is not None
+
+    async def insert(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert and return the document with its new `_id` (no re-read)."""
+        result = await self.col.insert_one(doc)
+        if not result.acknowledged:
+            raise HTTPException(status_code=500, detail=f"Failed to insert into {self.collection}")
+        return doc
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not docs:
+            return docs
+        result = await self.col.insert_many(docs)
+        if not result.acknowledged:
+            raise HTTPException(status_code=500, detail=f"Failed to insert into {self.collection}")
+        return docs
+
+    async def update(self, id: Any, set_fields: Optional[Dict[str, Any]] = None, *,
+                     unset: Optional[List[str]] = None, projection: Optional[Dict[str, Any]] = None,
+                     before: bool = False) -> Dict[str, Any]:
+        """Apply `$set`/`$unset` and return the document in one round trip (404 if missing).
+
+        Returns the updated document, or the previous one with `before=True`.
+        """
+        update: Dict[str, Any] = {}
+        if set_fields:
+            update["$set"] = set_fields
+        if unset:
+            update["$unset"] = {field: "" for field in unset}
+        if not update:
+            return await self.get(id, projection)
+        doc = await self.col.find_one_and_update(
+            {"_id": self.oid(id)},
+            update,
+            projection=projection,
+            return_document=ReturnDocument.BEFORE if before else ReturnDocument.AFTER,
+        )
+        if not doc:
+            raise HTTPException(status_code=404, detail=self.not_found)
+        return doc
+
+    async def delete(self, id: Any) -> None:
+        result = await self.col.delete_one({"_id": self.oid(id)})
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail=self.not_found)
@@ -0,0 +1,269 @@
+"""Where source and translation files live: GridFS or a local (or mounted) directory.
+
+Documents refer to files by ObjectId (`source_file_id`, `file_id`), whatever the
+backend, so the catalog does not change when files move between backends
+(scripts/migrate_storage.py). `file_storage(db)` returns the configured backend:
+
+- ``gridfs`` (default): files are GridFS files in the default `fs` bucket.
+- ``local``: file contents are stored once per SHA-256 under
+  STORAGE_LOCAL_ROOT as `ab/cd/abcd...` and described by one `storage_files`
+  document per file id ({_id, filename, length, sha256, uploadDate, metadata}).
+  Writes go to a temporary file that is fsynced and renamed into place, so a
+  reader never sees a partial file. Downloads are served from disk with
+  FileResponse and never pass through Mongo.
+
+Both backends open files as objects with `_id`, `filename`, `length`,
+`readchunk()`, `read()` and `close()`, like Motor's GridOut, and raise
+`gridfs.errors.NoFile` for unknown ids.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import motor.motor_asyncio
+from bson import ObjectId
+from gridfs.errors import NoFile
+
+from .lifecycle import register_warmup
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gridfs").lower()
+STORAGE_LOCAL_ROOT = os.environ.get("STORAGE_LOCAL_ROOT", "./data/files")
+
+LOCAL_FILES = "storage_files"
+# Same as the GridFS chunk size, so both backends read in the same steps
+READ_CHUNK_BYTES = 255 * 1024
+
+BACKENDS = ("gridfs", "local")
+
+
+def blob_path(root: str, sha256: str) -> str:
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256)
+
+
+async def _io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+class FileStorage(ABC):
+    name = ""
+    # Collection of file documents (with `metadata`), for lookups by metadata
+    files_collection = ""
+    # True when resumable-upload chunks staged in `fs.chunks` already are the stored file
+    chunks_in_place = False
+
+    def __init__(self, db):
+        self.db = db
+
+    @abstractmethod
+    async def open(self, file_id):
+        """The file as a stream with `readchunk()`, `read()` and `close()`; raises NoFile for unknown ids."""
+
+    @abstractmethod
+    def writer(self, filename: str, file_id: Optional[ObjectId] = None, metadata: Optional[Dict[str, Any]] = None):
+        """An upload stream with async `write`, `close` and `abort`; the new id is its `_id`."""
+
+    @abstractmethod
+    async def delete(self, file_id) -> None:
+        """Remove the file; raises NoFile for unknown ids."""
+
+    async def local_file(self, file_id) -> Optional[Tuple[str, os.stat_result]]:
+        """Path and stat of the file on disk, or None when the backend cannot serve it from disk."""
+        return None
+
+    async def exists(self, file_id) -> bool:
+        return await self.db[self.files_collection].find_one({"_id": ObjectId(file_id)}, {"_id": 1}) is not None
+
+    async def put(self, filename: str, data: bytes, file_id: Optional[ObjectId] = None,
+                  metadata: Optional[Dict[str, Any]] = None) -> ObjectId:
+        upload = self.writer(filename, file_id, metadata)
+        try:
+            for start in range(0, len(data), READ_CHUNK_BYTES):
+                await upload.write(data[start:start + READ_CHUNK_BYTES])
+            await upload.close()
+        except BaseException:
+            await upload.abort()
+            raise
+        return upload._id
+
+
+class GridFSStorage(FileStorage):
+    name = "gridfs"
+    files_collection = "fs.files"
+    chunks_in_place = True
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
+
+    async def open(self, file_id):
+        return await self.bucket.open_download_stream(ObjectId(file_id))
+
+    def writer(self, filename: str, file_id: Optional[ObjectId] = None, metadata: Optional[Dict[str, Any]] = None):
+        if file_id is not None:
+            return self.bucket.open_upload_stream_with_id(file_id, filename, metadata=metadata)
+        return self.bucket.open_upload_stream(filename, metadata=metadata)
+
+    async def delete(self, file_id) -> None:
+        await self.bucket.delete(ObjectId(file_id))
+
+
+class LocalFile:
+    def __init__(self, doc: Dict[str, Any], path: str, handle):
+        self._id = doc["_id"]
+        self.filename = doc.get("filename")
+        self.length = doc["length"]
+        self.metadata = doc.get("metadata")
+        self.path = path
+        self._handle = handle
+
+    async def readchunk(self) -> bytes:
+        return await _io(self._handle.read, READ_CHUNK_BYTES)
+
+    async def read(self, size: int = -1) -> bytes:
+        return await _io(self._handle.read, size)
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+class LocalUpload:
+    def __init__(self, storage: "LocalStorage", filename: str, file_id: Optional[ObjectId],
+                 metadata: Optional[Dict[str, Any]]):
+        self.storage = storage
+        self._id = file_id or ObjectId()
+        self.filename = filename
+        self.metadata = metadata
+        self.length = 0
+        self._digest = hashlib.sha256()
+        self._handle = None
+        self._tmp = None
+
+    def _write(self, data: bytes) -> None:
+        if self._handle is None:
+            tmp_dir = os.path.join(self.storage.root, "tmp")
+            os.makedirs(tmp_dir, exist_ok=True)
+            fd, self._tmp = tempfile.mkstemp(dir=tmp_dir)
+            self._handle = os.fdopen(fd, "wb")
+        self._handle.write(data)
+        self._digest.update(data)
+        self.length += len(data)
+
+    async def write(self, data: bytes) -> None:
+        await _io(self._write, data)
+
+    def _flush(self) -> None:
+        if self._handle is None:
+            self._write(b"")
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+
+    def _move_into_place(self, sha256: str) -> None:
+        path = blob_path(self.storage.root, sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Replacing an existing blob is harmless: it has the same content
+        os.replace(self._tmp, path)
+
+    async def close(self) -> None:
+        await _io(self._flush)
+        sha256 = self._digest.hexdigest()
+        # The document goes in first, so a concurrent delete of the same content sees it (see LocalStorage.delete)
+        await self.storage.db[LOCAL_FILES].insert_one({
+            "_id": self._id,
+            "filename": self.filename,
+            "length": self.length,
+            "sha256": sha256,
+            "uploadDate": datetime.now(timezone.utc),
+            "metadata": self.metadata,
+        })
+        try:
+            await _io(self._move_into_place, sha256)
+        except BaseException:
+            await self.storage.db[LOCAL_FILES].delete_one({"_id": self._id})
+            raise
+
+    def _discard(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+        if self._tmp and os.path.exists(self._tmp):
+            os.unlink(self._tmp)
+
+    async def abort(self) -> None:
+        await _io(self._discard)
+
+
+class LocalStorage(FileStorage):
+    name = "local"
+    files_collection = LOCAL_FILES
+
+    def __init__(self, db, root: str = STORAGE_LOCAL_ROOT):
+        super().__init__(db)
+        self.root = root
+
+    async def _doc(self, file_id) -> Dict[str, Any]:
+        doc = await self.db[LOCAL_FILES].find_one({"_id": ObjectId(file_id)})
+        if doc is None:
+            raise NoFile(f"no file with id {file_id}")
+        return doc
+
+    async def open(self, file_id) -> LocalFile:
+        doc = await self._doc(file_id)
+        path = blob_path(self.root, doc["sha256"])
+        try:
+            handle = await _io(open, path, "rb")
+        except FileNotFoundError:
+            raise NoFile(f"file {file_id} is missing from {self.root}")
+        return LocalFile(doc, path, handle)
+
+    def writer(self, filename: str, file_id: Optional[ObjectId] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> LocalUpload:
+        return LocalUpload(self, filename, file_id, metadata)
+
+    async def local_file(self, file_id) -> Optional[Tuple[str, os.stat_result]]:
+        doc = await self._doc(file_id)
+        path = blob_path(self.root, doc["sha256"])
+        try:
+            return path, await _io(os.stat, path)
+        except FileNotFoundError:
+            raise NoFile(f"file {file_id} is missing from {self.root}")
+
+    async def delete(self, file_id) -> None:
+        doc = await self.db[LOCAL_FILES].find_one_and_delete({"_id": ObjectId(file_id)}, {"sha256": 1})
+        if doc is None:
+            raise NoFile(f"no file with id {file_id}")
+        sha256 = doc["sha256"]
+        if await self.db[LOCAL_FILES].find_one({"sha256": sha256}, {"_id": 1}):
+            return
+        # Other file ids may share the blob. Move it aside first and look again, so an
+        # upload of the same content that registered meanwhile keeps its file.
+        path = blob_path(self.root, sha256)
+        trash = f"{path}.{ObjectId()}.deleted"
+        try:
+            await _io(os.rename, path, trash)
+        except FileNotFoundError:
+            return
+        if await self.db[LOCAL_FILES].find_one({"sha256": sha256}, {"_id": 1}):
+            await _io(os.replace, trash, path)
+        else:
+            await _io(os.unlink, trash)
+
+
+def file_storage(db, backend: Optional[str] = None) -> FileStorage:
+    """The storage backend for `db` (STORAGE_BACKEND unless `backend` is given)."""
+    name = backend or STORAGE_BACKEND
+    if name == "gridfs":
+        return GridFSStorage(db)
+    if name == "local":
+        return LocalStorage(db)
+    raise ValueError(f"Unknown storage backend {name!r}; use one of {', '.join(BACKENDS)}")
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    if STORAGE_BACKEND == "local":
+        await app.state.db[LOCAL_FILES].create_index("sha256")
@@ -0,0 +1,398 @@
+"""Request tracing with W3C Trace Context propagation.
+
+A sampled request gets a server span; inside it the code opens child spans with
+``span(...)`` (file storage uploads and downloads), and two pymongo listeners add a
+span for every Mongo command and for every connection-pool checkout that had
+to wait. Finished spans are handed to a background thread that batches them to
+an exporter; the default writes one JSON object per line to ``TRACE_FILE``.
+
+Sampling: an incoming ``traceparent`` header continues the caller's trace and
+follows its sampled flag; otherwise a request is sampled with probability
+``TRACE_SAMPLE_RATE``. Sampled responses carry a ``traceresponse`` header with
+the server span's id.
+
+When a request is not sampled no span exists, and every hook returns after one
+ContextVar lookup. Nothing is installed at all unless ``TRACING_ENABLED`` is set.
+"""
+
+import importlib
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from pymongo import monitoring
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+# Honour the sampled flag of an incoming traceparent (turn off on public edges)
+TRACE_TRUST_PARENT = os.environ.get("TRACE_TRUST_PARENT", "true").lower() in ("1", "true", "yes")
+# "file" (JSON lines in TRACE_FILE) or "package.module:factory" returning a SpanExporter
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "file")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "litmt-backend")
+TRACE_FLUSH_INTERVAL_S = float(os.environ.get("TRACE_FLUSH_INTERVAL_S", "2"))
+TRACE_MAX_QUEUE = int(os.environ.get("TRACE_MAX_QUEUE", "10000"))
+# Pool checkouts faster than this are not worth a span
+TRACE_POOL_WAIT_MIN_MS = float(os.environ.get("TRACE_POOL_WAIT_MIN_MS", "1"))
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+
+# Span of the code currently running, None when the request is not sampled.
+# Motor copies the context into its executor threads, so the listeners see it.
+_current_span: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return random.getrandbits(nbytes * 8).to_bytes(nbytes, "big").hex()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str = "internal",
+                 attributes: Optional[Dict[str, Any]] = None, start_ns: Optional[int] = None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start_ns = start_ns or time.time_ns()
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def child(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+              start_ns: Optional[int] = None) -> "Span":
+        return Span(self.trace_id, self.span_id, name, kind, attributes, start_ns)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        end_ns = end_ns or time.time_ns()
+        processor.submit({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": TRACE_SERVICE_NAME,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        })
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, activate: bool = True, **attributes):
+    """Child span of the current one for the enclosed block; yields None when not tracing.
+
+    Use ``activate=False`` inside async generators, which may be finalized from
+    another context: the span is still recorded but not made current.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    s = parent.child(name, attributes=attributes)
+    token = _current_span.set(s) if activate else None
+    try:
+        yield s
+    except Exception as e:
+        s.error = repr(e)
+        raise
+    finally:
+        if token is not None:
+            _current_span.reset(token)
+        s.end()
+
+
+# Exporters
+
+class SpanExporter(ABC):
+    """Receives finished spans in batches, on the exporter thread."""
+
+    @abstractmethod
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        """Ship one batch; an exception drops the batch and is logged."""
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonFileExporter(SpanExporter):
+    """Appends one JSON object per span to a file (load with pandas, jq, or any OTLP converter)."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        with open(self.path, "ab") as f:
+            f.write(b"".join(orjson.dumps(s, default=str) + b"\n" for s in spans))
+
+
+def load_exporter(spec: str = TRACE_EXPORTER) -> SpanExporter:
+    if spec == "file":
+        return JsonFileExporter()
+    module, _, factory = spec.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+
+class BatchProcessor:
+    """Queues finished spans and exports them from a daemon thread, off the event loop.
+
+    The queue is bounded; spans beyond ``TRACE_MAX_QUEUE`` are dropped and counted.
+    """
+
+    def __init__(self, max_queue: int = TRACE_MAX_QUEUE, interval_s: float = TRACE_FLUSH_INTERVAL_S):
+        self.max_queue = max_queue
+        self.interval_s = interval_s
+        self.exporter: Optional[SpanExporter] = None
+        self.dropped = 0
+        self.exported = 0
+        self._queue: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(record)
+            if len(self._queue) >= self.max_queue // 2:
+                self._wake.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._queue = self._queue, []
+        if not batch or self.exporter is None:
+            return
+        try:
+            self.exporter.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"⚠️  Failed to export {len(batch)} spans: {e}")
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            self.flush()
+
+    def shutdown(self) -> None:
+        self.flush()
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            queued = len(self._queue)
+        return {"queued": queued, "exported": self.exported, "dropped": self.dropped}
+
+
+processor = BatchProcessor()
+
+
+def start_tracing(exporter: Optional[SpanExporter] = None) -> None:
+    processor.start(exporter or load_exporter())
+
+
+def shutdown_tracing() -> None:
+    processor.shutdown()
+
+
+# Request spans
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None if invalid."""
+    m = _TRACEPARENT.match(value.strip().lower())
+    if not m:
+        return None
+    version, trace_id, parent_id, flags, rest = m.groups()
+    if version == "ff" or (version == "00" and rest) or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens the server span of sampled requests."""
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE, trust_parent: bool = TRACE_TRUST_PARENT):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.trust_parent = trust_parent
+
+    def _sample(self, scope) -> Optional[Tuple[str, Optional[str]]]:
+        for name, value in scope.get("headers") or []:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                if parent:
+                    trace_id, parent_id, sampled = parent
+                    if self.trust_parent:
+                        return (trace_id, parent_id) if sampled else None
+                    # Keep the caller's trace id, but make our own sampling decision
+                    return (trace_id, parent_id) if random.random() < self.sample_rate else None
+                break
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return _new_id(16), None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        sampled = self._sample(scope)
+        if sampled is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id = sampled
+        method = scope.get("method")
+        root = Span(trace_id, parent_id, f"{method} {scope.get('path')}", kind="server", attributes={
+            "http.method": method,
+            "http.target": scope.get("path"),
+            "http.query": scope.get("query_string", b"").decode("latin-1"),
+        })
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                headers = list(message.get("headers") or [])
+                headers.append((b"traceresponse", root.traceparent().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            root.error = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{method} {route}"
+                root.set("http.route", route)
+            root.end()
+
+
+# Mongo listeners
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """A client span for every Mongo command issued inside a sampled request."""
+
+    def __init__(self):
+        self._open: Dict[Tuple[int, Any], Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        s = parent.child(f"mongo.{event.command_name}", kind="client", attributes={
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.mongodb.collection": collection if isinstance(collection, str) else None,
+        })
+        with self._lock:
+            self._open[(event.request_id, event.connection_id)] = s
+
+    def _finish(self, event, error: Optional[str]):
+        if not self._open:
+            return
+        with self._lock:
+            s = self._open.pop((event.request_id, event.connection_id), None)
+        if s is None:
+            return
+        s.error = error
+        s.end(s.start_ns + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure))
+
+
+class PoolWaitTracer(monitoring.ConnectionPoolListener):
+    """A span for each connection checkout of a sampled request that waited at least TRACE_POOL_WAIT_MIN_MS."""
+
+    def __init__(self, min_ms: float = TRACE_POOL_WAIT_MIN_MS):
+        self.min_ns = int(min_ms * 1e6)
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.time_ns() if _current_span.get() is not None else None
+
+    def _done(self, event, error: Optional[str]):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        parent = _current_span.get()
+        if started is None or parent is None:
+            return
+        now = time.time_ns()
+        if error is None and now - started < self.min_ns:
+            return
+        s = parent.child("mongo.pool.checkout", kind="internal", attributes={
+            "net.peer": "%s:%s" % event.address,
+        }, start_ns=started)
+        s.error = error
+        s.end(now)
+
+    def connection_checked_out(self, event):
+        self._done(event, None)
+
+    def connection_check_out_failed(self, event):
+        self._done(event, str(event.reason))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
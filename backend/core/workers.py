@@ -0,0 +1,120 @@
+"""Process pool for CPU-heavy jobs, and how its workers read texts.
+
+Glossary extraction and translation scoring hand whole books to `process_pool()`,
+so they never run in the event loop. The pool starts lazily with the spawn
+method: workers do not inherit the event loop or the Motor client. It is shut
+down at app shutdown.
+
+Jobs pass a small reference to the text (`text_ref`), not the text itself. Workers
+stream stored files chunk by chunk with their own synchronous pymongo client
+(`read_segments`), from GridFS or from the local storage directory (core/storage.py).
+"""
+
+import codecs
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+
+from .lifecycle import register_shutdown
+from .storage import LOCAL_FILES, READ_CHUNK_BYTES, STORAGE_BACKEND, STORAGE_LOCAL_ROOT, blob_path
+
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "2"))
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.environ.get("MONGO_DB", "litmt")
+
+# Regex ranges (used inside `[...]`) shared by the text analyzers: kana and CJK
+# ideographs, and Hangul, which books/ingest.py leaves out since Korean puts spaces between words
+CJK_RANGES = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+KANA_RANGE = r"\u3040-\u30ff"
+HANGUL_RANGE = r"\uac00-\ud7af"
+
+_pool: Dict[str, Optional[ProcessPoolExecutor]] = {"executor": None}
+
+
+def process_pool() -> ProcessPoolExecutor:
+    if _pool["executor"] is None:
+        _pool["executor"] = ProcessPoolExecutor(
+            max_workers=WORKER_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool["executor"]
+
+
+@register_shutdown
+async def stop_process_pool(app) -> None:
+    if _pool["executor"] is not None:
+        _pool["executor"].shutdown(wait=False, cancel_futures=True)
+        _pool["executor"] = None
+
+
+# Parent side
+
+def text_ref(doc: Dict[str, Any], file_field: str, text_field: str) -> Optional[Dict[str, Any]]:
+    """What a worker reads for `doc`: `{"file_id"}` or `{"text"}`, or None when it has no text."""
+    if doc.get(file_field):
+        return {"file_id": str(doc[file_field])}
+    if isinstance(doc.get(text_field), str) and doc[text_field].strip():
+        return {"text": doc[text_field]}
+    return None
+
+
+def fingerprint(ref: Dict[str, Any]) -> str:
+    """Changes whenever the referenced text does: the file id, or a SHA-1 of inline text."""
+    if "file_id" in ref:
+        return ref["file_id"]
+    return "sha1:" + hashlib.sha1(ref["text"].encode("utf-8")).hexdigest()
+
+
+# Worker side
+
+_client = None
+
+
+def _file_chunks(file_id: str) -> Iterator[bytes]:
+    global _client
+    import gridfs
+    from pymongo import MongoClient
+
+    if _client is None:
+        _client = MongoClient(MONGO_URI)
+    if STORAGE_BACKEND == "local":
+        doc = _client[MONGO_DB][LOCAL_FILES].find_one({"_id": ObjectId(file_id)}, {"sha256": 1})
+        if doc is None:
+            raise gridfs.errors.NoFile(f"no file with id {file_id}")
+        with open(blob_path(STORAGE_LOCAL_ROOT, doc["sha256"]), "rb") as f:
+            yield from iter(lambda: f.read(READ_CHUNK_BYTES), b"")
+        return
+    stream = gridfs.GridFSBucket(_client[MONGO_DB]).open_download_stream(ObjectId(file_id))
+    try:
+        while True:
+            chunk = stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode UTF-8 chunks into lines without joining the whole file."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def read_segments(ref: Dict[str, Any]) -> List[str]:
+    """Non-empty lines (paragraphs) of the referenced text, stripped."""
+    if ref.get("file_id"):
+        lines: Iterable[str] = iter_lines(_file_chunks(ref["file_id"]))
+    else:
+        lines = (ref.get("text") or "").split("\n")
+    return [line.strip() for line in lines if line.strip()]
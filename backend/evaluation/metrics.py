@@ -0,0 +1,178 @@
+"""chrF, BLEU, length ratio and untranslated-segment rate. Runs in worker processes.
+
+A hypothesis and its reference are compared paragraph by paragraph when they
+have the same number of segments (non-empty lines). Otherwise they are compared
+as whole documents, and there are no segment-level scores.
+
+Counting is vectorized over the whole book. Each text becomes one array of units
+(characters without whitespace for chrF, tokens for BLEU) with the index of the
+segment each unit belongs to. For each n-gram order, the n-grams of all segments
+become one array of keys (segment index in the high bits, n-gram hash below).
+One `np.unique` per side and a `searchsorted` then give the clipped matches, and
+`np.bincount` sums them per segment. Document scores use the summed statistics
+(corpus chrF / BLEU), as sacrebleu does.
+
+- chrF: character 1-6-grams, beta 2, from the precision and recall averaged
+  over the orders both sides have.
+- BLEU: 1-4-grams over tokens (CJK characters count as tokens) with the brevity
+  penalty. Segment BLEU uses exponential smoothing.
+- Length ratio: hypothesis tokens / reference tokens.
+- Untranslated rate: share of hypothesis segments that appear verbatim in the
+  source text.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.workers import CJK_RANGES, HANGUL_RANGE, read_segments
+
+CHRF_ORDER = 6
+CHRF_BETA = 2.0
+BLEU_ORDER = 4
+
+# Kana, CJK ideographs and Hangul are scored character by character
+_CJK = CJK_RANGES + HANGUL_RANGE
+_TOKEN = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+|[^\w\s]")
+_LETTERS = re.compile(r"[^\W\d_]")
+
+# Mixing constants for n-gram hashes (uint64 arithmetic wraps)
+_P = np.uint64(0x100000001B3)
+_Q = np.uint64(0x9E3779B97F4A7C15)
+# Keys are the segment index in the top bits and 40 bits of n-gram hash below
+_HASH_BITS = np.uint64(40)
+
+# (units, segment index of each unit)
+Units = Tuple[np.ndarray, np.ndarray]
+
+
+def char_units(segments: List[str], one_segment: bool = False) -> Units:
+    texts = ["".join(s.split()) for s in segments]
+    units = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    return units, _segment_index(texts, one_segment)
+
+
+def token_units(segments: List[str], vocab: Dict[str, int], one_segment: bool = False) -> Units:
+    tokens = [_TOKEN.findall(s) for s in segments]
+    ids = [vocab.setdefault(t, len(vocab) + 1) for toks in tokens for t in toks]
+    return np.array(ids, dtype=np.uint64), _segment_index(tokens, one_segment)
+
+
+def _segment_index(parts: list, one_segment: bool) -> np.ndarray:
+    lengths = [len(p) for p in parts]
+    if one_segment:
+        return np.zeros(sum(lengths), dtype=np.int64)
+    return np.repeat(np.arange(len(parts), dtype=np.int64), lengths)
+
+
+def _ngrams(units: Units, n: int) -> np.ndarray:
+    """Keys of the n-grams that do not cross a segment boundary."""
+    values, seg = units
+    m = len(values) - n + 1
+    if m <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    h = values[:m].copy()
+    for k in range(1, n):
+        h = h * _P + values[k:k + m]
+    within = seg[:m] == seg[n - 1:]
+    return ((seg[:m].astype(np.uint64) << _HASH_BITS) | ((h * _Q) >> np.uint64(64 - 40)))[within]
+
+
+def ngram_stats(hyp: Units, ref: Units, segments: int, order: int, chrf_counts: bool = False) -> np.ndarray:
+    """(hypothesis n-grams, reference n-grams, clipped matches) per order and segment: shape (3, order, segments).
+
+    With `chrf_counts`, hypothesis n-grams only count where the reference has
+    some of that order, as in sacrebleu's chrF.
+    """
+    stats = np.zeros((3, order, segments))
+    for n in range(1, order + 1):
+        uh, ch = np.unique(_ngrams(hyp, n), return_counts=True)
+        ur, cr = np.unique(_ngrams(ref, n), return_counts=True)
+        stats[0, n - 1] = np.bincount((uh >> _HASH_BITS).astype(np.int64), weights=ch, minlength=segments)
+        stats[1, n - 1] = np.bincount((ur >> _HASH_BITS).astype(np.int64), weights=cr, minlength=segments)
+        if chrf_counts:
+            stats[0, n - 1][stats[1, n - 1] == 0] = 0
+        # Reference n-grams the hypothesis also has
+        at = np.minimum(np.searchsorted(uh, ur), max(len(uh) - 1, 0))
+        both = (uh[at] == ur) if len(uh) else np.zeros(len(ur), dtype=bool)
+        stats[2, n - 1] = np.bincount(
+            (ur[both] >> _HASH_BITS).astype(np.int64), weights=np.minimum(ch[at[both]], cr[both]), minlength=segments
+        )
+    return stats
+
+
+def chrf(stats: np.ndarray, beta: float = CHRF_BETA) -> np.ndarray:
+    hyp, ref, match = stats
+    b2 = beta * beta
+    effective = (hyp > 0) & (ref > 0)
+    orders = np.maximum(effective.sum(axis=0), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(effective, match / hyp, 0.0).sum(axis=0) / orders
+        recall = np.where(effective, match / ref, 0.0).sum(axis=0) / orders
+        f = (1 + b2) * precision * recall / (b2 * precision + recall)
+    return np.where(precision + recall > 0, 100 * f, 0.0)
+
+
+def bleu(stats: np.ndarray, smooth: bool = False) -> np.ndarray:
+    hyp, ref, match = stats
+    hyp_len, ref_len = hyp[0], ref[0]
+    log_sum = np.zeros(hyp.shape[1])
+    effective = np.zeros(hyp.shape[1])
+    zeros = np.zeros(hyp.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for n in range(hyp.shape[0]):
+            total = np.maximum(hyp[n], 1)
+            if smooth:
+                missing = (match[n] == 0) & (hyp[n] > 0)
+                zeros += missing
+                precision = np.where(missing, 1.0 / (2.0 ** zeros * total), match[n] / total)
+            else:
+                precision = match[n] / total
+            log_sum += np.where(hyp[n] > 0, np.log(precision), 0.0)
+            effective += hyp[n] > 0
+        brevity = np.where(hyp_len < ref_len, np.exp(1 - ref_len / np.maximum(hyp_len, 1)), 1.0)
+        score = 100 * brevity * np.exp(log_sum / np.maximum(effective, 1))
+    return np.where((effective > 0) & (match.sum(axis=0) > 0) & np.isfinite(score), score, 0.0)
+
+
+def untranslated_rate(hypothesis: List[str], source: List[str]) -> Optional[float]:
+    if not hypothesis or not source:
+        return None
+    copied = {" ".join(s.split()) for s in source if _LETTERS.search(s)}
+    return sum(1 for s in hypothesis if " ".join(s.split()) in copied) / len(hypothesis)
+
+
+def score(hypothesis: List[str], reference: List[str], source: Optional[List[str]] = None) -> Dict[str, Any]:
+    aligned = len(hypothesis) == len(reference) and len(hypothesis) > 0
+    segments = len(hypothesis) if aligned else 1
+    one = not aligned
+
+    char_stats = ngram_stats(char_units(hypothesis, one), char_units(reference, one), segments, CHRF_ORDER, True)
+    vocab: Dict[str, int] = {}
+    hyp_tokens = token_units(hypothesis, vocab, one)
+    ref_tokens = token_units(reference, vocab, one)
+    token_stats = ngram_stats(hyp_tokens, ref_tokens, segments, BLEU_ORDER)
+
+    result: Dict[str, Any] = {
+        "segments": len(hypothesis),
+        "reference_segments": len(reference),
+        "aligned": aligned,
+        "chrf": float(chrf(char_stats.sum(axis=2, keepdims=True))[0]),
+        "bleu": float(bleu(token_stats.sum(axis=2, keepdims=True))[0]),
+        "length_ratio": len(hyp_tokens[0]) / len(ref_tokens[0]) if len(ref_tokens[0]) else None,
+        "untranslated_rate": untranslated_rate(hypothesis, source or []),
+        "segment_chrf": None,
+        "segment_bleu": None,
+    }
+    if aligned:
+        result["segment_chrf"] = chrf(char_stats).astype(np.float32).tobytes()
+        result["segment_bleu"] = bleu(token_stats, smooth=True).astype(np.float32).tobytes()
+    return result
+
+
+# Entry point for the process pool
+
+def evaluate(hypothesis: Dict[str, Any], reference: Dict[str, Any],
+             source: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return score(read_segments(hypothesis), read_segments(reference), read_segments(source) if source else None)
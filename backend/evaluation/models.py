@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class EvaluationOut(BaseModel):
+    translation_id: str
+    reference_id: str
+    language: Optional[str] = None
+    translated_by: Optional[str] = None
+    reference_translated_by: Optional[str] = None
+    revision: int = Field(0, description="Revision of the translation scored (0 if it has no history)")
+    reference_revision: int = Field(0, description="Revision of the reference scored")
+    status: str = Field(..., description="ready, pending (being scored) or failed")
+    designated: bool = Field(False, description="True when the reference is the designated one for the language")
+    chrf: Optional[float] = Field(None, description="Document chrF (0-100)")
+    bleu: Optional[float] = Field(None, description="Document BLEU (0-100)")
+    length_ratio: Optional[float] = Field(None, description="Translation tokens / reference tokens")
+    untranslated_rate: Optional[float] = Field(
+        None, description="Share of translation paragraphs copied verbatim from the source (0-1)"
+    )
+    segments: Optional[int] = None
+    reference_segments: Optional[int] = None
+    aligned: Optional[bool] = Field(None, description="Same paragraph count: segment-level scores are available")
+    error: Optional[str] = None
+    computed_at: Optional[str] = None
+
+
+class BookEvaluationsOut(BaseModel):
+    book_id: str
+    references: Dict[str, str] = Field(default_factory=dict, description="Designated reference translation per language")
+    evaluations: List[EvaluationOut] = Field(default_factory=list)
+
+
+class SegmentScoreOut(BaseModel):
+    index: int = Field(..., description="Paragraph number (0-based, counting non-empty lines)")
+    chrf: float
+    bleu: float
+
+
+class SegmentScoresOut(BaseModel):
+    translation_id: str
+    reference_id: str
+    total: int
+    segments: List[SegmentScoreOut] = Field(default_factory=list)
+
+
+class ReferenceIn(BaseModel):
+    language: str = Field(..., example="French")
+    translation_id: str
+
+
+class LeaderboardRowOut(BaseModel):
+    language: Optional[str] = None
+    translated_by: Optional[str] = None
+    books: int
+    chrf: Optional[float] = None
+    bleu: Optional[float] = None
+    length_ratio: Optional[float] = None
+    untranslated_rate: Optional[float] = None
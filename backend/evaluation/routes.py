@@ -0,0 +1,124 @@
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+import numpy as np
+
+from books.repository import BookRepository
+from core.repository import parse_object_id
+from users.auth import require_admin
+
+from .models import BookEvaluationsOut, LeaderboardRowOut, ReferenceIn, SegmentScoresOut
+from . import store
+
+router = APIRouter()
+
+
+def _evaluation_out(doc: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: doc.get(k) for k in ("language", "translated_by", "reference_translated_by", "status", "error")}
+    out.update({k: doc.get(k) for k in store.METRICS})
+    out.update({
+        "translation_id": str(doc["translation_id"]),
+        "reference_id": str(doc["reference_id"]),
+        "revision": doc.get("revision", 0),
+        "reference_revision": doc.get("reference_revision", 0),
+        "designated": bool(doc.get("designated")),
+        "computed_at": doc["computed_at"].isoformat() if doc.get("computed_at") else None,
+    })
+    return out
+
+
+@router.get("/books/{book_id}/evaluations", response_model=BookEvaluationsOut)
+async def book_evaluations(
+    book_id: str,
+    request: Request,
+    language: Optional[str] = Query(None),
+    reference_id: Optional[str] = Query(None, description="Score against this translation instead of the designated reference"),
+    pairwise: bool = Query(False, description="Score every translation against every other one in its language"),
+    _: bool = Depends(require_admin),
+):
+    """Admin-only: chrF, BLEU, length ratio and untranslated rate of the book's translations.
+
+    Scores are cached per revision pair; pairs not scored yet come back `pending` and are computed in the background.
+    """
+    db = request.app.state.db
+    book = await BookRepository(db).get(book_id, {"source": 1, "source_file_id": 1})
+    ctx = await store.load_book(db, book)
+    ref_oid = parse_object_id(reference_id, "reference_id is not a translation of this book", 400) if reference_id else None
+    docs = await store.evaluate_pairs(db, ctx, store.pairs(ctx, language, ref_oid, pairwise))
+    return ORJSONResponse({
+        "book_id": str(book["_id"]),
+        "references": {lang: str(tid) for lang, tid in ctx["references"].items()},
+        "evaluations": [_evaluation_out(d) for d in docs],
+    })
+
+
+@router.get("/books/{book_id}/evaluations/segments", response_model=SegmentScoresOut)
+async def segment_scores(
+    book_id: str,
+    request: Request,
+    translation_id: str = Query(...),
+    reference_id: str = Query(...),
+    order: str = Query("worst", pattern="^(worst|index)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    _: bool = Depends(require_admin),
+):
+    """Admin-only: paragraph-level chrF and BLEU of a scored pair, worst paragraphs first by default."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    doc = await db[store.COLLECTION].find_one({"_id": store.pair_id(translation_id, reference_id), "book_id": oid})
+    if not doc or doc.get("error") or "chrf" not in doc:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+    if not doc.get("segment_chrf"):
+        raise HTTPException(status_code=409, detail="Paragraph counts differ: only document scores are available")
+    chrf = np.frombuffer(doc["segment_chrf"], dtype=np.float32)
+    bleu = np.frombuffer(doc["segment_bleu"], dtype=np.float32)
+    indices = np.argsort(chrf, kind="stable") if order == "worst" else np.arange(len(chrf))
+    page = indices[offset:offset + limit]
+    return ORJSONResponse({
+        "translation_id": translation_id,
+        "reference_id": reference_id,
+        "total": int(len(chrf)),
+        "segments": [
+            {"index": int(i), "chrf": round(float(chrf[i]), 2), "bleu": round(float(bleu[i]), 2)} for i in page
+        ],
+    })
+
+
+@router.put("/books/{book_id}/evaluations/reference")
+async def set_reference(book_id: str, payload: ReferenceIn, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: designate the reference translation for a language of the book."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    tid = parse_object_id(payload.translation_id, "Translation not found")
+    t = await db.translations.find_one({"_id": tid, "book_id": oid}, {"language": 1})
+    if not t:
+        raise HTTPException(status_code=404, detail="Translation not found")
+    if t.get("language") != payload.language:
+        raise HTTPException(status_code=400, detail="Translation is not in that language")
+    await store.set_reference(db, oid, payload.language, tid)
+    return {"status": "ok", "language": payload.language, "translation_id": str(tid)}
+
+
+@router.delete("/books/{book_id}/evaluations/reference/{language}")
+async def clear_reference(book_id: str, language: str, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: remove the designated reference for a language."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    if not await store.clear_reference(db, oid, language):
+        raise HTTPException(status_code=404, detail="No reference for that language")
+    return {"status": "deleted"}
+
+
+@router.get("/evaluations/leaderboard", response_model=List[LeaderboardRowOut])
+async def leaderboard(request: Request, language: Optional[str] = Query(None), min_books: int = Query(1, ge=1),
+                      _: bool = Depends(require_admin)):
+    """Admin-only: mean scores per model (`translated_by`) over all books with a designated reference."""
+    return ORJSONResponse(await store.leaderboard(request.app.state.db, language, min_books))
+
+
+@router.post("/evaluations/refresh", status_code=202)
+async def refresh(request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: re-score, in the background, every evaluation whose translation, reference or source changed."""
+    started = await store.start_refresh(request.app.state.db)
+    return ORJSONResponse({"status": "started" if started else "running"}, status_code=202)
@@ -0,0 +1,328 @@
+"""Cached evaluations of translations against references (see evaluation/metrics.py).
+
+A translation is scored against:
+
+- the designated reference of its book and language (`evaluation_references`);
+- or any other translation in the same language, on request (`reference_id`);
+- or every other translation in its language (`pairwise`), to compare models.
+
+`evaluations` has one document per (translation, reference) pair:
+
+    {_id: "<translation_id>:<reference_id>", book_id, language, translation_id,
+     reference_id, translated_by, reference_translated_by, revision,
+     reference_revision, versions, designated, chrf, bleu, length_ratio,
+     untranslated_rate, segments, reference_segments, aligned, segment_chrf,
+     segment_bleu, error, computed_at}
+
+`versions` holds the file ids (or a SHA-1 of inline text) of the translation,
+the reference and the source. Every revision has its own file, so a document is
+current exactly while both sides are at the revisions it was computed for.
+Requests return current documents as they are. Missing or stale pairs are scored
+in the worker process pool and reported as "pending" until then; each worker
+scores a given pair and version at most once at a time.
+
+`designated` marks evaluations against the current designated reference. The
+leaderboard averages those per model; `refresh` re-scores the stale ones.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Binary, ObjectId
+from fastapi import HTTPException
+
+from books.repository import TranslationRepository
+from core.lease import acquire_lease, release_lease
+from core.lifecycle import register_shutdown, register_warmup
+from core.tracing import span
+from core.workers import fingerprint, process_pool, text_ref
+
+from . import metrics
+
+COLLECTION = "evaluations"
+REFERENCES = "evaluation_references"
+META = "evaluation_meta"
+
+READY = "ready"
+PENDING = "pending"
+FAILED = "failed"
+
+# Pairs a refresh keeps in the pool at once
+EVALUATION_REFRESH_CONCURRENCY = int(os.environ.get("EVALUATION_REFRESH_CONCURRENCY", "8"))
+EVALUATION_REFRESH_LEASE_S = float(os.environ.get("EVALUATION_REFRESH_LEASE_S", "3600"))
+
+TRANSLATION_FIELDS = {"language": 1, "translated_by": 1, "file_id": 1, "text": 1}
+METRICS = ("chrf", "bleu", "length_ratio", "untranslated_rate", "segments", "reference_segments", "aligned")
+
+# Pair id -> versions being scored by this worker
+_inflight: Dict[str, Tuple[str, ...]] = {}
+_tasks: set = set()
+_refresh: Dict[str, Any] = {"task": None}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def pair_id(translation_id: Any, reference_id: Any) -> str:
+    return f"{translation_id}:{reference_id}"
+
+
+# Book context
+
+async def _revisions(db, translation_ids: List[ObjectId]) -> Dict[ObjectId, int]:
+    """Latest revision number of each translation (0 for translations without history)."""
+    pipeline = [
+        {"$match": {"translation_id": {"$in": translation_ids}}},
+        {"$group": {"_id": "$translation_id", "revision": {"$max": "$revision"}}},
+    ]
+    return {row["_id"]: row["revision"] async for row in db.translation_revisions.aggregate(pipeline)}
+
+
+async def load_book(db, book: Dict[str, Any]) -> Dict[str, Any]:
+    """Translations (with text), their revisions and the designated references of a book."""
+    translations = [
+        t async for t in TranslationRepository(db).for_books([book["_id"]], TRANSLATION_FIELDS)
+        if text_ref(t, "file_id", "text")
+    ]
+    revisions = await _revisions(db, [t["_id"] for t in translations])
+    references = {
+        r["language"]: r["translation_id"]
+        async for r in db[REFERENCES].find({"book_id": book["_id"]}, {"language": 1, "translation_id": 1})
+    }
+    return {"book": book, "translations": translations, "revisions": revisions, "references": references}
+
+
+def pairs(ctx: Dict[str, Any], language: Optional[str] = None, reference_id: Optional[ObjectId] = None,
+          pairwise: bool = False) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(translation, reference) pairs to report for a book."""
+    by_id = {t["_id"]: t for t in ctx["translations"]}
+    if reference_id is not None:
+        ref = by_id.get(reference_id)
+        if ref is None:
+            raise HTTPException(status_code=400, detail="reference_id is not a translation of this book")
+        references = [ref]
+    elif pairwise:
+        references = list(ctx["translations"])
+    else:
+        references = [by_id[tid] for tid in ctx["references"].values() if tid in by_id]
+    return [
+        (t, ref)
+        for ref in references
+        if language is None or ref.get("language") == language
+        for t in ctx["translations"]
+        if t["_id"] != ref["_id"] and t.get("language") == ref.get("language")
+    ]
+
+
+# Scoring
+
+def _versions(ctx: Dict[str, Any], t: Dict[str, Any], ref: Dict[str, Any]) -> Tuple[str, ...]:
+    source = text_ref(ctx["book"], "source_file_id", "source")
+    return (
+        fingerprint(text_ref(t, "file_id", "text")),
+        fingerprint(text_ref(ref, "file_id", "text")),
+        fingerprint(source) if source else "",
+    )
+
+
+async def _score(db, ctx: Dict[str, Any], t: Dict[str, Any], ref: Dict[str, Any], versions: Tuple[str, ...]) -> None:
+    book = ctx["book"]
+    doc: Dict[str, Any] = {
+        "book_id": book["_id"],
+        "language": t.get("language"),
+        "translation_id": t["_id"],
+        "reference_id": ref["_id"],
+        "translated_by": t.get("translated_by"),
+        "reference_translated_by": ref.get("translated_by"),
+        "revision": ctx["revisions"].get(t["_id"], 0),
+        "reference_revision": ctx["revisions"].get(ref["_id"], 0),
+        "versions": list(versions),
+        "designated": ctx["references"].get(t.get("language")) == ref["_id"],
+        "computed_at": _now(),
+        "error": None,
+    }
+    try:
+        with span("evaluation.score", translation_id=str(t["_id"]), reference_id=str(ref["_id"])):
+            result = await asyncio.get_running_loop().run_in_executor(
+                process_pool(), metrics.evaluate,
+                text_ref(t, "file_id", "text"), text_ref(ref, "file_id", "text"),
+                text_ref(book, "source_file_id", "source"),
+            )
+        doc.update({k: result[k] for k in METRICS})
+        for k in ("segment_chrf", "segment_bleu"):
+            doc[k] = Binary(result[k]) if result[k] is not None else None
+    except Exception as e:
+        print(f"⚠️  Evaluation of {t['_id']} against {ref['_id']} failed: {e}")
+        doc["error"] = str(e) or e.__class__.__name__
+    await db[COLLECTION].replace_one({"_id": pair_id(t["_id"], ref["_id"])}, doc, upsert=True)
+
+
+async def _score_once(db, ctx: Dict[str, Any], t: Dict[str, Any], ref: Dict[str, Any],
+                      versions: Tuple[str, ...]) -> None:
+    key = pair_id(t["_id"], ref["_id"])
+    try:
+        await _score(db, ctx, t, ref, versions)
+    finally:
+        if _inflight.get(key) == versions:
+            del _inflight[key]
+
+
+def _schedule(db, ctx: Dict[str, Any], t: Dict[str, Any], ref: Dict[str, Any],
+              versions: Tuple[str, ...]) -> Optional[asyncio.Task]:
+    key = pair_id(t["_id"], ref["_id"])
+    if _inflight.get(key) == versions:
+        return None
+    _inflight[key] = versions
+    task = asyncio.create_task(_score_once(db, ctx, t, ref, versions))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def evaluate_pairs(db, ctx: Dict[str, Any],
+                         selected: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Current evaluation documents for `selected`; missing or stale ones are scheduled and come back pending."""
+    ids = [pair_id(t["_id"], ref["_id"]) for t, ref in selected]
+    cached = {d["_id"]: d async for d in db[COLLECTION].find({"_id": {"$in": ids}}, {"segment_chrf": 0, "segment_bleu": 0})}
+    out = []
+    for (t, ref), key in zip(selected, ids):
+        versions = _versions(ctx, t, ref)
+        doc = cached.get(key)
+        if doc and tuple(doc.get("versions") or ()) == versions:
+            out.append({**doc, "status": FAILED if doc.get("error") else READY})
+            continue
+        _schedule(db, ctx, t, ref, versions)
+        out.append({
+            "translation_id": t["_id"],
+            "reference_id": ref["_id"],
+            "language": t.get("language"),
+            "translated_by": t.get("translated_by"),
+            "reference_translated_by": ref.get("translated_by"),
+            "revision": ctx["revisions"].get(t["_id"], 0),
+            "reference_revision": ctx["revisions"].get(ref["_id"], 0),
+            "status": PENDING,
+        })
+    return out
+
+
+# References
+
+async def set_reference(db, book_id: ObjectId, language: str, translation_id: ObjectId) -> None:
+    await db[REFERENCES].replace_one(
+        {"_id": f"{book_id}:{language}"},
+        {"book_id": book_id, "language": language, "translation_id": translation_id, "updated_at": _now()},
+        upsert=True,
+    )
+    scope = {"book_id": book_id, "language": language}
+    await db[COLLECTION].update_many({**scope, "reference_id": {"$ne": translation_id}}, {"$set": {"designated": False}})
+    await db[COLLECTION].update_many({**scope, "reference_id": translation_id}, {"$set": {"designated": True}})
+
+
+async def clear_reference(db, book_id: ObjectId, language: str) -> bool:
+    result = await db[REFERENCES].delete_one({"_id": f"{book_id}:{language}"})
+    await db[COLLECTION].update_many({"book_id": book_id, "language": language}, {"$set": {"designated": False}})
+    return result.deleted_count > 0
+
+
+async def book_removed(db, book_id: ObjectId) -> None:
+    try:
+        await db[COLLECTION].delete_many({"book_id": book_id})
+        await db[REFERENCES].delete_many({"book_id": book_id})
+    except Exception as e:
+        print(f"⚠️  Failed to delete evaluations: {e}")
+
+
+# Leaderboard
+
+async def leaderboard(db, language: Optional[str] = None, min_books: int = 1) -> List[Dict[str, Any]]:
+    """Mean scores per language and model over evaluations against designated references, best chrF first."""
+    match: Dict[str, Any] = {"designated": True, "error": None, "chrf": {"$exists": True}}
+    if language is not None:
+        match["language"] = language
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"language": "$language", "translated_by": "$translated_by"},
+            "books": {"$sum": 1},
+            "chrf": {"$avg": "$chrf"},
+            "bleu": {"$avg": "$bleu"},
+            "length_ratio": {"$avg": "$length_ratio"},
+            "untranslated_rate": {"$avg": "$untranslated_rate"},
+        }},
+        {"$match": {"books": {"$gte": min_books}}},
+        {"$sort": {"chrf": -1}},
+    ]
+    return [
+        {**{k: v for k, v in row.items() if k != "_id"}, **row["_id"]}
+        async for row in db[COLLECTION].aggregate(pipeline)
+    ]
+
+
+async def refresh(db) -> Dict[str, int]:
+    """Score every stale evaluation against a designated reference, a few pairs at a time."""
+    counts = {"books": 0, "scored": 0}
+    running: set = set()
+    book_ids = await db[REFERENCES].distinct("book_id")
+    async for book in db.books.find({"_id": {"$in": book_ids}}, {"source": 1, "source_file_id": 1}):
+        counts["books"] += 1
+        ctx = await load_book(db, book)
+        selected = pairs(ctx)
+        ids = [pair_id(t["_id"], ref["_id"]) for t, ref in selected]
+        current = {d["_id"]: tuple(d.get("versions") or ()) async for d in db[COLLECTION].find({"_id": {"$in": ids}}, {"versions": 1})}
+        for (t, ref), key in zip(selected, ids):
+            versions = _versions(ctx, t, ref)
+            if current.get(key) == versions:
+                continue
+            task = _schedule(db, ctx, t, ref, versions)
+            if task is None:
+                continue
+            counts["scored"] += 1
+            running.add(task)
+            task.add_done_callback(running.discard)
+            while len(running) >= EVALUATION_REFRESH_CONCURRENCY:
+                await asyncio.wait(set(running), return_when=asyncio.FIRST_COMPLETED)
+    if running:
+        await asyncio.wait(set(running))
+    return counts
+
+
+async def _refresh_logged(db) -> None:
+    try:
+        counts = await refresh(db)
+        print(f"📊 Evaluations refreshed: {counts['scored']} pair(s) scored over {counts['books']} book(s)")
+    except Exception as e:
+        print(f"⚠️  Evaluation refresh failed: {e}")
+    finally:
+        await release_lease(db[META], "refresh_lease")
+
+
+async def start_refresh(db) -> bool:
+    """Start a refresh in this worker unless one is already running in any worker."""
+    if refresh_running():
+        return False
+    if not await acquire_lease(db[META], "refresh_lease", EVALUATION_REFRESH_LEASE_S):
+        return False
+    _refresh["task"] = asyncio.create_task(_refresh_logged(db))
+    return True
+
+
+def refresh_running() -> bool:
+    return _refresh["task"] is not None and not _refresh["task"].done()
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    db = app.state.db
+    await db[COLLECTION].create_index([("book_id", 1), ("language", 1)])
+    await db[COLLECTION].create_index([("designated", 1), ("language", 1)])
+    await db[REFERENCES].create_index("book_id")
+
+
+@register_shutdown
+async def stop_scoring(app) -> None:
+    for task in [_refresh["task"], *_tasks]:
+        if task is not None:
+            task.cancel()
@@ -0,0 +1,241 @@
+"""Term extraction and alignment. Runs in worker processes (see glossary/store.py).
+
+Texts are streamed from file storage by `core.workers.read_segments`. Each non-empty
+line is one segment (paragraph).
+
+Source terms:
+
+- names: runs of capitalized words that do not start a sentence; a one-word
+  name must be capitalized in nearly all of its occurrences;
+- n-grams: 2-3 word n-grams, or 2-4 character n-grams in CJK text, that neither
+  start nor end with one of the text's most frequent units (its function
+  words);
+- kept when seen in at least GLOSSARY_MIN_COUNT segments. An n-gram that is
+  (almost) only ever part of a longer one is dropped in its favour (孙悟 for
+  孙悟空), and so is a rare extension of a frequent term.
+
+Target equivalents: source segment i is aligned with the target segments around
+i * n_target / n_source (exactly segment i when both have the same number of
+segments). The target n-grams found in the aligned windows of a term's
+occurrences are counted and ranked by their Dice coefficient with the term.
+"""
+
+import heapq
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Set, Tuple
+
+from core.workers import CJK_RANGES, HANGUL_RANGE, read_segments
+
+GLOSSARY_MAX_TERMS = int(os.environ.get("GLOSSARY_MAX_TERMS", "300"))
+GLOSSARY_MIN_COUNT = int(os.environ.get("GLOSSARY_MIN_COUNT", "3"))
+CANDIDATES_PER_TERM = 3
+MIN_DICE = 0.05
+# Occurrences of a term used for alignment, spread evenly over the book
+MAX_SAMPLES = 200
+# The text's most frequent units are its function words: at most this many, and at
+# most one in FUNCTION_SHARE of its distinct units (short texts have few of them)
+FUNCTION_UNITS = 50
+FUNCTION_SHARE = 20
+# A sub-n-gram is dropped when the longer term covers this share of its occurrences,
+# and a longer n-gram when it is this rare next to one of its sub-n-grams
+CONTAINED = 0.9
+RARE_EXTENSION = 0.1
+# Aligned target segments on each side when the segment counts differ
+WINDOW = 1
+
+# Kana, CJK ideographs and Hangul: written without spaces, so terms are character n-grams
+_CJK = CJK_RANGES + HANGUL_RANGE
+_UNIT = re.compile(rf"[{_CJK}]+|[^\W\d_{_CJK}]+(?:['’-][^\W\d_{_CJK}]+)*")
+_CJK_START = re.compile(rf"[{_CJK}]")
+_PUNCT = re.compile(r"([^\w\s'’-]+)")
+_SENTENCE_END = set(".!?。！？…")
+
+# Units of a phrase, whether they are CJK characters, whether the phrase starts a sentence
+Run = Tuple[List[str], bool, bool]
+
+def runs(segment: str) -> List[Run]:
+    """Split a segment into phrases at punctuation, and phrases into runs of one script."""
+    out: List[Run] = []
+    starts = True
+    for i, part in enumerate(_PUNCT.split(segment)):
+        if i % 2:
+            if any(c in _SENTENCE_END for c in part):
+                starts = True
+            continue
+        units: List[str] = []
+        cjk = False
+        first = starts
+        for m in _UNIT.finditer(part):
+            unit = m.group()
+            is_cjk = bool(_CJK_START.match(unit))
+            if units and is_cjk != cjk:
+                out.append((units, cjk, first))
+                units, first = [], False
+            cjk = is_cjk
+            if is_cjk:
+                units.extend(unit)
+            else:
+                units.append(unit)
+        if units:
+            out.append((units, cjk, first))
+            starts = False
+    return out
+
+
+def _function_units(parsed: List[List[Run]]) -> Set[str]:
+    df: Counter = Counter()
+    for seg in parsed:
+        df.update({u.lower() for units, _, _ in seg for u in units})
+    return {u for u, _ in df.most_common(min(FUNCTION_UNITS, len(df) // FUNCTION_SHARE))}
+
+
+def _sample(occurrences: List[int]) -> List[int]:
+    if len(occurrences) <= MAX_SAMPLES:
+        return occurrences
+    step = len(occurrences) / MAX_SAMPLES
+    return [occurrences[int(i * step)] for i in range(MAX_SAMPLES)]
+
+
+def source_terms(segments: List[str]) -> List[Dict[str, Any]]:
+    """Candidate terms of a source text, most significant first."""
+    parsed = [runs(s) for s in segments]
+    function = _function_units(parsed)
+    # (kind, units, cjk) -> segments it occurs in
+    occurrences: Dict[Tuple[str, Tuple[str, ...], bool], List[int]] = defaultdict(list)
+    capitalized: Counter = Counter()
+    lowercase: Counter = Counter()
+    for i, seg in enumerate(parsed):
+        seen = set()
+        for units, cjk, first in seg:
+            keys = units if cjk else [u.lower() for u in units]
+            for n in ((2, 3, 4) if cjk else (2, 3)):
+                for j in range(len(units) - n + 1):
+                    gram = keys[j:j + n]
+                    if gram[0] not in function and gram[-1] not in function:
+                        seen.add(("ngram", tuple(gram), cjk))
+            if cjk:
+                continue
+            j = 0
+            while j < len(units):
+                if units[j][0].isupper() and not (j == 0 and first):
+                    k = j
+                    while k < len(units) and k - j < 4 and units[k][0].isupper():
+                        k += 1
+                    seen.add(("name", tuple(units[j:k]), False))
+                    j = k
+                else:
+                    j += 1
+            for unit, key in zip(units, keys):
+                (capitalized if unit[0].isupper() else lowercase)[key] += 1
+        for key in seen:
+            occurrences[key].append(i)
+
+    counts = {key: len(segs) for key, segs in occurrences.items() if len(segs) >= GLOSSARY_MIN_COUNT}
+    names = {tuple(u.lower() for u in key[1]) for key in counts if key[0] == "name"}
+    dropped = set()
+    for (kind, units, cjk), n in counts.items():
+        lowered = tuple(u.lower() for u in units)
+        if kind == "name":
+            if all(u in function for u in lowered) or (
+                len(units) == 1 and (len(units[0]) < 2 or lowercase[lowered[0]] > 0.1 * capitalized[lowered[0]])
+            ):
+                dropped.add((kind, units, cjk))
+        elif lowered in names or lowered[:-1] in names or lowered[1:] in names:
+            # A name, or a name plus one word
+            dropped.add((kind, units, cjk))
+        if len(units) > (1 if kind == "name" else 2):
+            for sub in (units[:-1], units[1:]):
+                sub_key = (kind, sub, cjk)
+                if sub_key not in counts:
+                    continue
+                if n >= CONTAINED * counts[sub_key]:
+                    dropped.add(sub_key)
+                elif n < RARE_EXTENSION * counts[sub_key]:
+                    dropped.add((kind, units, cjk))
+
+    ranked = sorted(
+        (key for key in counts if key not in dropped),
+        key=lambda key: (counts[key] * len(key[1]) ** 0.5, key[1]),
+        reverse=True,
+    )[:GLOSSARY_MAX_TERMS]
+    return [
+        {
+            "term": ("" if cjk else " ").join(units),
+            "kind": kind,
+            "count": counts[(kind, units, cjk)],
+            "segments": _sample(occurrences[(kind, units, cjk)]),
+        }
+        for kind, units, cjk in ranked
+    ]
+
+
+def _target_grams(parsed: List[List[Run]], function: Set[str]) -> List[Set[str]]:
+    out = []
+    for seg in parsed:
+        grams = set()
+        for units, cjk, _ in seg:
+            for n in ((2, 3, 4) if cjk else (1, 2, 3)):
+                for j in range(len(units) - n + 1):
+                    gram = units[j:j + n]
+                    if gram[0].lower() in function or gram[-1].lower() in function:
+                        continue
+                    if n == 1 and len(gram[0]) < 3:
+                        continue
+                    grams.add(("" if cjk else " ").join(gram))
+        out.append(grams)
+    return out
+
+
+def propose(terms: List[Dict[str, Any]], source_segments: int, segments: List[str]) -> List[List[Dict[str, Any]]]:
+    """Ranked target-language candidates for each term (same order as `terms`)."""
+    parsed = [runs(s) for s in segments]
+    grams = _target_grams(parsed, _function_units(parsed))
+    df: Counter = Counter()
+    for g in grams:
+        df.update(g)
+    n_target = len(segments)
+    if not n_target or not source_segments:
+        return [[] for _ in terms]
+    ratio = n_target / source_segments
+    window = 0 if n_target == source_segments else WINDOW
+
+    out = []
+    for term in terms:
+        samples = term.get("segments") or []
+        co: Counter = Counter()
+        for i in samples:
+            center = min(n_target - 1, int(round(i * ratio)))
+            co.update(set().union(*grams[max(0, center - window):center + window + 1]))
+        scored = []
+        for gram, c in co.items():
+            if c < 2:
+                continue
+            # Scale the sampled co-occurrences back up to all of the term's occurrences
+            full = c * term["count"] / len(samples)
+            dice = 2 * full / (term["count"] + df[gram])
+            if dice >= MIN_DICE:
+                scored.append((round(min(dice, 1.0), 2), len(gram), full, gram))
+        picked: List[Dict[str, Any]] = []
+        # Equal scores: the longest candidate, not its parts ("bâton d'or" over "bâton" and "d'or")
+        for dice, _, full, gram in heapq.nlargest(CANDIDATES_PER_TERM * 4, scored):
+            if any(gram in p["term"] for p in picked):
+                continue
+            picked.append({"term": gram, "score": dice, "count": int(round(full))})
+            if len(picked) == CANDIDATES_PER_TERM:
+                break
+        out.append(picked)
+    return out
+
+
+# Entry points for the process pool
+
+def extract_source(ref: Dict[str, Any]) -> Dict[str, Any]:
+    segments = read_segments(ref)
+    return {"segments": len(segments), "terms": source_terms(segments)}
+
+
+def align_translation(terms: List[Dict[str, Any]], source_segments: int,
+                      ref: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+    return propose(terms, source_segments, read_segments(ref))
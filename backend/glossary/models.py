@@ -0,0 +1,48 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class GlossaryCandidateOut(BaseModel):
+    term: str
+    score: float = Field(..., description="Dice co-occurrence of the candidate with the source term in aligned segments (0-1)")
+    count: int = Field(..., description="Estimated aligned co-occurrences")
+    translations: int = Field(..., description="Translations in this language proposing the candidate")
+
+
+class GlossaryTermOut(BaseModel):
+    id: str
+    term: str
+    kind: str = Field(..., description="name, ngram or manual (added by an admin)")
+    count: int = Field(..., description="Source segments containing the term")
+    approved: Dict[str, str] = Field(default_factory=dict, description="Approved equivalent per language")
+    candidates: Dict[str, List[GlossaryCandidateOut]] = Field(
+        default_factory=dict, description="Proposed equivalents per language, best first"
+    )
+    notes: Optional[str] = None
+    hidden: bool = False
+
+
+class GlossaryStatusOut(BaseModel):
+    book_id: str
+    status: str = Field(..., description="queued, running, ready or failed")
+    error: Optional[str] = None
+    requested_at: Optional[str] = Field(None, description="ISO timestamp of the last extraction request")
+    finished_at: Optional[str] = Field(None, description="ISO timestamp of the last finished run")
+
+
+class GlossaryOut(GlossaryStatusOut):
+    terms: List[GlossaryTermOut] = Field(default_factory=list)
+
+
+class GlossaryTermIn(BaseModel):
+    term: str = Field(..., example="Sun Wukong")
+    approved: Dict[str, str] = Field(default_factory=dict, example={"French": "Sun Wukong"})
+    notes: Optional[str] = None
+
+
+class GlossaryTermUpdate(BaseModel):
+    approved: Optional[Dict[str, Optional[str]]] = Field(
+        None, description="Equivalents to approve per language; null removes a language's approval"
+    )
+    notes: Optional[str] = None
+    hidden: Optional[bool] = None
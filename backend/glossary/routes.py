@@ -0,0 +1,143 @@
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from books.repository import BookRepository
+from core.repository import parse_object_id
+from users.auth import require_admin
+
+from .models import GlossaryOut, GlossaryStatusOut, GlossaryTermIn, GlossaryTermOut, GlossaryTermUpdate
+from . import store
+
+router = APIRouter()
+
+
+def _iso(value: Any) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _status_out(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "book_id": str(doc["_id"]),
+        "status": doc.get("status"),
+        "error": doc.get("error"),
+        "requested_at": _iso(doc.get("requested_at")),
+        "finished_at": _iso(doc.get("finished_at")),
+    }
+
+
+def _term_out(doc: Dict[str, Any], language: Optional[str] = None) -> Dict[str, Any]:
+    approved = doc.get("approved") or {}
+    if language is not None:
+        approved = {lang: t for lang, t in approved.items() if lang == language}
+    return {
+        "id": str(doc["_id"]),
+        "term": doc["term"],
+        "kind": doc.get("kind"),
+        "count": doc.get("count", 0),
+        "approved": approved,
+        "candidates": store.merged_candidates(doc.get("proposals"), language),
+        "notes": doc.get("notes"),
+        "hidden": doc.get("hidden", False),
+    }
+
+
+@router.get("/books/{book_id}/glossary", response_model=GlossaryOut)
+async def get_glossary(book_id: str, request: Request, language: Optional[str] = Query(None),
+                       include_hidden: bool = Query(False)):
+    """The book's glossary: source terms with approved and proposed equivalents, most frequent first."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    glossary = await db[store.COLLECTION].find_one({"_id": oid})
+    if not glossary:
+        raise HTTPException(status_code=404, detail="Glossary not found")
+    query: Dict[str, Any] = {"book_id": oid}
+    if not include_hidden:
+        query["hidden"] = {"$ne": True}
+    terms = [
+        _term_out(doc, language)
+        async for doc in db[store.TERMS].find(query, {"segments": 0}).sort([("count", -1), ("term", 1)])
+    ]
+    return ORJSONResponse({**_status_out(glossary), "terms": terms})
+
+
+@router.post("/books/{book_id}/glossary/extract", response_model=GlossaryStatusOut, status_code=202)
+async def extract_glossary(book_id: str, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: queue extraction of the book's glossary. Later file changes re-run it incrementally."""
+    db = request.app.state.db
+    book = await BookRepository(db).get(book_id, {"source": 1, "source_file_id": 1})
+    if not book.get("source_file_id") and not book.get("source"):
+        raise HTTPException(status_code=400, detail="Book has no source text")
+    glossary = await store.request_extraction(db, book["_id"])
+    return ORJSONResponse(_status_out(glossary), status_code=202)
+
+
+@router.post("/books/{book_id}/glossary/terms", response_model=GlossaryTermOut, status_code=201)
+async def add_glossary_term(book_id: str, payload: GlossaryTermIn, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: add a term the extraction missed."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    term = payload.term.strip()
+    if not term:
+        raise HTTPException(status_code=400, detail="term must not be empty")
+    doc = {
+        "book_id": oid,
+        "term": term,
+        "kind": "manual",
+        "count": 0,
+        "segments": [],
+        "proposals": {},
+        "approved": {lang: t for lang, t in payload.approved.items() if t},
+        "notes": payload.notes,
+        "hidden": False,
+        "edited": True,
+    }
+    try:
+        await db[store.TERMS].insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Term already in glossary")
+    return ORJSONResponse(_term_out(doc), status_code=201)
+
+
+@router.put("/books/{book_id}/glossary/terms/{term_id}", response_model=GlossaryTermOut)
+async def update_glossary_term(book_id: str, term_id: str, payload: GlossaryTermUpdate, request: Request,
+                               _: bool = Depends(require_admin)):
+    """Admin-only: approve equivalents, annotate or hide a term. Edited terms survive re-extraction."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    set_fields: Dict[str, Any] = {"edited": True}
+    unset: Dict[str, str] = {}
+    for lang, value in (payload.approved or {}).items():
+        if value:
+            set_fields[f"approved.{lang}"] = value
+        else:
+            unset[f"approved.{lang}"] = ""
+    fields = payload.dict(exclude_unset=True)
+    for field in ("notes", "hidden"):
+        if field in fields:
+            set_fields[field] = fields[field]
+    update: Dict[str, Any] = {"$set": set_fields}
+    if unset:
+        update["$unset"] = unset
+    doc = await db[store.TERMS].find_one_and_update(
+        {"_id": parse_object_id(term_id, "Term not found"), "book_id": oid},
+        update,
+        projection={"segments": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Term not found")
+    return ORJSONResponse(_term_out(doc))
+
+
+@router.delete("/books/{book_id}/glossary/terms/{term_id}")
+async def delete_glossary_term(book_id: str, term_id: str, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: remove a term. Extracted terms come back if the source changes; hide them to keep them out."""
+    db = request.app.state.db
+    oid = (await BookRepository(db).get(book_id, {"_id": 1}))["_id"]
+    result = await db[store.TERMS].delete_one({"_id": parse_object_id(term_id, "Term not found"), "book_id": oid})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Term not found")
+    return {"status": "deleted"}
@@ -0,0 +1,264 @@
+"""Per-book glossaries: extraction jobs, incremental reruns and admin edits.
+
+Extraction (glossary/extract.py) runs in the worker process pool (core/workers.py),
+never in the request loop. A request only marks the book's glossary "queued". A
+background job in each app worker claims queued glossaries one at a time and
+hands the work to the pool. The claim is a lease, so a job whose worker died is
+picked up again.
+
+`glossaries` has one document per book:
+
+    {_id: book_id, status: queued|running|ready|failed, error, requested_at,
+     started_at, finished_at, lease_until, source: <fingerprint>, segments: <n>,
+     translations: {<translation_id>: <fingerprint>}}
+
+`glossary_terms` has one document per term:
+
+    {book_id, term, kind: name|ngram|manual, count, segments: [sampled indices],
+     proposals: {<translation_id>: {language, candidates: [{term, score, count}]}},
+     approved: {<language>: <term>}, notes, hidden, edited}
+
+Fingerprints are file ids (a SHA-1 for inline text), so a rerun only
+aligns translations whose file changed since the last run. Proposals of deleted
+translations are dropped. A new source file means a full rerun. Terms an admin
+added or edited survive it; other terms that are no longer extracted are removed.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from core.lifecycle import register_background, register_warmup
+from core.tracing import span
+from core.workers import fingerprint, process_pool, text_ref
+
+from . import extract
+
+COLLECTION = "glossaries"
+TERMS = "glossary_terms"
+
+QUEUED = "queued"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+GLOSSARY_POLL_INTERVAL_S = float(os.environ.get("GLOSSARY_POLL_INTERVAL_S", "5"))
+GLOSSARY_JOB_TIMEOUT_S = float(os.environ.get("GLOSSARY_JOB_TIMEOUT_S", "3600"))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Requests
+
+async def request_extraction(db, book_id: ObjectId) -> Dict[str, Any]:
+    """Queue (re)extraction of a book's glossary; returns its status document."""
+    now = _now()
+    # A glossary being extracted is queued again when its run finishes (see `_finish`)
+    doc = await db[COLLECTION].find_one_and_update(
+        {"_id": book_id, "status": RUNNING},
+        {"$set": {"requested_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc:
+        return doc
+    return await db[COLLECTION].find_one_and_update(
+        {"_id": book_id},
+        {"$set": {"status": QUEUED, "requested_at": now, "error": None}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def book_files_changed(db, book_id: ObjectId) -> None:
+    """Re-queue an existing glossary after the book's source or a translation changed."""
+    try:
+        if await db[COLLECTION].find_one({"_id": book_id}, {"_id": 1}):
+            await request_extraction(db, book_id)
+    except Exception as e:
+        print(f"⚠️  Failed to queue glossary update: {e}")
+
+
+async def book_removed(db, book_id: ObjectId) -> None:
+    try:
+        await db[TERMS].delete_many({"book_id": book_id})
+        await db[COLLECTION].delete_one({"_id": book_id})
+    except Exception as e:
+        print(f"⚠️  Failed to delete glossary: {e}")
+
+
+# Extraction
+
+async def _claim(db) -> Optional[Dict[str, Any]]:
+    now = _now()
+    return await db[COLLECTION].find_one_and_update(
+        {"$or": [{"status": QUEUED}, {"status": RUNNING, "lease_until": {"$lt": now}}]},
+        {"$set": {
+            "status": RUNNING,
+            "started_at": now,
+            "lease_until": now + timedelta(seconds=GLOSSARY_JOB_TIMEOUT_S),
+        }},
+        sort=[("requested_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _replace_terms(db, book_id: ObjectId, terms: List[Dict[str, Any]]) -> None:
+    """Store a fresh extraction, keeping admin edits and dropping stale proposals."""
+    existing = {d["term"]: d async for d in db[TERMS].find({"book_id": book_id}, {"term": 1, "edited": 1})}
+    ops = []
+    for term in terms:
+        fields = {"kind": term["kind"], "count": term["count"], "segments": term["segments"], "proposals": {}}
+        if term["term"] in existing:
+            ops.append(UpdateOne({"_id": existing.pop(term["term"])["_id"]}, {"$set": fields}))
+        else:
+            ops.append(UpdateOne(
+                {"book_id": book_id, "term": term["term"]},
+                {"$set": fields, "$setOnInsert": {"approved": {}, "notes": None, "hidden": False, "edited": False}},
+                upsert=True,
+            ))
+    for doc in existing.values():
+        if doc.get("edited"):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"count": 0, "segments": [], "proposals": {}}}))
+    if ops:
+        await db[TERMS].bulk_write(ops, ordered=False)
+    stale = [d["_id"] for d in existing.values() if not d.get("edited")]
+    if stale:
+        await db[TERMS].delete_many({"_id": {"$in": stale}})
+
+
+async def _align(db, book_id: ObjectId, terms: List[Dict[str, Any]], segments: int,
+                 translation: Dict[str, Any], ref: Dict[str, Any]) -> None:
+    payload = [{"count": t["count"], "segments": t["segments"]} for t in terms]
+    proposals = await asyncio.get_running_loop().run_in_executor(
+        process_pool(), extract.align_translation, payload, segments, ref
+    )
+    field = f"proposals.{translation['_id']}"
+    ops = [
+        UpdateOne({"_id": t["_id"]}, {"$set": {field: {"language": translation.get("language"), "candidates": c}}})
+        for t, c in zip(terms, proposals)
+    ]
+    if ops:
+        await db[TERMS].bulk_write(ops, ordered=False)
+
+
+async def _run(db, glossary: Dict[str, Any]) -> None:
+    book_id = glossary["_id"]
+    book = await db.books.find_one({"_id": book_id}, {"source": 1, "source_file_id": 1})
+    if not book:
+        await book_removed(db, book_id)
+        return
+    source = text_ref(book, "source_file_id", "source")
+    if source is None:
+        raise ValueError("Book has no source text")
+    loop = asyncio.get_running_loop()
+
+    source_fingerprint = fingerprint(source)
+    done: Dict[str, str] = glossary.get("translations") or {}
+    segments = glossary.get("segments") or 0
+    if glossary.get("source") != source_fingerprint:
+        with span("glossary.extract", book_id=str(book_id)):
+            result = await loop.run_in_executor(process_pool(), extract.extract_source, source)
+        await _replace_terms(db, book_id, result["terms"])
+        segments, done = result["segments"], {}
+        await db[COLLECTION].update_one(
+            {"_id": book_id}, {"$set": {"source": source_fingerprint, "segments": segments, "translations": {}}}
+        )
+
+    terms = [
+        t async for t in db[TERMS].find(
+            {"book_id": book_id, "count": {"$gt": 0}}, {"count": 1, "segments": 1}
+        ).sort("_id", 1)
+    ]
+    current: Dict[str, str] = {}
+    todo = []
+    async for t in db.translations.find({"book_id": book_id}, {"language": 1, "file_id": 1, "text": 1}):
+        ref = text_ref(t, "file_id", "text")
+        if ref is None:
+            continue
+        current[str(t["_id"])] = fingerprint(ref)
+        if done.get(str(t["_id"])) != current[str(t["_id"])]:
+            todo.append((t, ref))
+    with span("glossary.align", book_id=str(book_id), translations=len(todo), terms=len(terms)):
+        await asyncio.gather(*(_align(db, book_id, terms, segments, t, ref) for t, ref in todo))
+    removed = [tid for tid in done if tid not in current]
+    if removed:
+        await db[TERMS].update_many({"book_id": book_id}, {"$unset": {f"proposals.{tid}": "" for tid in removed}})
+    await db[COLLECTION].update_one({"_id": book_id}, {"$set": {"translations": current}})
+    if todo or removed:
+        print(f"📚 Glossary for {book_id}: {len(terms)} terms, {len(todo)} translation(s) aligned")
+
+
+async def _finish(db, glossary: Dict[str, Any], error: Optional[str] = None) -> None:
+    now = _now()
+    fields = {"status": FAILED if error else READY, "error": error, "finished_at": now, "lease_until": None}
+    done = await db[COLLECTION].find_one_and_update(
+        {"_id": glossary["_id"], "requested_at": {"$lte": glossary["started_at"]}}, {"$set": fields}
+    )
+    if done is None:
+        # Requested again while running: run again
+        await db[COLLECTION].update_one(
+            {"_id": glossary["_id"]}, {"$set": {**fields, "status": QUEUED}}
+        )
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    db = app.state.db
+    await db[TERMS].create_index([("book_id", 1), ("term", 1)], unique=True)
+    await db[COLLECTION].create_index([("status", 1), ("requested_at", 1)])
+
+
+@register_background
+async def run_queued(app) -> None:
+    db = app.state.db
+    while True:
+        try:
+            glossary = await _claim(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Failed to poll glossary jobs: {e}")
+            glossary = None
+        if glossary is None:
+            await asyncio.sleep(GLOSSARY_POLL_INTERVAL_S)
+            continue
+        try:
+            await _run(db, glossary)
+        except asyncio.CancelledError:
+            # Shutting down: leave it for the next worker rather than waiting out the lease
+            await asyncio.shield(db[COLLECTION].update_one(
+                {"_id": glossary["_id"]}, {"$set": {"status": QUEUED, "lease_until": None}}
+            ))
+            raise
+        except Exception as e:
+            print(f"❌ Glossary extraction for {glossary['_id']} failed: {e}")
+            await _finish(db, glossary, str(e) or e.__class__.__name__)
+        else:
+            await _finish(db, glossary)
+
+
+# Reading and editing
+
+def merged_candidates(proposals: Dict[str, Dict[str, Any]], language: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Candidates per language, combined over that language's translations."""
+    by_language: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for proposal in (proposals or {}).values():
+        lang = proposal.get("language") or "unknown"
+        if language is not None and lang != language:
+            continue
+        merged = by_language.setdefault(lang, {})
+        for c in proposal.get("candidates") or []:
+            current = merged.setdefault(c["term"], {"term": c["term"], "score": 0.0, "count": 0, "translations": 0})
+            current["score"] = max(current["score"], c["score"])
+            current["count"] += c["count"]
+            current["translations"] += 1
+    return {
+        lang: sorted(merged.values(), key=lambda c: (c["translations"], c["score"]), reverse=True)[:extract.CANDIDATES_PER_TERM]
+        for lang, merged in by_language.items()
+    }
@@ -1,6 +1,11 @@
 from dotenv import load_dotenv
+
+# Load .env before importing modules that read their settings at import time
+load_dotenv()
+
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import motor.motor_asyncio
 import os
@@ -8,10 +13,22 @@ import os
 from books.routes import router as books_router
 from users.routes import router as users_router
 from suggestions.routes import router as suggestions_router
+from admin.routes import router as admin_router
+from revisions.routes import router as revisions_router
+from stats.routes import router as stats_router
+from resumable.routes import router as resumable_router
+from similar.routes import router as similar_router
+from glossary.routes import router as glossary_router
+from evaluation.routes import router as evaluation_router
+from core.profiling import PROFILING_ENABLED, ProfilingMiddleware, MongoCommandRecorder
+from core.tracing import (
+    TRACING_ENABLED, TracingMiddleware, MongoCommandTracer, PoolWaitTracer, start_tracing, shutdown_tracing,
+)
+from core.concurrency import CONCURRENCY_LIMITS_ENABLED, ConcurrencyLimitMiddleware
+from core.db import client_options, pool_stats
+from core.lifecycle import warm_up, shutdown, readiness
 
 
-load_dotenv()
-
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.environ.get("MONGO_DB", "litmt")
 _cors_env = os.environ.get("CORS_ALLOW_ORIGINS")
@@ -27,19 +44,35 @@ else:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+    event_listeners = [pool_stats]
+    if PROFILING_ENABLED:
+        event_listeners.append(MongoCommandRecorder())
+    if TRACING_ENABLED:
+        event_listeners += [MongoCommandTracer(), PoolWaitTracer()]
+        start_tracing()
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        MONGO_URI, event_listeners=event_listeners, **client_options()
+    )
     app.state.mongo_client = client
     app.state.db = client[MONGO_DB]
+    await warm_up(app)
     print("MongoDB connected")
     try:
         yield
     finally:
         print("shutting down")
+        await shutdown(app)
         client.close()
+        if TRACING_ENABLED:
+            shutdown_tracing()
 
 
 app = FastAPI(lifespan=lifespan)
 
+# Per-class concurrency limits and priority queues; added before CORS so a 503 still carries CORS headers
+if CONCURRENCY_LIMITS_ENABLED:
+    app.add_middleware(ConcurrencyLimitMiddleware)
+
 # Allow frontend dev server to talk to backend
 app.add_middleware(
     CORSMiddleware,
@@ -49,13 +82,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request profiling (admin header or sampling); not installed at all when disabled
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Request tracing (W3C traceparent + sampling); outermost so the server span covers everything
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 app.include_router(books_router, prefix="/api")
 app.include_router(users_router, prefix="/api")
 app.include_router(suggestions_router, prefix="/api")
+app.include_router(revisions_router, prefix="/api")
+app.include_router(stats_router, prefix="/api")
+app.include_router(resumable_router, prefix="/api")
+app.include_router(similar_router, prefix="/api")
+app.include_router(glossary_router, prefix="/api")
+app.include_router(evaluation_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 
 
 @app.get("/health")
 async def health():
+    """Liveness: the process is up. Use /ready for dependency checks."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready(request: Request):
+    """Readiness: pings Mongo and reports pool utilization; 503 when not ready."""
+    report = await readiness(request.app)
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
@@ -0,0 +1,30 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class UploadCreate(BaseModel):
+    target: Literal["source", "translation", "translation_file"] = Field(
+        ...,
+        description="'source': the book's original source; 'translation': a new translation of the book; "
+                    "'translation_file': replace the file of an existing translation",
+    )
+    book_id: Optional[str] = Field(None, description="Required for 'source' and 'translation'")
+    translation_id: Optional[str] = Field(None, description="Required for 'translation_file'")
+    filename: str = Field(..., example="scan_ocr.txt")
+    length: int = Field(..., gt=0, description="Total size of the file in bytes")
+    chunk_size: Optional[int] = Field(None, description="Bytes per chunk; every chunk but the last has this size")
+    language: Optional[str] = Field(None, description="Required for 'translation'")
+    translated_by: Optional[str] = None
+    sha256: Optional[str] = Field(None, description="Optional hex SHA-256 of the whole file, checked on finalize")
+
+
+class UploadOut(BaseModel):
+    id: str
+    target: str
+    filename: str
+    length: int
+    chunk_size: int
+    chunks: int = Field(..., description="Number of chunks the file is split into")
+    offset: int = Field(..., description="Bytes received contiguously from the start of the file")
+    missing: List[int] = Field(..., description="Indexes of chunks not received yet (chunk n starts at n * chunk_size)")
+    expires_at: str = Field(..., description="ISO timestamp; each received chunk extends it")
@@ -0,0 +1,127 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Depends, Header
+from fastapi.responses import ORJSONResponse
+
+from users.auth import require_admin, get_current_user_claims
+from books import attach, uploads
+from books.repository import BookRepository, TranslationRepository
+from books.serializers import translation_to_dict
+from revisions.store import read_file
+
+from .models import UploadCreate, UploadOut
+from . import store
+
+router = APIRouter()
+
+
+def _progress_response(session: dict, status_code: int = 200) -> ORJSONResponse:
+    out = store.progress(session)
+    return ORJSONResponse(out, status_code=status_code, headers={"Upload-Offset": str(out["offset"])})
+
+
+@router.post("/uploads", response_model=UploadOut, status_code=201)
+async def create_upload(payload: UploadCreate, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: open a resumable upload for a book source or a translation file."""
+    db = request.app.state.db
+    spec = payload.dict(exclude_none=True)
+    if payload.target in ("source", "translation"):
+        books = BookRepository(db)
+        if not payload.book_id or not await books.exists(payload.book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
+        spec["book_id"] = books.oid(payload.book_id)
+        if payload.target == "translation" and not payload.language:
+            raise HTTPException(status_code=400, detail="language is required for a translation upload")
+    else:
+        translations = TranslationRepository(db)
+        if not payload.translation_id or not await translations.exists(payload.translation_id):
+            raise HTTPException(status_code=404, detail="Translation not found")
+        spec["translation_id"] = translations.oid(payload.translation_id)
+    session = await store.create_session(db, spec)
+    return _progress_response(session, 201)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadOut)
+async def get_upload(upload_id: str, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: progress of an upload; resume by sending the `missing` chunks."""
+    session = await store.get_session(request.app.state.db, upload_id)
+    return _progress_response(session)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadOut)
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., description="Byte offset of this chunk; a multiple of chunk_size"),
+    upload_checksum: Optional[str] = Header(
+        None, description="`sha256 <base64 digest>` of the chunk body (sha1 and md5 also accepted)"
+    ),
+    _: bool = Depends(require_admin),
+):
+    """Admin-only: store one chunk (raw request body). Chunks may be sent in any order and in parallel.
+
+    A chunk whose checksum does not match is rejected with 460 and can be re-sent.
+    """
+    db = request.app.state.db
+    session = await store.get_session(db, upload_id)
+    data = await request.body()
+    session = await store.put_chunk(db, session, upload_offset, data, upload_checksum)
+    return _progress_response(session)
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: assemble the chunks into a stored file and attach it to its book or translation.
+
+    The file is analyzed like a direct upload (see books/ingest.py); a file that
+    is not clean UTF-8 is replaced by a normalized copy. Returns the updated
+    source info or translation.
+    """
+    db = request.app.state.db
+    session = await store.get_session(db, upload_id)
+    session = await store.assemble(db, session)
+    created_by = get_current_user_claims(request).get("username")
+    filename = session["filename"]
+    stored = None
+    try:
+        if session["target"] == "source":
+            book = await BookRepository(db).get(session["book_id"], {"original_language": 1})
+            stored = await uploads.ingest_stored(db, session["file_id"], filename, book.get("original_language"))
+            await attach.attach_source(db, session["book_id"], stored.file_id, filename, stored.stats)
+            result = {
+                "id": str(session["book_id"]), "source_file_id": str(stored.file_id), "source_filename": filename,
+                "source_stats": stored.stats,
+            }
+        elif session["target"] == "translation":
+            stored = await uploads.ingest_stored(db, session["file_id"], filename, session["language"])
+            tdoc = await attach.attach_new_translation(
+                db, session["book_id"], stored.file_id, filename, session["language"], session.get("translated_by"),
+                stored.size, stored.lines, created_by, stored.stats,
+            )
+            result = translation_to_dict(tdoc)
+        else:
+            t = await TranslationRepository(db).get(session["translation_id"])
+            stored = await uploads.ingest_stored(db, session["file_id"], filename, t.get("language"))
+            content = await read_file(db, stored.file_id)
+            t = await attach.attach_translation_file(db, t, content, stored.file_id, filename, created_by, stored.stats)
+            result = translation_to_dict(t)
+    except BaseException:
+        if stored and stored.file_id != session["file_id"]:
+            await uploads.delete_files(db, [stored.file_id])
+        await store.reopen(db, session)
+        raise
+    await store.close(db, session)
+    if stored.file_id != session["file_id"]:
+        # The upload was normalized into a new file; the assembled original is no longer needed
+        await uploads.delete_files(db, [session["file_id"]])
+    return ORJSONResponse(result)
+
+
+@router.delete("/uploads/{upload_id}")
+async def cancel_upload(upload_id: str, request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: abandon an upload and delete the chunks received so far."""
+    db = request.app.state.db
+    session = await store.get_session(db, upload_id)
+    if session["state"] != "open":
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    await store.discard(db, session)
+    return {"status": "deleted", "id": upload_id}
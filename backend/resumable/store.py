@@ -0,0 +1,274 @@
+"""Resumable chunked uploads (tus-like) staged in GridFS chunk documents.
+
+A session fixes the file's length and chunk size and reserves a file id.
+Each chunk is written straight into `fs.chunks` as chunk `n` of that file, so
+chunks can arrive in any order, in parallel, and be retried: a retry simply
+replaces the chunk. Every chunk carries a checksum header that is verified
+before it is stored. Finalizing checks that every chunk is present (and the
+optional whole-file SHA-256). With the GridFS storage backend it then inserts
+the `fs.files` document, and the chunks become an ordinary GridFS file without
+being copied. With another backend (core/storage.py) the chunks are copied into
+storage under the same id and dropped once the session is closed.
+
+Sessions live in `upload_sessions`. Each received chunk pushes `expires_at`
+forward by UPLOAD_SESSION_TTL_S. A background sweep deletes expired sessions
+and their chunks. It cannot use a TTL index, because the chunks must be removed too.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from bson import Binary, ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from core.lifecycle import register_background, register_warmup
+from core.repository import parse_object_id
+from core.storage import file_storage
+from core.tracing import span
+
+COLLECTION = "upload_sessions"
+FILES = "fs.files"
+CHUNKS = "fs.chunks"
+
+UPLOAD_SESSION_TTL_S = float(os.environ.get("UPLOAD_SESSION_TTL_S", str(24 * 3600)))
+UPLOAD_SWEEP_INTERVAL_S = float(os.environ.get("UPLOAD_SWEEP_INTERVAL_S", "600"))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+# Chunks are stored as GridFS chunk documents, which must stay well under 16 MB
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+CHECKSUM_ALGORITHMS = {"sha256": hashlib.sha256, "sha1": hashlib.sha1, "md5": hashlib.md5}
+
+NOT_FOUND = "Upload not found"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def chunk_count(length: int, chunk_size: int) -> int:
+    return (length + chunk_size - 1) // chunk_size
+
+
+def chunk_length(session: Dict[str, Any], n: int) -> int:
+    """Expected size of chunk `n` (the last one holds the remainder)."""
+    if n < session["chunks"] - 1:
+        return session["chunk_size"]
+    return session["length"] - session["chunk_size"] * (session["chunks"] - 1)
+
+
+def progress(session: Dict[str, Any]) -> Dict[str, Any]:
+    """UploadOut fields for a session document."""
+    received = set(session.get("received") or [])
+    contiguous = 0
+    while contiguous in received:
+        contiguous += 1
+    return {
+        "id": str(session["_id"]),
+        "target": session["target"],
+        "filename": session["filename"],
+        "length": session["length"],
+        "chunk_size": session["chunk_size"],
+        "chunks": session["chunks"],
+        "offset": min(contiguous * session["chunk_size"], session["length"]),
+        "missing": [n for n in range(session["chunks"]) if n not in received],
+        "expires_at": _aware(session["expires_at"]).isoformat(),
+    }
+
+
+async def create_session(db, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Open a session for an already validated UploadCreate payload (plus resolved ids)."""
+    if spec["length"] > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {UPLOAD_MAX_BYTES} bytes")
+    chunk_size = spec.get("chunk_size") or UPLOAD_CHUNK_SIZE
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes"
+        )
+    session = {
+        **spec,
+        "chunk_size": chunk_size,
+        "chunks": chunk_count(spec["length"], chunk_size),
+        "file_id": ObjectId(),
+        "received": [],
+        "state": "open",
+        "created_at": _now(),
+        "expires_at": _now() + timedelta(seconds=UPLOAD_SESSION_TTL_S),
+    }
+    await db[COLLECTION].insert_one(session)
+    return session
+
+
+async def get_session(db, upload_id: str) -> Dict[str, Any]:
+    session = await db[COLLECTION].find_one({"_id": parse_object_id(upload_id, NOT_FOUND)})
+    if not session or _aware(session["expires_at"]) < _now():
+        raise HTTPException(status_code=404, detail=NOT_FOUND)
+    return session
+
+
+async def verify_checksum(header: Optional[str], data: bytes) -> None:
+    """Check a tus-style `Upload-Checksum: <algorithm> <base64 digest>` header against the chunk."""
+    if not header:
+        raise HTTPException(status_code=400, detail="Upload-Checksum header is required")
+    algorithm, _, encoded = header.strip().partition(" ")
+    factory = CHECKSUM_ALGORITHMS.get(algorithm.lower())
+    if factory is None:
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported checksum algorithm; use one of {', '.join(CHECKSUM_ALGORITHMS)}"
+        )
+    try:
+        expected = base64.b64decode(encoded.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Malformed Upload-Checksum header")
+    digest = await asyncio.get_running_loop().run_in_executor(None, lambda: factory(data).digest())
+    if digest != expected:
+        raise HTTPException(status_code=460, detail="Checksum mismatch")
+
+
+async def put_chunk(db, session: Dict[str, Any], offset: int, data: bytes, checksum: Optional[str]) -> Dict[str, Any]:
+    """Store the chunk starting at `offset`; returns the updated session."""
+    if session["state"] != "open":
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    if offset < 0 or offset % session["chunk_size"] or offset >= session["length"]:
+        raise HTTPException(status_code=400, detail="Upload-Offset must be a chunk boundary inside the file")
+    n = offset // session["chunk_size"]
+    if len(data) != chunk_length(session, n):
+        raise HTTPException(status_code=400, detail=f"Chunk {n} must be {chunk_length(session, n)} bytes")
+    await verify_checksum(checksum, data)
+
+    with span("storage.upload_chunk", file_id=str(session["file_id"]), n=n, bytes=len(data)):
+        await db[CHUNKS].replace_one(
+            {"files_id": session["file_id"], "n": n},
+            {"files_id": session["file_id"], "n": n, "data": Binary(data)},
+            upsert=True,
+        )
+    updated = await db[COLLECTION].find_one_and_update(
+        {"_id": session["_id"], "state": "open"},
+        {"$addToSet": {"received": n}, "$set": {"expires_at": _now() + timedelta(seconds=UPLOAD_SESSION_TTL_S)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    return updated
+
+
+async def _file_sha256(db, session: Dict[str, Any]) -> str:
+    digest = hashlib.sha256()
+    loop = asyncio.get_running_loop()
+    async for chunk in db[CHUNKS].find({"files_id": session["file_id"]}, {"data": 1}).sort("n", 1):
+        await loop.run_in_executor(None, digest.update, chunk["data"])
+    return digest.hexdigest()
+
+
+async def assemble(db, session: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a complete session into a stored file and return the session, locked against further chunks.
+
+    Raises 409 when chunks are missing or another finalize is in progress, and
+    400 when the whole-file checksum does not match.
+    """
+    locked = await db[COLLECTION].find_one_and_update(
+        {"_id": session["_id"], "state": "open"},
+        {"$set": {"state": "finalizing", "expires_at": _now() + timedelta(seconds=UPLOAD_SESSION_TTL_S)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not locked:
+        raise HTTPException(status_code=409, detail="Upload is already being finalized")
+    try:
+        missing = progress(locked)["missing"]
+        if missing:
+            raise HTTPException(status_code=409, detail=f"{len(missing)} chunk(s) missing, first is {missing[0]}")
+        stored = await db[CHUNKS].count_documents({"files_id": locked["file_id"]})
+        if stored != locked["chunks"]:
+            raise HTTPException(status_code=409, detail="Stored chunks do not match the session; re-send the file")
+        if locked.get("sha256") and await _file_sha256(db, locked) != locked["sha256"].lower():
+            raise HTTPException(status_code=400, detail="File checksum mismatch")
+        if file_storage(db).chunks_in_place:
+            await db[FILES].insert_one({
+                "_id": locked["file_id"],
+                "length": locked["length"],
+                "chunkSize": locked["chunk_size"],
+                "uploadDate": _now(),
+                "filename": locked["filename"],
+                "metadata": {"upload_id": locked["_id"]},
+            })
+        else:
+            await _copy_to_storage(db, locked)
+    except BaseException:
+        await reopen(db, locked)
+        raise
+    return locked
+
+
+async def _copy_to_storage(db, session: Dict[str, Any]) -> None:
+    upload = file_storage(db).writer(session["filename"], session["file_id"], {"upload_id": session["_id"]})
+    with span("storage.upload", file_id=str(session["file_id"]), bytes=session["length"]):
+        try:
+            async for chunk in db[CHUNKS].find({"files_id": session["file_id"]}, {"data": 1}).sort("n", 1):
+                await upload.write(chunk["data"])
+            await upload.close()
+        except BaseException:
+            await upload.abort()
+            raise
+
+
+async def reopen(db, session: Dict[str, Any]) -> None:
+    """Undo `assemble` after a failure so the client can retry finalize."""
+    storage = file_storage(db)
+    if storage.chunks_in_place:
+        await db[FILES].delete_one({"_id": session["file_id"]})
+    elif await storage.exists(session["file_id"]):
+        await storage.delete(session["file_id"])
+    await db[COLLECTION].update_one({"_id": session["_id"]}, {"$set": {"state": "open"}})
+
+
+async def close(db, session: Dict[str, Any]) -> None:
+    """Forget a finalized session (its chunks now belong to a GridFS file, or were copied into storage)."""
+    if not file_storage(db).chunks_in_place:
+        await db[CHUNKS].delete_many({"files_id": session["file_id"]})
+    await db[COLLECTION].delete_one({"_id": session["_id"]})
+
+
+async def discard(db, session: Dict[str, Any]) -> None:
+    """Delete an unfinished session and its chunks."""
+    if await db[FILES].find_one({"_id": session["file_id"]}, {"_id": 1}) is None:
+        await db[CHUNKS].delete_many({"files_id": session["file_id"]})
+    await db[COLLECTION].delete_one({"_id": session["_id"]})
+
+
+async def sweep(db) -> int:
+    """Discard expired sessions; returns how many were removed."""
+    removed = 0
+    async for session in db[COLLECTION].find({"expires_at": {"$lt": _now()}}, {"file_id": 1}):
+        await discard(db, session)
+        removed += 1
+    if removed:
+        print(f"🧹 Removed {removed} expired upload session(s)")
+    return removed
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    await app.state.db[COLLECTION].create_index("expires_at")
+
+
+@register_background
+async def sweep_periodically(app) -> None:
+    while True:
+        try:
+            await sweep(app.state.db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Upload session sweep failed: {e}")
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL_S)
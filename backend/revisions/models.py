@@ -0,0 +1,13 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class RevisionOut(BaseModel):
+    revision: int = Field(..., description="1-based revision number; the highest is the current file")
+    kind: str = Field(..., description="'snapshot' (full copy in file storage) or 'delta' (line edits against the previous revision)")
+    snapshot_revision: int = Field(..., description="Snapshot this revision is rebuilt from")
+    filename: Optional[str] = None
+    size: int = Field(..., description="Size of the full text in bytes")
+    lines: int = Field(..., description="Number of lines in the full text")
+    created_at: str
+    created_by: Optional[str] = None
@@ -0,0 +1,81 @@
+import asyncio
+import difflib
+import io
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+
+from books.repository import TranslationRepository
+
+from .models import RevisionOut
+from .store import COLLECTION, reconstruct, latest_revision, read_file, revision_cache
+
+router = APIRouter()
+
+
+async def _revision_text(db, t: dict, revision: int) -> bytes:
+    """Text of a revision; the latest one is served from the translation's current file."""
+    last = await latest_revision(db, t["_id"])
+    if not last:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    if revision == last["revision"] and t.get("file_id"):
+        cached = revision_cache.get((t["_id"], revision))
+        if cached is not None:
+            return cached
+        try:
+            text = await read_file(db, t["file_id"])
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to read file from storage")
+        revision_cache.put((t["_id"], revision), text)
+        return text
+    return await reconstruct(db, t["_id"], revision)
+
+
+@router.get("/translations/{translation_id}/revisions", response_model=List[RevisionOut])
+async def list_revisions(translation_id: str, request: Request):
+    """List the revision history of a translation, newest first."""
+    db = request.app.state.db
+    t = await TranslationRepository(db).get(translation_id)
+    items = []
+    async for doc in db[COLLECTION].find({"translation_id": t["_id"]}, {"delta": 0}).sort("revision", -1):
+        items.append(RevisionOut(**doc))
+    return items
+
+
+@router.get("/translations/{translation_id}/revisions/{revision}")
+async def view_revision(translation_id: str, revision: int, request: Request):
+    """Return the full text of one revision as text/plain."""
+    db = request.app.state.db
+    t = await TranslationRepository(db).get(translation_id)
+    text = await _revision_text(db, t, revision)
+    return StreamingResponse(io.BytesIO(text), media_type="text/plain")
+
+
+def _unified_diff(old: bytes, new: bytes, base: int, revision: int) -> bytes:
+    diff = difflib.unified_diff(
+        old.decode("utf-8", errors="replace").splitlines(keepends=True),
+        new.decode("utf-8", errors="replace").splitlines(keepends=True),
+        fromfile=f"revision {base}",
+        tofile=f"revision {revision}",
+    )
+    return "".join(diff).encode("utf-8")
+
+
+@router.get("/translations/{translation_id}/revisions/{revision}/diff")
+async def diff_revision(
+    translation_id: str,
+    revision: int,
+    request: Request,
+    against: Optional[int] = Query(None, description="Revision to compare with (default: the previous one)"),
+):
+    """Unified diff between two revisions as text/plain."""
+    db = request.app.state.db
+    t = await TranslationRepository(db).get(translation_id)
+    base = against if against is not None else revision - 1
+    if base < 1:
+        raise HTTPException(status_code=400, detail="Revision 1 has no previous revision")
+    old = await _revision_text(db, t, base)
+    new = await _revision_text(db, t, revision)
+    # difflib is CPU-bound on long texts; keep it off the event loop
+    diff = await asyncio.get_running_loop().run_in_executor(None, _unified_diff, old, new, base, revision)
+    return StreamingResponse(io.BytesIO(diff), media_type="text/plain")
@@ -0,0 +1,260 @@
+"""Translation revision history stored as line-level deltas.
+
+Every translation file replacement appends a revision to `translation_revisions`:
+- a *snapshot* keeps a stored file with the full text (`file_id`);
+- a *delta* stores only the line edits against the previous revision.
+
+A snapshot is written for revision 1, at least every `REVISION_SNAPSHOT_EVERY`
+revisions, and whenever a delta would not be meaningfully smaller than the text,
+so reconstructing any revision applies fewer than `REVISION_SNAPSHOT_EVERY`
+deltas. Each revision records the snapshot it chains from (`snapshot_revision`).
+
+Deltas work on raw byte lines, so reconstruction is exact whatever the file's
+encoding. The translation document's `file_id` always points at the latest
+revision, so regular reads never touch this module.
+
+Delta format, applied in order against the previous revision's lines:
+  ["=", n]      copy n lines
+  ["-", n]      skip n lines
+  ["+", lines]  insert lines (list of bytes)
+"""
+
+import asyncio
+import difflib
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from core.cache import ByteLRU
+from core.lifecycle import register_warmup
+from core.storage import file_storage
+from core.tracing import span
+
+REVISION_SNAPSHOT_EVERY = int(os.environ.get("REVISION_SNAPSHOT_EVERY", "10"))
+# Store a snapshot instead when the delta is larger than this share of the new text
+REVISION_MAX_DELTA_RATIO = float(os.environ.get("REVISION_MAX_DELTA_RATIO", "0.5"))
+REVISION_CACHE_BYTES = int(os.environ.get("REVISION_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+COLLECTION = "translation_revisions"
+
+# (translation_id, revision) -> full text
+revision_cache = ByteLRU(REVISION_CACHE_BYTES)
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def make_delta(old: bytes, new: bytes) -> List[list]:
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops: List[list] = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if tag in ("replace", "delete"):
+            ops.append(["-", i2 - i1])
+        if tag in ("replace", "insert"):
+            ops.append(["+", b[j1:j2]])
+    return ops
+
+
+def apply_delta(old: bytes, delta: List[list]) -> bytes:
+    lines = old.splitlines(keepends=True)
+    out: List[bytes] = []
+    pos = 0
+    for op, arg in delta:
+        if op == "=":
+            out.extend(lines[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            pos += arg
+        else:
+            out.extend(arg)
+    return b"".join(out)
+
+
+def delta_size(delta: List[list]) -> int:
+    """Approximate stored size of a delta in bytes."""
+    return sum(16 + (sum(len(line) for line in arg) if op == "+" else 0) for op, arg in delta)
+
+
+def _line_count(data: bytes) -> int:
+    return len(data.splitlines())
+
+
+async def read_file(db, file_id) -> bytes:
+    with span("storage.download", file_id=str(file_id)):
+        stream = await file_storage(db).open(file_id)
+        try:
+            return await stream.read()
+        finally:
+            stream.close()
+
+
+async def latest_revision(db, translation_id: ObjectId) -> Optional[Dict[str, Any]]:
+    return await db[COLLECTION].find_one(
+        {"translation_id": translation_id}, {"delta": 0}, sort=[("revision", -1)]
+    )
+
+
+async def ensure_history(db, translation: Dict[str, Any], current: bytes) -> Dict[str, Any]:
+    """Latest revision of a translation, creating revision 1 from its current content if needed."""
+    last = await latest_revision(db, translation["_id"])
+    if last:
+        return last
+    file_id = translation.get("file_id")
+    if not file_id:
+        # Legacy inline text: give the first snapshot a file of its own
+        with span("storage.upload", filename=translation.get("filename"), bytes=len(current)):
+            file_id = await file_storage(db).put(translation.get("filename") or "translation.txt", current)
+    doc = {
+        "translation_id": translation["_id"],
+        "revision": 1,
+        "kind": "snapshot",
+        "snapshot_revision": 1,
+        "file_id": ObjectId(str(file_id)),
+        "filename": translation.get("filename"),
+        "size": len(current),
+        "lines": _line_count(current),
+        "created_at": _now_iso(),
+        "created_by": None,
+    }
+    try:
+        await db[COLLECTION].insert_one(doc)
+    except DuplicateKeyError:
+        # A concurrent replacement created it first
+        if not translation.get("file_id"):
+            await file_storage(db).delete(file_id)
+        return await latest_revision(db, translation["_id"])
+    return doc
+
+
+def initial_revision(translation_id: ObjectId, file_id, filename: str, size: int, lines: int,
+                     created_by: Optional[str]) -> Dict[str, Any]:
+    """Revision 1 document for a freshly uploaded translation (its file is the snapshot)."""
+    return {
+        "translation_id": translation_id,
+        "revision": 1,
+        "kind": "snapshot",
+        "snapshot_revision": 1,
+        "file_id": file_id,
+        "filename": filename,
+        "size": size,
+        "lines": lines,
+        "created_at": _now_iso(),
+        "created_by": created_by,
+    }
+
+
+async def record_initial_many(db, docs: List[Dict[str, Any]]) -> None:
+    """Insert several `initial_revision` documents in one round trip."""
+    if docs:
+        await db[COLLECTION].insert_many(docs)
+
+
+async def record_revision(db, translation: Dict[str, Any], old: bytes, new: bytes, new_file_id,
+                          filename: str, created_by: Optional[str]) -> Tuple[Dict[str, Any], bool]:
+    """Append a revision for `new`, which has already been uploaded as `new_file_id`.
+
+    Returns the new revision doc and whether the translation's previous file must
+    be kept (it is a snapshot); otherwise the caller may delete it, since that
+    revision can be rebuilt from its snapshot and deltas.
+    """
+    last = await ensure_history(db, translation, old)
+    revision = last["revision"] + 1
+    doc: Dict[str, Any] = {
+        "translation_id": translation["_id"],
+        "revision": revision,
+        "filename": filename,
+        "size": len(new),
+        "lines": _line_count(new),
+        "created_at": _now_iso(),
+        "created_by": created_by,
+    }
+
+    delta = None
+    if revision - last["snapshot_revision"] < REVISION_SNAPSHOT_EVERY:
+        # difflib is CPU-bound on long texts; keep it off the event loop
+        delta = await asyncio.get_running_loop().run_in_executor(None, make_delta, old, new)
+        if delta_size(delta) > len(new) * REVISION_MAX_DELTA_RATIO:
+            delta = None
+
+    if delta is None:
+        doc.update({"kind": "snapshot", "snapshot_revision": revision, "file_id": new_file_id})
+    else:
+        doc.update({"kind": "delta", "snapshot_revision": last["snapshot_revision"], "delta": delta})
+
+    try:
+        await db[COLLECTION].insert_one(doc)
+    except DuplicateKeyError:
+        # Another replacement took this revision number while the delta was computed
+        raise HTTPException(status_code=409, detail="Translation was replaced concurrently; retry the upload")
+    revision_cache.put((translation["_id"], revision), new)
+    keep_old = last.get("file_id") is not None and str(last["file_id"]) == str(translation.get("file_id"))
+    return doc, keep_old
+
+
+async def reconstruct(db, translation_id: ObjectId, revision: int) -> bytes:
+    """Full text of one revision: nearest cached text or snapshot, then deltas forward."""
+    cached = revision_cache.get((translation_id, revision))
+    if cached is not None:
+        return cached
+
+    target = await db[COLLECTION].find_one(
+        {"translation_id": translation_id, "revision": revision}, {"delta": 0}
+    )
+    if not target:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    chain = await db[COLLECTION].find(
+        {"translation_id": translation_id, "revision": {"$gte": target["snapshot_revision"], "$lte": revision}}
+    ).sort("revision", 1).to_list(None)
+
+    start = 0
+    text = None
+    for i in range(len(chain) - 1, -1, -1):
+        hit = revision_cache.get((translation_id, chain[i]["revision"]))
+        if hit is not None:
+            start, text = i + 1, hit
+            break
+    if text is None:
+        try:
+            text = await read_file(db, chain[0]["file_id"])
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to read revision snapshot from storage")
+        start = 1
+
+    for doc in chain[start:]:
+        text = apply_delta(text, doc["delta"])
+    revision_cache.put((translation_id, revision), text)
+    return text
+
+
+async def delete_history(db, translation_ids: List[ObjectId], keep_file_ids: List[Any]) -> None:
+    """Remove revisions and snapshot files of these translations (except `keep_file_ids`)."""
+    if not translation_ids:
+        return
+    keep = {str(f) for f in keep_file_ids if f}
+    storage = file_storage(db)
+    async for doc in db[COLLECTION].find(
+        {"translation_id": {"$in": translation_ids}, "kind": "snapshot"}, {"file_id": 1}
+    ):
+        if doc.get("file_id") and str(doc["file_id"]) not in keep:
+            try:
+                await storage.delete(doc["file_id"])
+            except Exception:
+                pass
+    await db[COLLECTION].delete_many({"translation_id": {"$in": translation_ids}})
+    dropped = set(translation_ids)
+    revision_cache.pop_where(lambda key: key[0] in dropped)
+
+
+@register_warmup
+async def ensure_revision_indexes(app) -> None:
+    await app.state.db[COLLECTION].create_index([("translation_id", 1), ("revision", 1)], unique=True)
@@ -0,0 +1,129 @@
+"""
+Compute `source_stats` / `text_stats` (see books/ingest.py) for files stored before uploads were analyzed.
+
+- books:        source file (`source_file_id`) -> `source_stats`, checked against `original_language`
+- translations: file (`file_id`)               -> `text_stats`, checked against `language`
+
+Files are only read: one still in a legacy encoding stays as it was uploaded,
+and its stats name that encoding. Translation files are not rewritten because
+their revision history (revisions/store.py) is built on the stored bytes.
+Documents that already have stats are skipped unless `--force` is given, so an
+interrupted run can simply be started again.
+
+Usage (local):
+  cd backend && python scripts/analyze_texts.py [--concurrency 8] [--force] [--dry-run]
+
+Usage (Docker):
+  docker compose exec backend python scripts/analyze_texts.py
+
+Environment variables:
+  MONGO_URI (default: mongodb://localhost:27017)
+  MONGO_DB  (default: litmt)
+  STORAGE_BACKEND, STORAGE_LOCAL_ROOT (where the files are, as for the app)
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict, Optional
+
+import motor.motor_asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from books.ingest import TextIngest
+from core.storage import FileStorage, file_storage
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.environ.get("MONGO_DB", "litmt")
+
+# collection -> (file id field, stats field, declared language field)
+TARGETS = {
+    "books": ("source_file_id", "source_stats", "original_language"),
+    "translations": ("file_id", "text_stats", "language"),
+}
+
+
+async def analyze_file(storage: FileStorage, file_id: Any, language: Optional[str]) -> Dict[str, Any]:
+    text = TextIngest(language)
+    stream = await storage.open(file_id)
+    try:
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            text.feed(chunk)
+        text.finish()
+        stats = text.stats()
+        # Size of the file as stored, which is not normalized
+        stats["size"] = stream.length
+    finally:
+        stream.close()
+    return stats
+
+
+async def analyze_collection(db, collection: str, concurrency: int, force: bool, dry_run: bool) -> Dict[str, int]:
+    file_field, stats_field, language_field = TARGETS[collection]
+    storage = file_storage(db)
+    counts = {"analyzed": 0, "mismatches": 0, "failed": 0}
+    sem = asyncio.Semaphore(concurrency)
+
+    query: Dict[str, Any] = {file_field: {"$ne": None}}
+    if not force:
+        query[stats_field] = None
+
+    async def one(doc):
+        async with sem:
+            try:
+                stats = await analyze_file(storage, doc[file_field], doc.get(language_field))
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"  ⚠️  {collection} {doc['_id']}: {e}")
+                return
+            counts["analyzed"] += 1
+            if stats["language_mismatch"]:
+                counts["mismatches"] += 1
+                print(f"  ⚠️  {collection} {doc['_id']}: declared {doc.get(language_field)!r}, "
+                      f"looks like {stats['language']}")
+            if not dry_run:
+                # Guard on the file id so a file replaced meanwhile keeps the stats of its own upload
+                await db[collection].update_one(
+                    {"_id": doc["_id"], file_field: doc[file_field]}, {"$set": {stats_field: stats}}
+                )
+
+    batch = []
+    async for doc in db[collection].find(query, {file_field: 1, language_field: 1}).sort("_id", 1):
+        batch.append(one(doc))
+        if len(batch) >= concurrency * 16:
+            await asyncio.gather(*batch)
+            batch = []
+            print(f"  ✓ {collection}: {counts['analyzed']} analyzed, {counts['failed']} failed")
+    await asyncio.gather(*batch)
+    return counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compute text statistics for stored source and translation files")
+    parser.add_argument("--concurrency", type=int, default=8, help="files read at once")
+    parser.add_argument("--force", action="store_true", help="re-analyze documents that already have stats")
+    parser.add_argument("--dry-run", action="store_true", help="analyze and report without saving")
+    args = parser.parse_args()
+
+    print(f"🔗 Connecting to Mongo at {MONGO_URI} / db={MONGO_DB}")
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+    db = client[MONGO_DB]
+
+    failed = 0
+    for collection in TARGETS:
+        counts = await analyze_collection(db, collection, args.concurrency, args.force, args.dry_run)
+        failed += counts["failed"]
+        print(f"✅ {collection}: {counts['analyzed']} analyzed ({counts['mismatches']} language mismatches), "
+              f"{counts['failed']} failed")
+    client.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
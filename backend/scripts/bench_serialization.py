@@ -0,0 +1,122 @@
+"""
+Microbenchmark: catalog page serialization, Pydantic response_model path vs
+the direct dict + orjson path used by books/routes.py.
+
+No database needed; documents are synthesized in memory.
+
+Usage:
+  cd backend && python scripts/bench_serialization.py [--books 500] [--translations 3] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from books.models import BookOut, TranslatedBookOut
+from books.serializers import book_to_dict, translation_to_dict
+
+
+def make_docs(n_books: int, n_translations: int):
+    books, translations = [], []
+    for i in range(n_books):
+        bid = ObjectId()
+        books.append({
+            "_id": bid,
+            "title": f"Book {i}",
+            "author": f"Author {i % 37}",
+            "year": 1800 + i % 200,
+            "description": "A classic novel. " * 10,
+            "original_language": "Chinese",
+            "source": None,
+            "source_filename": f"book_{i}.txt",
+            "source_file_id": ObjectId(),
+        })
+        for j in range(n_translations):
+            translations.append({
+                "_id": ObjectId(),
+                "book_id": bid,
+                "language": ["English", "French", "Spanish", "German"][j % 4],
+                "filename": f"book_{i}_{j}.txt",
+                "text": None,
+                "file_id": ObjectId(),
+                "translated_by": "gpt-4o",
+            })
+    return books, translations
+
+
+def pydantic_path(books, translations, field) -> bytes:
+    """What the handlers used to do: build models by hand, then let FastAPI validate + serialize."""
+    by_book = {}
+    for tdoc in translations:
+        t_out = {
+            'id': str(tdoc.get('_id')),
+            'book_id': str(tdoc.get('book_id')) if tdoc.get('book_id') is not None else '',
+            'language': tdoc.get('language') or '',
+            'filename': tdoc.get('filename') or '',
+            'text': tdoc.get('text'),
+            'file_id': (str(tdoc.get('file_id')) if tdoc.get('file_id') is not None else None),
+            'translated_by': tdoc.get('translated_by'),
+        }
+        by_book.setdefault(tdoc['book_id'], []).append(TranslatedBookOut(**t_out))
+    items: List[BookOut] = []
+    for doc in books:
+        doc = dict(doc)
+        bid = doc.pop('_id')
+        doc['id'] = str(bid)
+        doc['source_file_id'] = str(doc['source_file_id'])
+        items.append(BookOut(**doc, translated_books=by_book.get(bid, [])))
+    content = asyncio.run(serialize_response(field=field, response_content=items))
+    return JSONResponse(content).body
+
+
+def fast_path(books, translations) -> bytes:
+    by_book = {}
+    for tdoc in translations:
+        by_book.setdefault(tdoc['book_id'], []).append(translation_to_dict(tdoc))
+    items = [book_to_dict(doc, by_book.get(doc['_id'], [])) for doc in books]
+    return ORJSONResponse(items).body
+
+
+def bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=500)
+    parser.add_argument("--translations", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    books, translations = make_docs(args.books, args.translations)
+    field = create_response_field(name="Response_list_books", type_=List[BookOut], mode="serialization")
+
+    # Both paths must produce the same JSON document
+    assert json.loads(pydantic_path(books, translations, field)) == json.loads(fast_path(books, translations))
+
+    slow = bench(lambda: pydantic_path(books, translations, field), args.repeat)
+    fast = bench(lambda: fast_path(books, translations), args.repeat)
+    print(f"📚 {args.books} books x {args.translations} translations (best of {args.repeat})")
+    print(f"   pydantic response_model: {slow:8.2f} ms")
+    print(f"   dict + orjson:           {fast:8.2f} ms")
+    print(f"   speedup:                 {slow / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
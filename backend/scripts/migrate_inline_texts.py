@@ -0,0 +1,185 @@
+"""
+Move legacy inline texts into file storage (GridFS or local, see core/storage.py).
+
+- books:        `source` -> stored file, sets `source_file_id` (and `source_filename` if missing)
+- translations: `text`   -> stored file, sets `file_id` (and `filename` if missing)
+
+The inline field is `$unset` in the same `bulk_write` batch that sets the file id,
+so each document is always readable: the read endpoints prefer the stored file
+and fall back to the inline field while it is still there. A document that got
+a file from an admin upload meanwhile is left alone and its copy is deleted.
+
+Resumable: progress is checkpointed per collection in `migrations` after every
+batch, and files uploaded by an interrupted batch are found again through their
+file metadata and reused instead of being uploaded twice.
+
+Usage (local):
+  cd backend && python scripts/migrate_inline_texts.py [--batch-size 200] [--concurrency 8] [--restart] [--dry-run]
+
+Usage (Docker):
+  docker compose exec backend python scripts/migrate_inline_texts.py
+
+Environment variables:
+  MONGO_URI (default: mongodb://localhost:27017)
+  MONGO_DB  (default: litmt)
+  STORAGE_BACKEND, STORAGE_LOCAL_ROOT (where the files go, as for the app)
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List
+
+import motor.motor_asyncio
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.storage import FileStorage, file_storage
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.environ.get("MONGO_DB", "litmt")
+
+MIGRATION = "inline_texts"
+
+# collection -> (inline field, file id field, filename field)
+TARGETS = {
+    "books": ("source", "source_file_id", "source_filename"),
+    "translations": ("text", "file_id", "filename"),
+}
+
+
+def default_filename(collection: str, doc: Dict[str, Any]) -> str:
+    if collection == "books":
+        return f"{doc.get('title') or doc['_id']}.txt"
+    return f"{doc.get('language') or 'translation'}-{doc['_id']}.txt"
+
+
+async def existing_uploads(db, storage: FileStorage, collection: str, ids: List[Any]) -> Dict[Any, Any]:
+    """Files already uploaded for these documents by an interrupted run."""
+    found = {}
+    cursor = db[storage.files_collection].find(
+        {"metadata.migration": MIGRATION, "metadata.collection": collection, "metadata.doc_id": {"$in": ids}},
+        {"_id": 1, "metadata.doc_id": 1},
+    )
+    async for f in cursor:
+        found[f["metadata"]["doc_id"]] = f["_id"]
+    return found
+
+
+async def drop_unused_uploads(db, storage: FileStorage, collection: str, file_field: str,
+                              batch: List[Dict[str, Any]], file_ids: List[Any]) -> None:
+    """Delete the files uploaded for documents whose guard did not match (a file was attached meanwhile)."""
+    attached = {}
+    async for doc in db[collection].find({"_id": {"$in": [d["_id"] for d in batch]}}, {file_field: 1}):
+        attached[doc["_id"]] = doc.get(file_field)
+    for doc, file_id in zip(batch, file_ids):
+        if attached.get(doc["_id"]) != file_id:
+            try:
+                await storage.delete(file_id)
+            except Exception as e:
+                print(f"  ⚠️  {collection} {doc['_id']}: failed to delete unused upload {file_id}: {e}")
+
+
+async def migrate_collection(db, collection: str, batch_size: int, concurrency: int, restart: bool, dry_run: bool) -> int:
+    inline_field, file_field, filename_field = TARGETS[collection]
+    storage = file_storage(db)
+    checkpoint_id = f"{MIGRATION}:{collection}"
+
+    checkpoint = None if restart else await db.migrations.find_one({"_id": checkpoint_id})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    migrated = checkpoint.get("migrated", 0) if checkpoint else 0
+    if last_id is not None:
+        print(f"↻ {collection}: resuming after {last_id} ({migrated} already migrated)")
+
+    query: Dict[str, Any] = {
+        inline_field: {"$type": "string", "$ne": ""},
+        file_field: None,  # missing or null
+    }
+    sem = asyncio.Semaphore(concurrency)
+
+    while True:
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(
+            query, {inline_field: 1, filename_field: 1, "title": 1, "language": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        if dry_run:
+            size = sum(len(d[inline_field].encode("utf-8")) for d in batch)
+            print(f"  {collection}: would migrate {len(batch)} documents ({size} bytes)")
+            last_id = batch[-1]["_id"]
+            continue
+
+        reuse = await existing_uploads(db, storage, collection, [d["_id"] for d in batch])
+
+        async def upload(doc):
+            if doc["_id"] in reuse:
+                return reuse[doc["_id"]]
+            filename = doc.get(filename_field) or default_filename(collection, doc)
+            async with sem:
+                return await storage.put(
+                    filename,
+                    doc[inline_field].encode("utf-8"),
+                    metadata={"migration": MIGRATION, "collection": collection, "doc_id": doc["_id"]},
+                )
+
+        file_ids = await asyncio.gather(*(upload(d) for d in batch))
+
+        ops = []
+        for doc, file_id in zip(batch, file_ids):
+            updates = {file_field: file_id}
+            if not doc.get(filename_field):
+                updates[filename_field] = default_filename(collection, doc)
+            # Guard on the file field so a concurrent admin upload is never overwritten
+            ops.append(UpdateOne(
+                {"_id": doc["_id"], file_field: None},
+                {"$set": updates, "$unset": {inline_field: ""}},
+            ))
+        result = await db[collection].bulk_write(ops, ordered=False)
+        if result.matched_count < len(ops):
+            await drop_unused_uploads(db, storage, collection, file_field, batch, file_ids)
+
+        last_id = batch[-1]["_id"]
+        migrated += result.modified_count
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "migrated": migrated, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        print(f"  ✓ {collection}: {result.modified_count}/{len(batch)} migrated (total {migrated}, last {last_id})")
+
+    if not dry_run:
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"completed_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    return migrated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move inline source/text fields into file storage")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel uploads per batch")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be migrated")
+    args = parser.parse_args()
+
+    print(f"🔗 Connecting to Mongo at {MONGO_URI} / db={MONGO_DB}")
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+    db = client[MONGO_DB]
+
+    for collection in TARGETS:
+        total = await migrate_collection(db, collection, args.batch_size, args.concurrency, args.restart, args.dry_run)
+        print(f"✅ {collection}: {total} documents migrated")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
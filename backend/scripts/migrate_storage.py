@@ -0,0 +1,128 @@
+"""
+Copy stored files from one storage backend to another (see core/storage.py).
+
+Every file keeps its id, filename and metadata, so books, translations and
+revisions need no update: once the copy is complete, switch STORAGE_BACKEND
+and restart. Files uploaded between the copy and the switch still live in the
+old backend only, so run the script once more after switching; files the
+target already has are skipped, which also makes an interrupted run resumable.
+
+Each copy is checked against the source length before it counts. With
+`--delete-source`, the source file is removed once its copy is verified.
+
+Usage (local):
+  cd backend && python scripts/migrate_storage.py --from gridfs --to local [--concurrency 8] [--delete-source] [--dry-run]
+
+Usage (Docker):
+  docker compose exec backend python scripts/migrate_storage.py --from gridfs --to local
+
+Environment variables:
+  MONGO_URI (default: mongodb://localhost:27017)
+  MONGO_DB  (default: litmt)
+  STORAGE_LOCAL_ROOT (directory of the local backend)
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict
+
+import motor.motor_asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.storage import BACKENDS, FileStorage, file_storage
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.environ.get("MONGO_DB", "litmt")
+
+
+async def copy_file(source: FileStorage, target: FileStorage, doc: Dict[str, Any]) -> int:
+    """Copy one file under the same id; returns its size."""
+    stream = await source.open(doc["_id"])
+    upload = target.writer(doc.get("filename") or str(doc["_id"]), doc["_id"], doc.get("metadata"))
+    size = 0
+    try:
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            await upload.write(chunk)
+            size += len(chunk)
+        if size != doc["length"]:
+            raise RuntimeError(f"read {size} bytes, expected {doc['length']}")
+        await upload.close()
+    except BaseException:
+        await upload.abort()
+        raise
+    finally:
+        stream.close()
+    return size
+
+
+async def migrate(db, source: FileStorage, target: FileStorage, concurrency: int, delete_source: bool,
+                  dry_run: bool) -> Dict[str, int]:
+    counts = {"copied": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(doc):
+        async with sem:
+            if await target.exists(doc["_id"]):
+                counts["skipped"] += 1
+            elif dry_run:
+                counts["copied"] += 1
+                counts["bytes"] += doc["length"]
+                return
+            else:
+                try:
+                    counts["bytes"] += await copy_file(source, target, doc)
+                    counts["copied"] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    print(f"  ⚠️  {doc['_id']}: {e}")
+                    return
+            if delete_source and not dry_run:
+                await source.delete(doc["_id"])
+
+    batch = []
+    cursor = db[source.files_collection].find({}, {"filename": 1, "length": 1, "metadata": 1}).sort("_id", 1)
+    async for doc in cursor:
+        batch.append(one(doc))
+        if len(batch) >= concurrency * 16:
+            await asyncio.gather(*batch)
+            batch = []
+            print(f"  ✓ {counts['copied']} copied, {counts['skipped']} already there, {counts['failed']} failed")
+    await asyncio.gather(*batch)
+    return counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Copy stored files between storage backends")
+    parser.add_argument("--from", dest="source", choices=BACKENDS, required=True)
+    parser.add_argument("--to", dest="target", choices=BACKENDS, required=True)
+    parser.add_argument("--concurrency", type=int, default=8, help="files copied at once")
+    parser.add_argument("--delete-source", action="store_true", help="delete each source file once its copy is verified")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be copied")
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("--from and --to must differ")
+
+    print(f"🔗 Connecting to Mongo at {MONGO_URI} / db={MONGO_DB}")
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+    db = client[MONGO_DB]
+
+    counts = await migrate(
+        db, file_storage(db, args.source), file_storage(db, args.target),
+        args.concurrency, args.delete_source, args.dry_run,
+    )
+    verb = "would copy" if args.dry_run else "copied"
+    print(f"✅ {args.source} → {args.target}: {verb} {counts['copied']} file(s) ({counts['bytes']} bytes), "
+          f"{counts['skipped']} already there, {counts['failed']} failed")
+    client.close()
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,249 @@
+"""Hashed TF-IDF vectors and the in-memory index behind "more like this".
+
+A book is a sparse vector over DIM hashed features: the words of its title,
+description and the opening of its source text, plus its author and original
+language as one feature each. Feature weights are the sublinear term frequency
+times the inverse document frequency, and books are compared by cosine.
+
+The index is a compiled `Segment` plus the books changed since it was compiled:
+
+- A segment is stored inverted (CSC): for each feature, the rows containing it
+  with their term frequencies and normalized weights. A query reads only the
+  postings of its most informative features (at most SIMILAR_QUERY_TERMS, and
+  none present in more than SIMILAR_MAX_DF of the books), so scoring 100k books
+  is one `bincount` over those postings.
+- Books added, changed or removed since then sit in `pending`. They are scored
+  directly, and their old segment rows are masked out.
+
+`Segment.merged` folds `pending` into a new segment and recomputes the IDF.
+It is CPU-bound, so similar/store.py runs it in a thread and then `install`s the result.
+"""
+
+import io
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+DIM_BITS = 20
+DIM = 1 << DIM_BITS
+
+SIMILAR_MAX_TERMS = int(os.environ.get("SIMILAR_MAX_TERMS", "128"))
+SIMILAR_QUERY_TERMS = int(os.environ.get("SIMILAR_QUERY_TERMS", "64"))
+SIMILAR_MAX_DF = float(os.environ.get("SIMILAR_MAX_DF", "0.5"))
+# Below this many books every feature is cheap to score, and the cutoff would drop real overlap
+DF_CUTOFF_MIN_BOOKS = 1000
+
+FIELD_WEIGHTS = {"title": 2.0, "description": 1.0}
+SOURCE_WEIGHT = 1.0
+AUTHOR_WEIGHT = 3.0
+LANGUAGE_WEIGHT = 2.0
+
+_TOKEN = re.compile(r"\w\w+")
+
+# Feature ids and term frequencies, sorted by feature id
+Vector = Tuple[np.ndarray, np.ndarray]
+
+
+def _feature(token: str) -> int:
+    # crc32 rather than hash(): feature ids must agree across workers and restarts
+    return zlib.crc32(token.encode("utf-8")) & (DIM - 1)
+
+
+def _sublinear(tf: np.ndarray) -> np.ndarray:
+    return (1.0 + np.log(np.maximum(tf, 1.0))).astype(np.float32)
+
+
+def term_counts(book: Dict[str, Any], source_text: str = "") -> Dict[int, float]:
+    """Weighted counts of a book's hashed features."""
+    counts: Dict[int, float] = {}
+
+    def add(tokens: Counter, weight: float) -> None:
+        for token, n in tokens.items():
+            f = _feature(token)
+            counts[f] = counts.get(f, 0.0) + n * weight
+
+    for field, weight in FIELD_WEIGHTS.items():
+        add(Counter(_TOKEN.findall((book.get(field) or "").lower())), weight)
+    add(Counter(_TOKEN.findall(source_text.lower())), SOURCE_WEIGHT)
+    author = " ".join((book.get("author") or "").lower().split())
+    if author:
+        add(Counter({f"author:{author}": 1}), AUTHOR_WEIGHT)
+    language = (book.get("original_language") or "").strip().lower()
+    if language:
+        add(Counter({f"lang:{language}": 1}), LANGUAGE_WEIGHT)
+    return counts
+
+
+def to_vector(counts: Dict[int, float], idf: Optional[np.ndarray] = None,
+              max_terms: int = SIMILAR_MAX_TERMS) -> Vector:
+    """Sparse vector of `counts`, keeping the `max_terms` features with the highest TF-IDF."""
+    terms = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    if len(terms) > max_terms:
+        weights = _sublinear(tf) * (idf[terms] if idf is not None else 1.0)
+        keep = np.argpartition(-weights, max_terms)[:max_terms]
+        terms, tf = terms[keep], tf[keep]
+    order = np.argsort(terms)
+    return terms[order], tf[order]
+
+
+class Segment:
+    """Immutable inverted matrix over `ids` (row r is book ids[r])."""
+
+    def __init__(self, ids: List[ObjectId], indptr: np.ndarray, rows: np.ndarray, tf: np.ndarray):
+        self.ids = ids
+        self.row_of = {book_id: r for r, book_id in enumerate(ids)}
+        self.indptr = indptr
+        self.rows = rows
+        self.tf = tf
+        n = len(ids)
+        self.df = np.diff(indptr).astype(np.int32)
+        self.idf = (np.log((1.0 + n) / (1.0 + self.df)) + 1.0).astype(np.float32)
+        weights = _sublinear(tf) * self.idf[self._features()]
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=n))
+        norms[norms == 0] = 1.0
+        self.weights = (weights / norms[rows]).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _features(self) -> np.ndarray:
+        """Feature id of every posting."""
+        return np.repeat(np.arange(DIM, dtype=np.int32), self.df)
+
+    @classmethod
+    def from_postings(cls, ids: List[ObjectId], features: np.ndarray, rows: np.ndarray, tf: np.ndarray) -> "Segment":
+        # Stable, so rows stay in ascending order within each feature
+        order = np.argsort(features, kind="stable")
+        indptr = np.zeros(DIM + 1, dtype=np.int64)
+        np.cumsum(np.bincount(features, minlength=DIM), out=indptr[1:])
+        return cls(ids, indptr, rows[order].astype(np.int32), tf[order].astype(np.float32))
+
+    @classmethod
+    def empty(cls) -> "Segment":
+        return cls.from_postings([], np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0, np.float32))
+
+    def merged(self, changes: Dict[ObjectId, Optional[Vector]]) -> "Segment":
+        """New segment with `changes` applied (None removes a book)."""
+        keep = np.ones(len(self.ids), dtype=bool)
+        for book_id in changes:
+            r = self.row_of.get(book_id)
+            if r is not None:
+                keep[r] = False
+        posting_kept = keep[self.rows]
+        new_row = np.cumsum(keep, dtype=np.int64) - 1
+        ids = [book_id for book_id, k in zip(self.ids, keep) if k]
+        features = [self._features()[posting_kept]]
+        rows = [new_row[self.rows[posting_kept]]]
+        tf = [self.tf[posting_kept]]
+        for book_id, vector in changes.items():
+            if vector is None:
+                continue
+            terms, counts = vector
+            features.append(terms)
+            rows.append(np.full(len(terms), len(ids), dtype=np.int64))
+            tf.append(counts)
+            ids.append(book_id)
+        return Segment.from_postings(ids, np.concatenate(features), np.concatenate(rows), np.concatenate(tf))
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez(
+            buf,
+            ids=np.frombuffer(b"".join(book_id.binary for book_id in self.ids), dtype=np.uint8),
+            # Postings per used feature instead of the DIM-long indptr
+            features=np.nonzero(self.df)[0].astype(np.int32),
+            counts=self.df[self.df > 0],
+            rows=self.rows,
+            tf=self.tf,
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Segment":
+        with np.load(io.BytesIO(data), allow_pickle=False) as z:
+            raw = z["ids"].tobytes()
+            ids = [ObjectId(raw[i:i + 12]) for i in range(0, len(raw), 12)]
+            df = np.zeros(DIM, dtype=np.int64)
+            df[z["features"]] = z["counts"]
+            indptr = np.zeros(DIM + 1, dtype=np.int64)
+            np.cumsum(df, out=indptr[1:])
+            return cls(ids, indptr, z["rows"], z["tf"])
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self.segment = Segment.empty()
+        self.pending: Dict[ObjectId, Optional[Vector]] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        replaced = sum(1 for book_id in self.pending if book_id in self.segment.row_of)
+        added = sum(1 for vector in self.pending.values() if vector is not None)
+        return len(self.segment) - replaced + added
+
+    def put(self, book_id: ObjectId, vector: Optional[Vector]) -> None:
+        """Add or replace a book's vector; None removes the book."""
+        self.pending[book_id] = vector
+
+    def install(self, segment: Segment, changes: Dict[ObjectId, Optional[Vector]]) -> None:
+        """Switch to `segment`, built by `Segment.merged(changes)` while queries kept using the old one."""
+        self.segment = segment
+        for book_id, vector in changes.items():
+            # Keep changes that arrived while compiling
+            if book_id in self.pending and self.pending[book_id] is vector:
+                del self.pending[book_id]
+
+    def similar(self, book_id: ObjectId, vector: Vector, k: int) -> List[Tuple[ObjectId, float]]:
+        """Up to `k` (book id, cosine) pairs most similar to `vector`, best first, excluding `book_id`."""
+        seg = self.segment
+        terms, tf = vector
+        qw = _sublinear(tf) * seg.idf[terms]
+        qnorm = float(np.sqrt(np.dot(qw, qw))) or 1.0
+
+        # The most informative query features; very common ones cost the most and say the least
+        df = seg.df[terms]
+        max_df = SIMILAR_MAX_DF * len(seg) if len(seg) >= DF_CUTOFF_MIN_BOOKS else len(seg)
+        usable = np.nonzero((df > 0) & (df <= max_df))[0]
+        if len(usable) > SIMILAR_QUERY_TERMS:
+            usable = usable[np.argpartition(-qw[usable], SIMILAR_QUERY_TERMS)[:SIMILAR_QUERY_TERMS]]
+        results: List[Tuple[ObjectId, float]] = []
+        if len(usable):
+            rows, contrib = [], []
+            for i in usable:
+                start, end = seg.indptr[terms[i]], seg.indptr[terms[i] + 1]
+                rows.append(seg.rows[start:end])
+                contrib.append(seg.weights[start:end] * qw[i])
+            scores = np.bincount(np.concatenate(rows), weights=np.concatenate(contrib), minlength=len(seg)) / qnorm
+            # Rows replaced or removed since compiling are scored from `pending` instead
+            masked = [seg.row_of[b] for b in list(self.pending) + [book_id] if b in seg.row_of]
+            scores[masked] = 0.0
+            top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+            results = [(seg.ids[r], float(scores[r])) for r in top if scores[r] > 0]
+
+        for other_id, other in list(self.pending.items()):
+            if other is None or other_id == book_id:
+                continue
+            _, qi, oi = np.intersect1d(terms, other[0], assume_unique=True, return_indices=True)
+            if not len(qi):
+                continue
+            ow = _sublinear(other[1]) * seg.idf[other[0]]
+            score = float(np.dot(qw[qi], ow[oi])) / (qnorm * (float(np.sqrt(np.dot(ow, ow))) or 1.0))
+            if score > 0:
+                results.append((other_id, score))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "books": len(self),
+            "compiled": len(self.segment),
+            "pending": len(self.pending),
+            "postings": int(len(self.segment.rows)),
+        }
@@ -0,0 +1,11 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class SimilarBookOut(BaseModel):
+    id: str
+    title: str
+    author: Optional[str] = None
+    year: Optional[int] = None
+    original_language: Optional[str] = None
+    score: float = Field(..., description="Cosine similarity of the books' TF-IDF vectors (0-1)")
@@ -0,0 +1,35 @@
+from typing import List
+from fastapi import APIRouter, Request, Query
+from fastapi.responses import ORJSONResponse
+
+from books.repository import BookRepository
+
+from .models import SimilarBookOut
+from . import store
+
+router = APIRouter()
+
+
+@router.get("/books/{book_id}/similar", response_model=List[SimilarBookOut])
+async def similar_books(book_id: str, request: Request, limit: int = Query(10, ge=1, le=50)):
+    """Books most like this one by description, author, language and the opening of the source text."""
+    db = request.app.state.db
+    books = BookRepository(db)
+    oid = (await books.get(book_id, {"_id": 1}))["_id"]
+    # A few extra in case this worker has not yet seen a deletion
+    ranked = await store.similar(db, oid, limit + 5)
+    projection = {"title": 1, "author": 1, "year": 1, "original_language": 1}
+    found = {b["_id"]: b async for b in db.books.find({"_id": {"$in": [i for i, _ in ranked]}}, projection)}
+    out = [
+        {
+            "id": str(i),
+            "title": found[i].get("title"),
+            "author": found[i].get("author"),
+            "year": found[i].get("year"),
+            "original_language": found[i].get("original_language"),
+            "score": round(score, 4),
+        }
+        for i, score in ranked
+        if i in found
+    ]
+    return ORJSONResponse(out[:limit])
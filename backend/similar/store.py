@@ -0,0 +1,275 @@
+"""Persistence and upkeep of the similar-books index (see similar/index.py).
+
+- `book_features` holds each book's pruned feature vector (packed int32 feature
+  ids and float32 term frequencies). The catalog write paths call
+  `book_changed` / `book_removed`. A removal leaves a tombstone so that other
+  workers see it.
+- Each worker keeps its own in-memory index. A background job polls
+  `book_features` for rows updated since its last look. Changes are compiled
+  into a new segment (in a thread) once SIMILAR_COMPILE_AFTER of them pile up,
+  or after SIMILAR_COMPILE_INTERVAL_S.
+- One worker at a time saves the compiled segment to GridFS as an .npz
+  snapshot. Workers start from the newest snapshot plus the rows updated after
+  it, instead of reading every row.
+- Books that have no vector yet (e.g. a catalog that predates this feature) are
+  indexed by one worker at startup.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import motor.motor_asyncio
+import numpy as np
+from bson import Binary, ObjectId
+from fastapi import HTTPException
+
+from core.lease import acquire_lease
+from core.lifecycle import register_background, register_warmup
+from core.storage import file_storage
+from core.tracing import span
+
+from .index import Segment, SimilarityIndex, Vector, term_counts, to_vector
+
+COLLECTION = "book_features"
+META = "similar_index"
+SNAPSHOT_BUCKET = "similar_index"
+SNAPSHOT_FILENAME = "index.npz"
+
+SIMILAR_SOURCE_BYTES = int(os.environ.get("SIMILAR_SOURCE_BYTES", str(64 * 1024)))
+SIMILAR_REFRESH_INTERVAL_S = float(os.environ.get("SIMILAR_REFRESH_INTERVAL_S", "5"))
+SIMILAR_COMPILE_AFTER = int(os.environ.get("SIMILAR_COMPILE_AFTER", "500"))
+SIMILAR_COMPILE_INTERVAL_S = float(os.environ.get("SIMILAR_COMPILE_INTERVAL_S", "60"))
+SIMILAR_SNAPSHOT_INTERVAL_S = float(os.environ.get("SIMILAR_SNAPSHOT_INTERVAL_S", "900"))
+
+# Rows are re-read this far back on each poll: workers' clocks and writes are not ordered
+POLL_OVERLAP = timedelta(seconds=30)
+TOMBSTONE_TTL = timedelta(days=1)
+BOOK_FIELDS = {"title": 1, "description": 1, "author": 1, "original_language": 1, "source": 1, "source_file_id": 1}
+
+index = SimilarityIndex()
+# Newest `updated_at` seen in `book_features`, and the versions applied within the poll overlap
+_seen: Dict[str, Any] = {"at": None, "recent": {}}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _encode(vector: Vector) -> Dict[str, Any]:
+    terms, tf = vector
+    return {"terms": Binary(terms.astype(np.int32).tobytes()), "tf": Binary(tf.astype(np.float32).tobytes())}
+
+
+def _decode(doc: Dict[str, Any]) -> Optional[Vector]:
+    if doc.get("deleted"):
+        return None
+    return np.frombuffer(doc["terms"], dtype=np.int32), np.frombuffer(doc["tf"], dtype=np.float32)
+
+
+async def _source_opening(db, book: Dict[str, Any]) -> str:
+    """The first SIMILAR_SOURCE_BYTES of the book's source text."""
+    if book.get("source_file_id"):
+        try:
+            stream = await file_storage(db).open(book["source_file_id"])
+            try:
+                data = await stream.read(SIMILAR_SOURCE_BYTES)
+            finally:
+                stream.close()
+        except Exception:
+            return ""
+        return data.decode("utf-8", errors="ignore")
+    return (book.get("source") or "")[:SIMILAR_SOURCE_BYTES]
+
+
+async def compute(db, book: Dict[str, Any]) -> Vector:
+    text = await _source_opening(db, book)
+    counts = await asyncio.get_running_loop().run_in_executor(None, term_counts, book, text)
+    return to_vector(counts, index.segment.idf)
+
+
+async def _index_book(db, book: Dict[str, Any]) -> Vector:
+    vector = await compute(db, book)
+    await db[COLLECTION].replace_one({"_id": book["_id"]}, {**_encode(vector), "updated_at": _now()}, upsert=True)
+    index.put(book["_id"], vector)
+    return vector
+
+
+# Write paths (called from books/)
+
+async def book_changed(db, book_id: ObjectId) -> None:
+    """Re-index a book after its title, description, author, language or source changed."""
+    try:
+        book = await db.books.find_one({"_id": book_id}, BOOK_FIELDS)
+        if book:
+            await _index_book(db, book)
+    except Exception as e:
+        print(f"⚠️  Failed to update similar-books index: {e}")
+
+
+async def book_removed(db, book_id: ObjectId) -> None:
+    try:
+        await db[COLLECTION].replace_one({"_id": book_id}, {"deleted": True, "updated_at": _now()}, upsert=True)
+        index.put(book_id, None)
+    except Exception as e:
+        print(f"⚠️  Failed to update similar-books index: {e}")
+
+
+# Queries
+
+async def similar(db, book_id: ObjectId, k: int) -> List[Tuple[ObjectId, float]]:
+    """(book id, score) pairs of the `k` books most like `book_id`, best first."""
+    if not index.ready:
+        raise HTTPException(status_code=503, detail="Similar-books index is loading", headers={"Retry-After": "5"})
+    vector = index.pending.get(book_id)
+    if vector is None:
+        doc = await db[COLLECTION].find_one({"_id": book_id})
+        if doc and not doc.get("deleted"):
+            vector = _decode(doc)
+        else:
+            # Not indexed yet (e.g. its update failed): index it now
+            book = await db.books.find_one({"_id": book_id}, BOOK_FIELDS)
+            if not book:
+                return []
+            vector = await _index_book(db, book)
+    with span("similar.query", k=k, books=len(index.segment)):
+        return index.similar(book_id, vector, k)
+
+
+# Upkeep
+
+async def _poll(db) -> int:
+    """Apply rows updated by any worker since the last poll; returns how many changed."""
+    query: Dict[str, Any] = {"updated_at": {"$exists": True}}
+    if _seen["at"] is not None:
+        query = {"updated_at": {"$gte": _seen["at"] - POLL_OVERLAP}}
+    recent: Dict[ObjectId, datetime] = _seen["recent"]
+    applied = 0
+    async for doc in db[COLLECTION].find(query):
+        at = doc["updated_at"]
+        if recent.get(doc["_id"]) == at:
+            continue
+        recent[doc["_id"]] = at
+        index.put(doc["_id"], _decode(doc))
+        applied += 1
+        if _seen["at"] is None or at > _seen["at"]:
+            _seen["at"] = at
+    if _seen["at"] is not None:
+        horizon = _seen["at"] - POLL_OVERLAP
+        _seen["recent"] = {book_id: at for book_id, at in recent.items() if at >= horizon}
+    return applied
+
+
+async def _compile() -> None:
+    changes = dict(index.pending)
+    with span("similar.compile", changes=len(changes)):
+        segment = await asyncio.get_running_loop().run_in_executor(None, index.segment.merged, changes)
+    index.install(segment, changes)
+
+
+async def _load(db) -> None:
+    """Start from the newest snapshot, then catch up from `book_features`."""
+    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name=SNAPSHOT_BUCKET)
+    snapshot = await db[f"{SNAPSHOT_BUCKET}.files"].find_one(
+        {"filename": SNAPSHOT_FILENAME}, sort=[("uploadDate", -1)]
+    )
+    if snapshot:
+        stream = await bucket.open_download_stream(snapshot["_id"])
+        data = await stream.read()
+        index.segment = await asyncio.get_running_loop().run_in_executor(None, Segment.from_bytes, data)
+        _seen["at"] = (snapshot.get("metadata") or {}).get("as_of")
+    await _poll(db)
+    if index.pending:
+        await _compile()
+    index.ready = True
+
+
+async def _save_snapshot(db) -> None:
+    if index.pending:
+        await _compile()
+    as_of = _seen["at"]
+    data = await asyncio.get_running_loop().run_in_executor(None, index.segment.to_bytes)
+    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name=SNAPSHOT_BUCKET)
+    file_id = await bucket.upload_from_stream(
+        SNAPSHOT_FILENAME, data, metadata={"as_of": as_of, "books": len(index.segment)}
+    )
+    async for old in db[f"{SNAPSHOT_BUCKET}.files"].find({"filename": SNAPSHOT_FILENAME, "_id": {"$ne": file_id}}, {"_id": 1}):
+        await bucket.delete(old["_id"])
+    # Every worker's snapshot is now newer than these
+    await db[COLLECTION].delete_many({"deleted": True, "updated_at": {"$lt": _now() - TOMBSTONE_TTL}})
+    print(f"📚 Similar-books snapshot saved: {len(index.segment)} books, {len(data) / 1e6:.1f} MB")
+
+
+async def _index_missing(db) -> None:
+    """Index books that have no vector yet (one worker at a time)."""
+    if not await acquire_lease(db[META], "backfill_lease", 3600):
+        return
+    indexed = 0
+    batch: List[ObjectId] = []
+
+    async def flush() -> None:
+        nonlocal indexed
+        have = {d["_id"] async for d in db[COLLECTION].find({"_id": {"$in": batch}}, {"_id": 1})}
+        async for book in db.books.find({"_id": {"$in": [b for b in batch if b not in have]}}, BOOK_FIELDS):
+            await _index_book(db, book)
+            indexed += 1
+        batch.clear()
+        if len(index.pending) >= SIMILAR_COMPILE_AFTER:
+            await _compile()
+
+    async for b in db.books.find({}, {"_id": 1}):
+        batch.append(b["_id"])
+        if len(batch) >= 500:
+            await flush()
+    if batch:
+        await flush()
+    if indexed:
+        print(f"📚 Indexed {indexed} book(s) for similar-books")
+
+
+@register_warmup
+async def ensure_indexes(app) -> None:
+    await app.state.db[COLLECTION].create_index("updated_at")
+
+
+@register_background
+async def maintain(app) -> None:
+    db = app.state.db
+    while not index.ready:
+        try:
+            await _load(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Failed to load similar-books index: {e}")
+            await asyncio.sleep(SIMILAR_REFRESH_INTERVAL_S)
+    print(f"📚 Similar-books index ready: {len(index)} books")
+    try:
+        await _index_missing(db)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Similar-books backfill failed: {e}")
+
+    last_compile = last_snapshot = time.monotonic()
+    while True:
+        await asyncio.sleep(SIMILAR_REFRESH_INTERVAL_S)
+        try:
+            await _poll(db)
+            now = time.monotonic()
+            if index.pending and (
+                len(index.pending) >= SIMILAR_COMPILE_AFTER or now - last_compile >= SIMILAR_COMPILE_INTERVAL_S
+            ):
+                await _compile()
+                last_compile = now
+            if now - last_snapshot >= SIMILAR_SNAPSHOT_INTERVAL_S:
+                last_snapshot = now
+                if await acquire_lease(db[META], "snapshot_lease", SIMILAR_SNAPSHOT_INTERVAL_S * 0.9):
+                    await _save_snapshot(db)
+                    last_compile = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Similar-books index refresh failed: {e}")
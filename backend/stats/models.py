@@ -0,0 +1,26 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class CatalogStatsOut(BaseModel):
+    books: int
+    translations: int
+    by_original_language: Dict[str, int] = Field(default_factory=dict, description="Books per original language")
+    by_target_language: Dict[str, int] = Field(default_factory=dict, description="Translations per target language")
+    by_translated_by: Dict[str, int] = Field(default_factory=dict, description="Translations per model/translator")
+    updated_at: Optional[str] = Field(None, description="ISO timestamp of the last incremental update")
+    recomputed_at: Optional[str] = Field(None, description="ISO timestamp of the last full recompute")
+
+
+class CoverageRow(BaseModel):
+    book_id: str
+    title: Optional[str] = None
+    original_language: Optional[str] = None
+    languages: Dict[str, int] = Field(default_factory=dict, description="Translations per target language")
+    missing: List[str] = Field(default_factory=list, description="Requested languages this book has no translation in")
+
+
+class CoveragePage(BaseModel):
+    languages: List[str] = Field(..., description="Columns of the matrix")
+    rows: List[CoverageRow]
+    next: Optional[str] = Field(None, description="Pass as `after` to fetch the next page; null on the last page")
@@ -0,0 +1,62 @@
+from typing import Optional
+from fastapi import APIRouter, Request, Depends, Query
+from fastapi.responses import ORJSONResponse
+
+from users.auth import require_admin
+from core.repository import parse_object_id
+from .models import CatalogStatsOut, CoveragePage
+from .store import COVERAGE, escape_key, totals, recompute, unescape_counts
+
+router = APIRouter()
+
+
+@router.get("/stats", response_model=CatalogStatsOut)
+async def catalog_stats(request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: book and translation counts per language and model, from the materialized stats."""
+    return ORJSONResponse(await totals(request.app.state.db))
+
+
+@router.post("/stats/recompute", response_model=CatalogStatsOut)
+async def recompute_stats(request: Request, _: bool = Depends(require_admin)):
+    """Admin-only: rebuild the stats from the catalog now (normally done periodically)."""
+    return ORJSONResponse(await recompute(request.app.state.db))
+
+
+@router.get("/stats/coverage", response_model=CoveragePage)
+async def coverage_matrix(
+    request: Request,
+    languages: Optional[str] = Query(
+        None, description="Comma-separated target languages (columns); default: every language with a translation"
+    ),
+    missing_only: bool = Query(False, description="Only books lacking at least one of the languages"),
+    after: Optional[str] = Query(None, description="`next` from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    _: bool = Depends(require_admin),
+):
+    """Admin-only: book × language coverage matrix, one page of books (ordered by id) at a time."""
+    db = request.app.state.db
+    if languages:
+        columns = list(dict.fromkeys(lang.strip() for lang in languages.split(",") if lang.strip()))
+    else:
+        columns = sorted((await totals(db))["by_target_language"])
+
+    query: dict = {}
+    if after:
+        query["_id"] = {"$gt": parse_object_id(after, "Invalid cursor", 400)}
+    if missing_only and columns:
+        # A language is missing when its counter is absent or has dropped to zero
+        query["$or"] = [{f"languages.{escape_key(lang)}": {"$not": {"$gt": 0}}} for lang in columns]
+
+    docs = [doc async for doc in db[COVERAGE].find(query).sort("_id", 1).limit(limit + 1)]
+    more = len(docs) > limit
+    rows = []
+    for doc in docs[:limit]:
+        counts = unescape_counts(doc.get("languages"))
+        rows.append({
+            "book_id": str(doc["_id"]),
+            "title": doc.get("title"),
+            "original_language": doc.get("original_language"),
+            "languages": counts,
+            "missing": [lang for lang in columns if not counts.get(lang)],
+        })
+    return ORJSONResponse({"languages": columns, "rows": rows, "next": rows[-1]["book_id"] if more else None})
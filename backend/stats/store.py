@@ -0,0 +1,215 @@
+"""Materialized catalog statistics.
+
+Two collections are kept up to date with `$inc` by the write paths in
+books/routes.py, so reading stats never scans `books` or `translations`:
+
+- `catalog_stats`, one `totals` document: book/translation counts and counts
+  per original language, per target language and per `translated_by`.
+- `catalog_coverage`, one document per book (`_id` = book id): title, original
+  language and the number of translations per target language.
+
+Map keys are user-supplied names, so they are escaped before being used in
+field paths (`.` and `$` are not allowed there). Counters that drop to zero are
+left in place and filtered out when read.
+
+Increments are applied after the catalog write and are not transactional, so
+the counters can drift (a crash between the two writes, a recompute racing
+with an upload). `recompute` rebuilds both collections from the catalog with
+aggregations; it runs every STATS_RECOMPUTE_INTERVAL_S in one worker at a time
+(a lease in `catalog_stats`), on first start, and on demand.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import unquote
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from core.lease import acquire_lease
+from core.lifecycle import register_background
+
+STATS = "catalog_stats"
+COVERAGE = "catalog_coverage"
+TOTALS_ID = "totals"
+LEASE_ID = "recompute_lease"
+
+STATS_RECOMPUTE_INTERVAL_S = float(os.environ.get("STATS_RECOMPUTE_INTERVAL_S", "3600"))
+
+UNKNOWN = "(unknown)"
+DIMENSIONS = ("original_language", "target_language", "translated_by")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def escape_key(value: Optional[str]) -> str:
+    """Field-name-safe form of a language/model name (reversible with `unquote`)."""
+    value = (value or "").strip() or UNKNOWN
+    return value.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def unescape_counts(counts: Optional[Dict[str, int]]) -> Dict[str, int]:
+    return {unquote(k): n for k, n in (counts or {}).items() if n > 0}
+
+
+# Incremental updates (called from books/routes.py)
+
+def _translation_inc(tdocs: Iterable[Dict[str, Any]], sign: int) -> Dict[str, int]:
+    inc: Dict[str, int] = {}
+    for t in tdocs:
+        for field in (f"target_language.{escape_key(t.get('language'))}",
+                      f"translated_by.{escape_key(t.get('translated_by'))}"):
+            inc[field] = inc.get(field, 0) + sign
+        inc["translations"] = inc.get("translations", 0) + sign
+    return inc
+
+
+def _coverage_inc(tdocs: Iterable[Dict[str, Any]], sign: int) -> Dict[str, int]:
+    inc: Dict[str, int] = {}
+    for t in tdocs:
+        field = f"languages.{escape_key(t.get('language'))}"
+        inc[field] = inc.get(field, 0) + sign
+    return inc
+
+
+async def _apply(db, totals: Dict[str, int], book_id: Optional[ObjectId] = None,
+                 coverage: Optional[Dict[str, int]] = None, coverage_set: Optional[Dict[str, Any]] = None) -> None:
+    """Apply counter deltas; failures are logged and left for the next recompute."""
+    try:
+        totals = {k: v for k, v in totals.items() if v}
+        if totals:
+            await db[STATS].update_one(
+                {"_id": TOTALS_ID}, {"$inc": totals, "$set": {"updated_at": _now_iso()}}, upsert=True
+            )
+        update: Dict[str, Any] = {}
+        if coverage:
+            update["$inc"] = coverage
+        if coverage_set:
+            update["$set"] = coverage_set
+        if book_id is not None and update:
+            await db[COVERAGE].update_one({"_id": book_id}, update, upsert=True)
+    except Exception as e:
+        print(f"⚠️  Failed to update catalog stats: {e}")
+
+
+async def book_added(db, book: Dict[str, Any], tdocs: List[Dict[str, Any]]) -> None:
+    totals = {"books": 1, f"original_language.{escape_key(book.get('original_language'))}": 1}
+    totals.update(_translation_inc(tdocs, 1))
+    await _apply(db, totals, book["_id"], _coverage_inc(tdocs, 1), {
+        "title": book.get("title"),
+        "original_language": book.get("original_language"),
+    })
+
+
+async def book_changed(db, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+    """Title / original language edits."""
+    totals: Dict[str, int] = {}
+    old, new = escape_key(before.get("original_language")), escape_key(after.get("original_language"))
+    if old != new:
+        totals = {f"original_language.{old}": -1, f"original_language.{new}": 1}
+    await _apply(db, totals, after["_id"], None, {
+        "title": after.get("title"),
+        "original_language": after.get("original_language"),
+    })
+
+
+async def translation_added(db, tdoc: Dict[str, Any]) -> None:
+    await _apply(db, _translation_inc([tdoc], 1), tdoc["book_id"], _coverage_inc([tdoc], 1))
+
+
+async def book_removed(db, book: Dict[str, Any], tdocs: List[Dict[str, Any]]) -> None:
+    totals = {"books": -1, f"original_language.{escape_key(book.get('original_language'))}": -1}
+    totals.update(_translation_inc(tdocs, -1))
+    await _apply(db, totals)
+    try:
+        await db[COVERAGE].delete_one({"_id": book["_id"]})
+    except Exception as e:
+        print(f"⚠️  Failed to update catalog stats: {e}")
+
+
+# Reads
+
+async def totals(db) -> Dict[str, Any]:
+    doc = await db[STATS].find_one({"_id": TOTALS_ID}) or {}
+    return {
+        "books": doc.get("books", 0),
+        "translations": doc.get("translations", 0),
+        "by_original_language": unescape_counts(doc.get("original_language")),
+        "by_target_language": unescape_counts(doc.get("target_language")),
+        "by_translated_by": unescape_counts(doc.get("translated_by")),
+        "updated_at": doc.get("updated_at"),
+        "recomputed_at": doc.get("recomputed_at"),
+    }
+
+
+# Full recompute
+
+async def recompute(db) -> Dict[str, Any]:
+    """Rebuild `catalog_stats` and `catalog_coverage` from the catalog."""
+    started = datetime.now(timezone.utc)
+    run = uuid.uuid4().hex
+    doc: Dict[str, Any] = {"_id": TOTALS_ID, "books": 0, "translations": 0}
+    for dim in DIMENSIONS:
+        doc[dim] = {}
+
+    coverage: Dict[Any, Dict[str, Any]] = {}
+    async for b in db.books.find({}, {"title": 1, "original_language": 1}):
+        doc["books"] += 1
+        key = escape_key(b.get("original_language"))
+        doc["original_language"][key] = doc["original_language"].get(key, 0) + 1
+        coverage[b["_id"]] = {
+            "_id": b["_id"], "title": b.get("title"), "original_language": b.get("original_language"),
+            "languages": {}, "run": run,
+        }
+
+    pipeline = [{"$group": {
+        "_id": {"book_id": "$book_id", "language": "$language", "translated_by": "$translated_by"},
+        "n": {"$sum": 1},
+    }}]
+    async for row in db.translations.aggregate(pipeline):
+        group, n = row["_id"], row["n"]
+        doc["translations"] += n
+        for dim, value in (("target_language", group.get("language")), ("translated_by", group.get("translated_by"))):
+            key = escape_key(value)
+            doc[dim][key] = doc[dim].get(key, 0) + n
+        book = coverage.get(group.get("book_id"))
+        if book is not None:
+            key = escape_key(group.get("language"))
+            book["languages"][key] = book["languages"].get(key, 0) + n
+
+    now = _now_iso()
+    doc["updated_at"] = now
+    doc["recomputed_at"] = now
+    await db[STATS].replace_one({"_id": TOTALS_ID}, doc, upsert=True)
+    ops = [ReplaceOne({"_id": book_id}, row, upsert=True) for book_id, row in coverage.items()]
+    for i in range(0, len(ops), 1000):
+        await db[COVERAGE].bulk_write(ops[i:i + 1000], ordered=False)
+    # Drop rows of deleted books; rows of books created during this run are newer than `started`
+    await db[COVERAGE].delete_many({"run": {"$ne": run}, "_id": {"$lt": ObjectId.from_datetime(started)}})
+    print(f"📊 Catalog stats recomputed: {doc['books']} books, {doc['translations']} translations")
+    return await totals(db)
+
+
+@register_background
+async def recompute_periodically(app) -> None:
+    if STATS_RECOMPUTE_INTERVAL_S <= 0:
+        return
+    db = app.state.db
+    bootstrap = True
+    while True:
+        try:
+            # At startup only bootstrap a catalog that has no stats yet; later runs repair drift
+            due = not bootstrap or await db[STATS].find_one({"_id": TOTALS_ID}, {"_id": 1}) is None
+            if due and await acquire_lease(db[STATS], LEASE_ID, STATS_RECOMPUTE_INTERVAL_S * 0.9):
+                await recompute(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Catalog stats recompute failed: {e}")
+        bootstrap = False
+        await asyncio.sleep(STATS_RECOMPUTE_INTERVAL_S)
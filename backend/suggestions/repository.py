@@ -0,0 +1,6 @@
+from core.repository import Repository
+
+
+class SuggestionRepository(Repository):
+    collection = "suggestions"
+    not_found = "Suggestion not found"
@@ -1,10 +1,12 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Request, Depends, Query
-from bson import ObjectId
+from fastapi import APIRouter, Request, Depends, Query
+from fastapi.responses import ORJSONResponse
 
+from core import ndjson
 from users.auth import get_current_user_claims, require_admin
 from .models import SuggestionIn, SuggestionOut
+from .repository import SuggestionRepository
 
 router = APIRouter()
 
@@ -35,29 +37,59 @@ async def create_suggestion(payload: SuggestionIn, request: Request):
         "acknowledged_at": None,
     })
 
-    res = await db.suggestions.insert_one(doc)
-    if not res.acknowledged:
-        raise HTTPException(status_code=500, detail="Failed to create suggestion")
+    await SuggestionRepository(db).insert(doc)
+    return SuggestionOut(id=str(doc.pop("_id")), **doc)
 
-    return SuggestionOut(id=str(res.inserted_id), **doc)
+
+SUGGESTION_FIELDS = tuple(SuggestionOut.model_fields)
+
+
+def _suggestion_row(doc: dict, fields: Optional[Tuple[str, ...]]) -> Optional[dict]:
+    """A listed suggestion validated through SuggestionOut, optionally cut down to `fields`.
+
+    None for a malformed one (skipped instead of failing the listing), whatever
+    `fields` keeps, so a field listing holds the same rows with the same defaults.
+    """
+    doc["id"] = str(doc.pop("_id", ""))  # serialize
+    try:
+        row = SuggestionOut(**doc).model_dump()
+    except Exception:
+        return None
+    return row if fields is None else {f: row[f] for f in fields}
+
+
+async def _stream_suggestions(cursor, fields: Optional[Tuple[str, ...]], size: int):
+    async for docs in ndjson.batches(cursor, size):
+        for doc in docs:
+            row = _suggestion_row(doc, fields)
+            if row is not None:
+                yield row
 
 
 @router.get("/suggestions", response_model=List[SuggestionOut])
-async def list_suggestions(request: Request, only_needing_review: bool = Query(False), _: bool = Depends(require_admin)):
+async def list_suggestions(
+    request: Request,
+    only_needing_review: bool = Query(False),
+    fields: Optional[str] = Query(None, description=ndjson.fields_description(SUGGESTION_FIELDS)),
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$", description=ndjson.FORMAT_DESCRIPTION),
+    batch_size: Optional[int] = Query(None, ge=1, description=ndjson.BATCH_SIZE_DESCRIPTION),
+    _: bool = Depends(require_admin),
+):
     """Admin-only: list suggestions. Optionally filter to those needing review."""
     db = request.app.state.db
     query = {"needs_review": True} if only_needing_review else {}
+    selected = ndjson.parse_fields(fields, SUGGESTION_FIELDS)
+    # Every field is read so each row is validated whole, whatever `fields` keeps
+    cursor = db.suggestions.find(query).sort("created_at", -1)
+    if ndjson.wants_ndjson(request, response_format):
+        return ndjson.ndjson_response(_stream_suggestions(cursor, selected, ndjson.batch_size(batch_size)), "suggestions")
 
-    items: List[SuggestionOut] = []
-    async for doc in db.suggestions.find(query).sort("created_at", -1):
-        doc["id"] = str(doc["_id"])  # serialize
-        doc.pop("_id", None)
-        try:
-            items.append(SuggestionOut(**doc))
-        except Exception:
-            # Skip malformed entries instead of failing the entire request
-            continue
-    return items
+    items = []
+    async for doc in cursor:
+        row = _suggestion_row(doc, selected)
+        if row is not None:
+            items.append(row)
+    return ORJSONResponse(items)
 
 
 @router.get("/suggestions/mine", response_model=List[SuggestionOut])
@@ -81,13 +113,6 @@ async def list_my_suggestions(request: Request):
 async def acknowledge_suggestion(suggestion_id: str, request: Request, _: bool = Depends(require_admin)):
     """Admin-only: mark a suggestion as acknowledged. Clears needs_review and notify_admins."""
     db = request.app.state.db
-    try:
-        doc = await db.suggestions.find_one({"_id": ObjectId(suggestion_id)})
-    except Exception:
-        doc = None
-    if not doc:
-        raise HTTPException(status_code=404, detail="Suggestion not found")
-
     claims = get_current_user_claims(request)
     updates = {
         "acknowledged": True,
@@ -97,11 +122,8 @@ async def acknowledge_suggestion(suggestion_id: str, request: Request, _: bool =
         "acknowledged_at": _now_iso(),
     }
 
-    res = await db.suggestions.update_one({"_id": ObjectId(suggestion_id)}, {"$set": updates})
-    if not res.acknowledged:
-        raise HTTPException(status_code=500, detail="Failed to update suggestion")
-
-    updated = await db.suggestions.find_one({"_id": ObjectId(suggestion_id)})
+    # Single round trip: 404 if missing, otherwise the acknowledged document
+    updated = await SuggestionRepository(db).update(suggestion_id, updates)
     updated["id"] = str(updated["_id"])  # serialize
     updated.pop("_id", None)
     return SuggestionOut(**updated)
@@ -42,3 +42,15 @@ def require_admin(request: Request) -> bool:
     if not claims.get("isadmin"):
         raise HTTPException(status_code=403, detail="Admin privileges required")
     return True
+
+
+def is_admin_authorization(authorization: str) -> bool:
+    """Non-raising check used outside the dependency system (e.g. middleware)."""
+    parts = (authorization or "").split()
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return False
+    try:
+        claims = _decode_token(parts[1])
+    except HTTPException:
+        return False
+    return bool(claims.get("isadmin"))
@@ -0,0 +1,31 @@
+from typing import Any, Dict, Optional
+
+from core.repository import Repository
+
+
+class UserRepository(Repository):
+    collection = "users"
+    not_found = "User not found"
+    invalid_id_status = 400
+    invalid_id_detail = "Invalid user ID"
+
+    async def by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        return await self.col.find_one({"username": username})
+
+    async def by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.col.find_one({"email": email})
+
+    async def find_conflict(self, email: Optional[str], username: Optional[str],
+                            exclude_id: Any = None) -> Optional[Dict[str, Any]]:
+        """Another user already holding `email` or `username` (one query for both checks)."""
+        clauses = []
+        if email:
+            clauses.append({"email": email})
+        if username:
+            clauses.append({"username": username})
+        if not clauses:
+            return None
+        query: Dict[str, Any] = {"$or": clauses}
+        if exclude_id is not None:
+            query["_id"] = {"$ne": self.oid(exclude_id)}
+        return await self.col.find_one(query, {"email": 1, "username": 1})
@@ -1,13 +1,27 @@
-from fastapi import APIRouter, HTTPException, status, Request
+from fastapi import APIRouter, HTTPException, Query, status, Request
+from fastapi.responses import ORJSONResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
-from bson import ObjectId
 import bcrypt
+import os
+from typing import Optional, Tuple
+from core import ndjson
+from core.ratelimit import limiter, client_ip
 from .models import UserCreate, UserUpdate, UserResponse, User
+from .repository import UserRepository
 from .auth import create_access_token
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Attempts per RATE_LIMIT_WINDOW_S; checked before any bcrypt work
+login_ip_limiter = limiter("login:ip", int(os.environ.get("LOGIN_RATE_LIMIT_PER_IP", "30")))
+login_user_limiter = limiter("login:user", int(os.environ.get("LOGIN_RATE_LIMIT_PER_USER", "10")))
+register_ip_limiter = limiter("register:ip", int(os.environ.get("REGISTER_RATE_LIMIT_PER_IP", "10")))
+register_user_limiter = limiter("register:user", int(os.environ.get("REGISTER_RATE_LIMIT_PER_USER", "5")))
+
+# UserResponse fields by alias, as listed
+USER_FIELDS = ("_id", "username", "email", "isadmin", "created_at", "updated_at")
+
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
@@ -20,48 +34,56 @@ def verify_password(password: str, password_hash: str) -> bool:
 
 
 async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> dict:
-    """Retrieve a user by ID"""
-    try:
-        user = await db["users"].find_one({"_id": ObjectId(user_id)})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return user
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid user ID: {str(e)}")
+    """Retrieve a user by ID (400 for a malformed id, 404 if missing)"""
+    return await UserRepository(db).get(user_id)
 
 
 async def get_user_by_email(db: AsyncIOMotorDatabase, email: str) -> dict:
     """Retrieve a user by email"""
-    user = await db["users"].find_one({"email": email})
-    return user
+    return await UserRepository(db).by_email(email)
 
 
 async def get_user_by_username(db: AsyncIOMotorDatabase, username: str) -> dict:
     """Retrieve a user by username"""
-    user = await db["users"].find_one({"username": username})
-    return user
+    return await UserRepository(db).by_username(username)
 
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user_data: UserCreate, request: Request):
-    """Register a new user"""
-    db = request.app.state.db
-    
-    # Check if user already exists by email
-    existing_email = await get_user_by_email(db, user_data.email)
-    if existing_email:
+def _raise_conflict(conflict: dict, email: str | None) -> None:
+    if email and conflict.get("email") == email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Username already taken"
+    )
+
+
+def _user_response(user: dict) -> UserResponse:
+    return UserResponse(
+        id=str(user["_id"]),
+        username=user["username"],
+        email=user["email"],
+        isadmin=user["isadmin"],
+        created_at=user["created_at"],
+        updated_at=user["updated_at"]
+    )
 
-    # Check if username is already taken
-    existing_username = await get_user_by_username(db, user_data.username)
-    if existing_username:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already taken"
-        )
+
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register_user(user_data: UserCreate, request: Request):
+    """Register a new user"""
+    db = request.app.state.db
+    await register_ip_limiter.hit(db, client_ip(request))
+    await register_user_limiter.hit(db, user_data.username.lower())
+
+    users = UserRepository(db)
+
+    # Check if the email or username is already taken (one query)
+    conflict = await users.find_conflict(user_data.email, user_data.username)
+    if conflict:
+        _raise_conflict(conflict, user_data.email)
 
     # Create new user
     user_doc = User(
@@ -71,17 +93,9 @@ async def register_user(user_data: UserCreate, request: Request):
         isadmin=user_data.isadmin
     )
 
-    result = await db["users"].insert_one(user_doc.model_dump())
-    created_user = await get_user_by_id(db, str(result.inserted_id))
-
-    return UserResponse(
-        id=str(created_user["_id"]),
-        username=created_user["username"],
-        email=created_user["email"],
-        isadmin=created_user["isadmin"],
-        created_at=created_user["created_at"],
-        updated_at=created_user["updated_at"]
-    )
+    # The inserted document already holds everything the response needs; no re-read
+    created_user = await users.insert(user_doc.model_dump())
+    return _user_response(created_user)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -89,40 +103,19 @@ async def get_user(user_id: str, request: Request):
     """Get a user by ID"""
     db = request.app.state.db
     user = await get_user_by_id(db, user_id)
-    
-    return UserResponse(
-        id=str(user["_id"]),
-        username=user["username"],
-        email=user["email"],
-        isadmin=user["isadmin"],
-        created_at=user["created_at"],
-        updated_at=user["updated_at"]
-    )
+    return _user_response(user)
 
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(user_id: str, user_data: UserUpdate, request: Request):
     """Update a user"""
     db = request.app.state.db
-    user = await get_user_by_id(db, user_id)
+    users = UserRepository(db)
 
-    # Check if new email is already taken by another user
-    if user_data.email and user_data.email != user["email"]:
-        existing_email = await get_user_by_email(db, user_data.email)
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-
-    # Check if new username is already taken by another user
-    if user_data.username and user_data.username != user["username"]:
-        existing_username = await get_user_by_username(db, user_data.username)
-        if existing_username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already taken"
-            )
+    # Check if the new email or username is already taken by another user (one query)
+    conflict = await users.find_conflict(user_data.email, user_data.username, exclude_id=user_id)
+    if conflict:
+        _raise_conflict(conflict, user_data.email)
 
     # Build update dictionary
     update_dict = {}
@@ -137,54 +130,50 @@ async def update_user(user_id: str, user_data: UserUpdate, request: Request):
 
     update_dict["updated_at"] = datetime.utcnow()
 
-    await db["users"].update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": update_dict}
-    )
-
-    updated_user = await get_user_by_id(db, user_id)
-
-    return UserResponse(
-        id=str(updated_user["_id"]),
-        username=updated_user["username"],
-        email=updated_user["email"],
-        isadmin=updated_user["isadmin"],
-        created_at=updated_user["created_at"],
-        updated_at=updated_user["updated_at"]
-    )
+    updated_user = await users.update(user_id, update_dict)
+    return _user_response(updated_user)
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_id: str, request: Request):
     """Delete a user"""
     db = request.app.state.db
-    user = await get_user_by_id(db, user_id)
+    await UserRepository(db).delete(user_id)
+    return None
 
-    result = await db["users"].delete_one({"_id": ObjectId(user_id)})
 
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=500, detail="Failed to delete user")
+def _user_row(user: dict, fields: Optional[Tuple[str, ...]]) -> dict:
+    """A user document validated through UserResponse and dumped by alias (`_id`), optionally cut down to `fields`.
 
-    return None
+    Same output as the response_model serialization list_users used before it
+    returned ORJSONResponse; a document missing a field fails the same way.
+    """
+    row = _user_response(user).model_dump(by_alias=True)
+    return row if fields is None else {f: row[f] for f in fields}
+
+
+async def _stream_users(cursor, fields: Optional[Tuple[str, ...]], size: int):
+    async for users in ndjson.batches(cursor, size):
+        for user in users:
+            yield _user_row(user, fields)
 
 
 @router.get("/", response_model=list[UserResponse])
-async def list_users(request: Request):
+async def list_users(
+    request: Request,
+    fields: Optional[str] = Query(None, description=ndjson.fields_description(USER_FIELDS)),
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$", description=ndjson.FORMAT_DESCRIPTION),
+    batch_size: Optional[int] = Query(None, ge=1, description=ndjson.BATCH_SIZE_DESCRIPTION),
+):
     """List all users"""
     db = request.app.state.db
+    selected = ndjson.parse_fields(fields, USER_FIELDS)
+    # Every field is read so each row is validated whole, whatever `fields` keeps
+    cursor = db["users"].find({}, {f: 1 for f in USER_FIELDS})
+    if ndjson.wants_ndjson(request, response_format):
+        return ndjson.ndjson_response(_stream_users(cursor, selected, ndjson.batch_size(batch_size)), "users")
     try:
-        users = await db["users"].find().to_list(None)
-        return [
-            UserResponse(
-                id=str(user["_id"]),
-                username=user["username"],
-                email=user["email"],
-                isadmin=user["isadmin"],
-                created_at=user["created_at"],
-                updated_at=user["updated_at"]
-            )
-            for user in users
-        ]
+        return ORJSONResponse([_user_row(user, selected) async for user in cursor])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list users: {str(e)}")
 
@@ -193,6 +182,8 @@ async def list_users(request: Request):
 async def login_user(username: str, password: str, request: Request):
     """Authenticate a user (login)"""
     db = request.app.state.db
+    await login_ip_limiter.hit(db, client_ip(request))
+    await login_user_limiter.hit(db, username.lower())
     user = await get_user_by_username(db, username)
 
     if not user:
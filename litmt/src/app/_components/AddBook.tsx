@@ -49,23 +49,33 @@ export default function AddBook() {
 		e.preventDefault();
     setIsUploading(true);
 		setStatus("Creating book...");
-		const bookBody = {
-			title,
-			author,
-			year: year ? parseInt(year, 10) : undefined,
-			description,
-			original_language: originalLanguage || undefined,
-			// prefer uploading original source as a file after creation
-		};
+		// Metadata, source and translation files go up together; the server stores
+		// the files concurrently and keeps nothing if any part fails
+		const form = new FormData();
+		form.append("title", title);
+		if (author) form.append("author", author);
+		if (year) form.append("year", String(parseInt(year, 10)));
+		if (description) form.append("description", description);
+		if (originalLanguage) form.append("original_language", originalLanguage);
+		if (sourceFile) form.append("source", sourceFile, sourceFile.name || "original.txt");
+		const withFiles = translations.filter((t) => t.file);
+		withFiles.forEach((t) => {
+			form.append("translation_files", t.file, t.file.name || t.filename || "translation.txt");
+			form.append("translation_languages", t.language || "");
+			form.append("translation_translated_by", t.translated_by || "");
+		});
+		const fileCount = withFiles.length + (sourceFile ? 1 : 0);
+		if (fileCount > 0) {
+			setStatus(`Creating book and uploading ${fileCount} file${fileCount > 1 ? "s" : ""}...`);
+		}
 
-				const token = (typeof window !== "undefined" && localStorage.getItem("token")) || "";
-				const res = await fetch(apiUrl("/api/books"), {
+		const token = (typeof window !== "undefined" && localStorage.getItem("token")) || "";
+		const res = await fetch(apiUrl("/api/books/upload"), {
 			method: "POST",
-				headers: {
-					"Content-Type": "application/json",
-						...(token ? { Authorization: `Bearer ${token}` } : PUBLIC_ADMIN_KEY ? { Authorization: `Bearer ${PUBLIC_ADMIN_KEY}` } : {}),
-				},
-			body: JSON.stringify(bookBody),
+			headers: {
+				...(token ? { Authorization: `Bearer ${token}` } : PUBLIC_ADMIN_KEY ? { Authorization: `Bearer ${PUBLIC_ADMIN_KEY}` } : {}),
+			},
+			body: form,
 		});
 		if (!res.ok) {
 			setStatus(`Failed to create book: ${res.status} ${res.statusText}`);
@@ -75,42 +85,6 @@ export default function AddBook() {
 		const created = await res.json();
 		const bookId = created.id;
 
-    // Build uploads and run in parallel to reduce total time
-    const uploads: Promise<Response>[] = [];
-    if (sourceFile) {
-      const fd = new FormData();
-      fd.append("file", sourceFile, sourceFile.name || "original.txt");
-      uploads.push(
-        fetch(apiUrl(`/api/books/${bookId}/source`), {
-          method: "POST",
-          headers: {
-            ...(token ? { Authorization: `Bearer ${token}` } : PUBLIC_ADMIN_KEY ? { Authorization: `Bearer ${PUBLIC_ADMIN_KEY}` } : {}),
-          },
-          body: fd,
-        })
-      );
-    }
-    translations.forEach((t) => {
-      if (!t.file) return;
-      const form = new FormData();
-      form.append("language", t.language || "");
-      form.append("file", t.file, t.file.name || t.filename || "translation.txt");
-      if (t.translated_by) form.append("translated_by", t.translated_by);
-      uploads.push(
-        fetch(apiUrl(`/api/books/${bookId}/translations`), {
-          method: "POST",
-          headers: {
-            ...(token ? { Authorization: `Bearer ${token}` } : PUBLIC_ADMIN_KEY ? { Authorization: `Bearer ${PUBLIC_ADMIN_KEY}` } : {}),
-          },
-          body: form,
-        })
-      );
-    });
-
-    if (uploads.length > 0) {
-      setStatus(`Uploading ${uploads.length} file${uploads.length > 1 ? "s" : ""}...`);
-      await Promise.allSettled(uploads);
-    }
     setStatus("Finalizing...");
 
 		// Reset form and navigate to the new book page